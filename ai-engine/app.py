@@ -1,18 +1,22 @@
 #!/usr/bin/env python3
 
-import os
-import tempfile
 import logging
 import time
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
+import json
+import asyncio
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, field_validator
 from src.agents.crews.legal_support_agents.legal_support_agents import LegalSupportAgents
-from src.agents.rag import document_store, initialize_document_store
+from src.agents.crews.legal_support_agents.runtime import get_agent_runtime, shutdown_agent_runtime
+from src.agents.rag import document_store, initialize_document_store, shutdown_document_store
+from src.agents.rag.document_store import DocumentExists, SearchFilter, validate_document_ids
+from src.agents.rag.docx_extraction import extract_docx_chunks, shutdown_extraction_pool
+from src.agents.rag.ingestion import ingestion_queue, shutdown_ingestion_queue, expand_upload, UploadBudget, UploadRejected
 import uvicorn
 from dotenv import load_dotenv
-from docx import Document
 from contextlib import asynccontextmanager
 import re
 
@@ -38,9 +42,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Error initializing document store: {e}")
         logger.warning("API will start, but document storage functionality may not work properly")
+
+    # Startup: Build the shared agent runtime (pooled LLM client, parsed configs)
+    agent_runtime = get_agent_runtime()
+    await agent_runtime.start()
+    app.state.legal_crew = LegalSupportAgents(debug_enabled=False, runtime=agent_runtime)
     
     yield  # This is where FastAPI serves the application
 
+    # Shutdown: Stop ingestion and extraction workers, close the pooled LLM client and stop document store maintenance
+    await shutdown_ingestion_queue()
+    shutdown_extraction_pool()
+    await shutdown_agent_runtime()
+    await shutdown_document_store()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Agentic API", 
@@ -82,22 +97,57 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     result: str
 
-class SearchRequest(BaseModel):
-    query: str = Field(..., min_length=1, max_length=2000)  # Add length validation
+class SearchOptions(BaseModel):
     limit: int = Field(5, ge=1, le=20)  # Add range validation
+    # Optional metadata prefilters; each matches any of its values
+    document_ids: List[str] = Field(default_factory=list, max_length=100)
+    document_names: List[str] = Field(default_factory=list, max_length=100)
+    sections: List[str] = Field(default_factory=list, max_length=20)
+    domains: List[str] = Field(default_factory=list, max_length=20)
+    # Candidate fusion strategy (defaults to SEARCH_FUSION)
+    fusion: Optional[str] = Field(None, pattern="^(rrf|linear|cross_encoder)$")
+
+    def search_filter(self) -> SearchFilter:
+        return SearchFilter(
+            document_ids=self.document_ids,
+            document_names=self.document_names,
+            sections=self.sections,
+            domains=self.domains
+        )
+
+def validate_search_query(query: str) -> str:
+    # Basic security validation
+    if re.search(r'[<>{}]', query):  # Detect potential HTML/script injection
+        raise ValueError('Query contains invalid characters')
+    return query
+
+class SearchRequest(SearchOptions):
+    query: str = Field(..., min_length=1, max_length=2000)  # Add length validation
     
     @field_validator('query')
     @classmethod
     def validate_query(cls, v):
-        # Basic security validation
-        if re.search(r'[<>{}]', v):  # Detect potential HTML/script injection
-            raise ValueError('Query contains invalid characters')
+        return validate_search_query(v)
+
+class BatchSearchRequest(SearchOptions):
+    queries: List[str] = Field(..., min_length=1, max_length=100)
+    
+    @field_validator('queries')
+    @classmethod
+    def validate_queries(cls, v):
+        for query in v:
+            if not 1 <= len(query) <= 2000:
+                raise ValueError('Each query must be 1-2000 characters')
+            validate_search_query(query)
         return v
 
+class DeleteDocumentsRequest(BaseModel):
+    document_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
 @app.post("/query", response_model=QueryResponse)
-async def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest, http_request: Request):
     try:
-        legal_crew = LegalSupportAgents(debug_enabled=False)
+        legal_crew = http_request.app.state.legal_crew
 
         # Use the fully async process_query method
         result = await legal_crew.process_query(request.Query)
@@ -108,11 +158,43 @@ async def process_query(request: QueryRequest):
         fallback_response = "I apologize, but I'm currently experiencing technical difficulties. Please try again later."
         return QueryResponse(result=fallback_response)
 
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest, http_request: Request):
+    """
+    Stream the answer to a query as Server-Sent Events.
+
+    Emits a "route" event as soon as the specialist agent is chosen, then
+    "token" events while the answer is generated, and finally "done" or "error".
+    """
+    legal_crew = http_request.app.state.legal_crew
+
+    async def event_stream():
+        async for event in legal_crew.stream_query(request.Query):
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/vectorize-document")
 async def vectorize_document(
     file: UploadFile = File(...), 
-    document_name: str = Form(None)
+    document_name: str = Form(None),
+    document_id: str = Form(None),
+    upsert: bool = Form(False),
+    domain: str = Form(None)
 ):
+    """
+    Add a .docx document to the vector store.
+
+    With upsert, the stored document with the same document_id (or, if not
+    given, document_name) is replaced: only new or changed chunks are
+    embedded and removed chunks are deleted. An optional domain tag
+    (e.g. "employment") lets searches be narrowed to that practice area.
+    """
     # Check if the file is a Word document
     if not file.filename.endswith('.docx'):
         logger.warning(f"Invalid file type: {file.filename}")
@@ -126,45 +208,101 @@ async def vectorize_document(
             # Basic validation for document_name
             if len(document_name) > 200:
                 raise HTTPException(status_code=400, detail="Document name too long")
+        if document_id:
+            # Same limits as the delete endpoints
+            try:
+                validate_document_ids([document_id])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        if domain and len(domain) > 50:
+            raise HTTPException(status_code=400, detail="Domain too long")
             
-        # Create a temporary file with secure random name
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-            # Read the uploaded file
-            content = await file.read()
-            
-            # Check file size limit (10MB)
-            if len(content) > 10 * 1024 * 1024:  # 10MB in bytes
-                raise HTTPException(status_code=400, detail="File too large")
-                
-            # Write to the temporary file
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        # Read the uploaded file
+        content = await file.read()
         
-        try:
-            # Extract text from the document
-            document_text = extract_text_from_docx(temp_file_path)
-            text_preview = document_text[:100] + "..." if len(document_text) > 100 else document_text
-            
-            # Add the document to the vector store
-            result = await document_store.add_document(document_text, document_name)
-            
-            return JSONResponse(content={
-                "filename": file.filename,
-                "document_name": document_name,
-                "document_id": result["document_id"],
-                "document_text": text_preview,
-                "chunks_added": result["chunks_added"]
-            })
-        finally:
-            # Always clean up the temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+        # Check file size limit (10MB)
+        if len(content) > 10 * 1024 * 1024:  # 10MB in bytes
+            raise HTTPException(status_code=400, detail="File too large")
+        
+        # Extract and chunk the document in the extraction process pool
+        chunks = await extract_docx_chunks(content)
+        first_chunk = chunks[0].text if chunks else ""
+        text_preview = first_chunk[:100] + "..." if len(chunks) > 1 or len(first_chunk) > 100 else first_chunk
+        
+        # Add the document to the vector store, or sync the stored version
+        if upsert:
+            result = await document_store.upsert_document(chunks, document_name, document_id, domain)
+        else:
+            result = await document_store.add_chunked_document(chunks, document_name, document_id, domain)
+        
+        return JSONResponse(content={
+            "filename": file.filename,
+            "document_name": document_name,
+            "document_text": text_preview,
+            **result
+        })
     
+    except HTTPException:
+        raise
+    except DocumentExists as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing document: {str(e)}")
         # Don't expose detailed error information
         raise HTTPException(status_code=500, detail="Error processing document")
 
+async def read_upload(file: UploadFile, budget: UploadBudget, chunk_size: int = 1024 * 1024) -> bytes:
+    """Read an uploaded file in chunks, rejecting it as soon as it exceeds the bytes left in the budget."""
+    content = bytearray()
+    while chunk := await file.read(chunk_size):
+        content += chunk
+        budget.check_bytes(file.filename, len(content))
+    return bytes(content)
+
+@app.post("/ingest", status_code=202)
+async def ingest_documents(
+    files: List[UploadFile] = File(...),
+    upsert: bool = Form(False),
+    domain: str = Form(None)
+):
+    """
+    Queue many .docx files (or zip archives of them) for background ingestion.
+
+    With upsert, documents already stored under the same file name are
+    updated incrementally instead of added again. All documents get the
+    optional domain tag. Returns a job id immediately; poll
+    GET /ingest/{job_id} for progress.
+    """
+    if domain and len(domain) > 50:
+        raise HTTPException(status_code=400, detail="Domain too long")
+    documents = []
+    # One budget for the whole request: no more than INGESTION_MAX_FILES documents or INGESTION_MAX_TOTAL_SIZE bytes
+    budget = UploadBudget()
+    try:
+        for file in files:
+            content = await read_upload(file, budget)
+            documents.extend(await asyncio.to_thread(expand_upload, file.filename, content, budget=budget))
+        job = await ingestion_queue.submit(documents, upsert=upsert, domain=domain)
+    except UploadRejected as e:
+        logger.warning(f"Rejected ingestion upload: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(status_code=202, content={
+        "job_id": job.job_id,
+        "status": job.status,
+        "total": len(documents)
+    })
+
+@app.get("/ingest/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """
+    Report the progress of a bulk ingestion job, per document.
+    """
+    job = await ingestion_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return JSONResponse(content=job)
+
 @app.post("/embeddings")
 async def get_document_embeddings(request: SearchRequest):
     """
@@ -174,51 +312,57 @@ async def get_document_embeddings(request: SearchRequest):
         # Search the vector store
         results = await document_store.search(
             request.query, 
-            limit=request.limit
+            limit=request.limit,
+            search_filter=request.search_filter(),
+            fusion=request.fusion
         )
         
-        # Format results for response
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
-                "text": result["text"],
-                "document_id": result["document_id"],
-                "document_name": result["document_name"],
-                "section": result["section"] if "section" in result and result["section"] else None,
-                "score": float(result["_relevance_score"]) if "_relevance_score" in result else 0.0
-            })
-        
         return JSONResponse(content={
             "query": request.query,
-            "results": formatted_results
+            "results": [format_search_result(result) for result in results]
         })
         
     except Exception as e:
         logger.error(f"Error in get_document_embeddings: {e}")
         raise HTTPException(status_code=500, detail="Error searching documents")
 
-def extract_text_from_docx(file_path):
+@app.post("/embeddings/batch")
+async def get_batch_document_embeddings(request: BatchSearchRequest):
+    """
+    Run many searches in one request, returning their results in query order.
+    
+    Uncached queries are embedded in one batched call, and the searches run
+    concurrently (at most SEARCH_BATCH_CONCURRENCY at a time).
+    """
     try:
-        doc = Document(file_path)
-        full_text = []
-        
-        # Extract text from paragraphs
-        for para in doc.paragraphs:
-            if para.text.strip():  # Only count non-empty paragraphs
-                full_text.append(para.text)
+        results = await document_store.search_many(
+            request.queries,
+            limit=request.limit,
+            search_filter=request.search_filter(),
+            fusion=request.fusion
+        )
         
-        # Extract text from tables
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text.strip():  # Only count non-empty cells
-                        full_text.append(cell.text)
+        return JSONResponse(content={
+            "results": [
+                {"query": query, "results": [format_search_result(result) for result in query_results]}
+                for query, query_results in zip(request.queries, results)
+            ]
+        })
         
-        combined_text = "\n".join(full_text)
-        return combined_text
-    
     except Exception as e:
-        raise Exception(f"Failed to extract text from document: {str(e)}")
+        logger.error(f"Error in get_batch_document_embeddings: {e}")
+        raise HTTPException(status_code=500, detail="Error searching documents")
+
+def format_search_result(result: dict) -> dict:
+    """Search result fields returned by the API."""
+    return {
+        "text": result["text"],
+        "document_id": result["document_id"],
+        "document_name": result["document_name"],
+        "section": result["section"] if "section" in result and result["section"] else None,
+        "domain": result.get("domain"),
+        "score": float(result["_relevance_score"]) if "_relevance_score" in result else 0.0
+    }
 
 @app.delete("/document/{document_id}")
 async def delete_document(document_id: str):
@@ -232,24 +376,88 @@ async def delete_document(document_id: str):
             "success": True
         })
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error deleting document: {e}")
         raise HTTPException(status_code=500, detail="Error deleting document")
 
+@app.post("/documents/delete")
+async def delete_documents(request: DeleteDocumentsRequest):
+    """
+    Delete many documents in one request (a single table delete).
+    """
+    try:
+        result = await document_store.delete_documents(request.document_ids)
+        return JSONResponse(content={**result, "success": True})
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error deleting documents: {e}")
+        raise HTTPException(status_code=500, detail="Error deleting documents")
+
 @app.get("/documents")
-async def get_all_documents():
+async def get_all_documents(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    name: Optional[str] = Query(None, max_length=200)
+):
+    """
+    List stored documents, sorted by name, from the document catalog.
+    
+    Args:
+        offset: Documents to skip
+        limit: Page size (all matching documents if not given)
+        name: Only documents whose name contains this text (case-insensitive)
+    """
     try:
-        # Get all documents from vector store
-        documents = await document_store.get_all_documents()
+        listing = await document_store.list_documents(offset=offset, limit=limit, name=name)
         
         return JSONResponse(content={
-            "document_count": len(documents),
-            "documents": documents
+            "document_count": listing["total"],
+            "offset": offset,
+            "limit": limit,
+            "documents": listing["documents"]
         })
         
     except Exception as e:
         logger.error(f"Error retrieving documents: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving documents")
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Report hit/miss statistics for the document store, routing and answer caches, and cached LLM prompt tokens.
+    """
+    runtime = get_agent_runtime()
+    local_router = runtime.configs.local_router
+    stats = document_store.cache_stats()
+    stats["routing"] = {
+        **runtime.routing_cache.stats(),
+        "local_router": local_router.stats() if local_router else None,
+    }
+    stats["prompt_cache"] = runtime.prompt_cache_stats.stats()
+    stats["answers"] = runtime.answer_cache.stats() if runtime.answer_cache else None
+    return JSONResponse(content=stats)
+
+@app.get("/llm/stats")
+async def get_llm_stats():
+    """
+    Report the LLM gateway's in-flight and queued calls, coalesced calls and retries.
+    """
+    return JSONResponse(content=get_agent_runtime().gateway.stats())
+
+@app.get("/maintenance/stats")
+async def get_maintenance_stats():
+    """
+    Report fragment counts, recent compaction runs and search latency between them.
+    """
+    try:
+        return JSONResponse(content=await document_store.maintenance_stats())
+    except Exception as e:
+        logger.error(f"Error retrieving maintenance stats: {e}")
+        raise HTTPException(status_code=500, detail="Error retrieving maintenance stats")
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Recall-vs-latency benchmark for the legal_documents ANN vector index.
+
+Builds the same index DocumentStore creates (see vector_index_config) over
+either synthetic clustered vectors or a copy of an existing local LanceDB
+table, then compares each nprobes/refine_factor setting against a
+brute-force scan of the same table.
+
+Examples:
+    python benchmark_vector_index.py --rows 100000
+    python benchmark_vector_index.py --source ./lancedb_local --table legal_documents
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import lancedb
+
+# Allow running from any directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.agents.rag.document_store import EMBEDDING_DIMENSION, vector_index_config
+
+
+def synthetic_vectors(rows: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random centroids, loosely mimicking text embeddings."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=rows)
+    vectors = centroids[assignments] + 0.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def load_vectors(args) -> np.ndarray:
+    if not args.source:
+        return synthetic_vectors(args.rows, EMBEDDING_DIMENSION)
+    db = await lancedb.connect_async(args.source)
+    table = await db.open_table(args.table)
+    data = await table.query().select(["vector"]).to_arrow()
+    return np.stack(data["vector"].to_numpy(zero_copy_only=False)).astype(np.float32)
+
+
+async def timed_search(table, query, k, bypass=False, nprobes=None, refine_factor=None):
+    search = table.query().nearest_to(query).select(["id", "_distance"]).limit(k)
+    if bypass:
+        search = search.bypass_vector_index()
+    if nprobes:
+        search = search.nprobes(nprobes)
+    if refine_factor:
+        search = search.refine_factor(refine_factor)
+    start = time.perf_counter()
+    results = await search.to_list()
+    return (time.perf_counter() - start) * 1000, {row["id"] for row in results}
+
+
+async def run(args):
+    vectors = await load_vectors(args)
+    rows = len(vectors)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed copies of stored vectors, like paraphrased questions
+    queries = vectors[rng.integers(0, rows, size=args.queries)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = await lancedb.connect_async(workdir)
+        data = pa.table({
+            "id": pa.array(np.arange(rows)),
+            "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), vectors.shape[1]),
+        })
+        table = await db.create_table("bench", data=data)
+
+        baseline = [await timed_search(table, q, args.k, bypass=True) for q in queries]
+        truth = [ids for _, ids in baseline]
+        brute_ms = np.array([ms for ms, _ in baseline])
+
+        start = time.perf_counter()
+        await table.create_index("vector", config=vector_index_config(rows))
+        build_s = time.perf_counter() - start
+
+        print(f"rows={rows} dim={vectors.shape[1]} queries={len(queries)} k={args.k} index build={build_s:.1f}s")
+        print(f"{'setting':<26}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        print(f"{'brute force':<26}{1.0:>10.3f}{np.percentile(brute_ms, 50):>10.2f}{np.percentile(brute_ms, 95):>10.2f}")
+
+        for nprobes in args.nprobes:
+            for refine_factor in args.refine_factors:
+                latencies, recalls = [], []
+                for query, expected in zip(queries, truth):
+                    ms, found = await timed_search(table, query, args.k, nprobes=nprobes, refine_factor=refine_factor)
+                    latencies.append(ms)
+                    recalls.append(len(found & expected) / len(expected))
+                label = f"nprobes={nprobes} refine={refine_factor}"
+                print(f"{label:<26}{np.mean(recalls):>10.3f}"
+                      f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ANN index recall and latency against brute force")
+    parser.add_argument("--rows", type=int, default=50000, help="Synthetic vectors to generate")
+    parser.add_argument("--source", type=str, default=None, help="Local LanceDB directory to copy vectors from")
+    parser.add_argument("--table", type=str, default="legal_documents", help="Table name in --source")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries to run")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--nprobes", type=int, nargs="+", default=[5, 10, 20, 40, 80])
+    parser.add_argument("--refine-factors", type=int, nargs="+", default=[0, 5, 10])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Latency/quality report for the hybrid search fusion strategies.
+
+Runs labelled queries against an existing local LanceDB table through
+DocumentStore.search with each fusion strategy and per-leg candidate
+count, and reports precision@k, MRR and search latency. A result counts
+as relevant if its section starts with, or its text contains, one of the
+query's expected strings. Query embeddings come from the configured
+EMBEDDING_PROVIDER (the same settings as the API) and are cached after the first strategy, so
+latencies cover the two search legs and fusion only.
+
+Queries file (JSON):
+    [{"query": "How much notice must the employee give?", "relevant": ["10. Notice"]}, ...]
+
+Example:
+    python evaluate_fusion.py --source ./lancedb_local --queries fusion_queries.json --candidates 10 20 50
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+import lancedb
+
+# Allow running from any directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.agents.rag import document_store as document_store_module
+from src.agents.rag.document_store import DocumentStore, embedding_model_name, get_embeddings_model
+from src.agents.rag.embedding_cache import create_embedding_cache
+from src.agents.rag.embedding_service import EmbeddingService
+from src.agents.rag.fusion import FUSION_STRATEGIES
+
+
+def is_relevant(result: dict, expected) -> bool:
+    section = result.get("section") or ""
+    return any(section.startswith(label) or label in result["text"] for label in expected)
+
+
+async def open_store(args) -> DocumentStore:
+    store = DocumentStore()
+    store.embeddings_model = get_embeddings_model()
+    store.embedding_service = EmbeddingService(store.embeddings_model, cache=create_embedding_cache(embedding_model_name()))
+    store.db = await lancedb.connect_async(args.source)
+    store.table = await store.db.open_table(args.table)
+    await store.ensure_fts_index()
+    return store
+
+
+async def run(args):
+    with open(args.queries) as f:
+        queries = json.load(f)
+    store = await open_store(args)
+
+    # Warm the query embedding cache so every strategy is timed on search alone
+    for item in queries:
+        await store.embed_query(item["query"])
+
+    print(f"rows={await store.table.count_rows()} queries={len(queries)} k={args.k}")
+    print(f"{'strategy':<16}{'candidates':>11}{'p@k':>8}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for strategy in args.strategies:
+        for candidates in args.candidates:
+            document_store_module.SEARCH_VECTOR_CANDIDATES = candidates
+            document_store_module.SEARCH_FTS_CANDIDATES = candidates
+            latencies, precisions, reciprocal_ranks = [], [], []
+            for item in queries:
+                store.search_cache.clear()
+                start = time.perf_counter()
+                results = await store.search(item["query"], limit=args.k, fusion=strategy)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits = [is_relevant(result, item["relevant"]) for result in results]
+                precisions.append(sum(hits) / args.k)
+                reciprocal_ranks.append(next((1 / (rank + 1) for rank, hit in enumerate(hits) if hit), 0.0))
+            print(f"{strategy:<16}{candidates:>11}{np.mean(precisions):>8.3f}{np.mean(reciprocal_ranks):>8.3f}"
+                  f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare hybrid search fusion strategies on labelled queries")
+    parser.add_argument("--source", type=str, default="lancedb_local", help="Local LanceDB directory")
+    parser.add_argument("--table", type=str, default="legal_documents", help="Table name in --source")
+    parser.add_argument("--queries", type=str, required=True, help="JSON file of labelled queries")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    parser.add_argument("--strategies", nargs="+", default=list(FUSION_STRATEGIES), choices=FUSION_STRATEGIES)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 50],
+                        help="Candidates fetched by each leg before fusion")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
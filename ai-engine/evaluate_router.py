@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of the local fast-path router.
+
+Reports, per labelled query set, how many routing LLM calls the local
+router would avoid and how accurate its local decisions are. Query sets:
+
+- canonical: the routing test cases in tests/test_orchestrator_routing_live.py
+  (also part of the router's training examples, so this is in-sample)
+- held-out: routing_eval_queries.yaml, labelled across all three agents and
+  kept out of the training examples; the accuracy to go by
+- bulk: queries from bulk_test_results_*.json, labelled by the agent that
+  answered them. Every one was answered by the Equity Management Expert, so
+  this set only shows how often equity queries are routed locally
+
+Examples:
+    python evaluate_router.py
+    python evaluate_router.py --thresholds 0.2 0.3 0.4 0.5 --verbose
+"""
+
+import os
+import re
+import ast
+import sys
+import glob
+import json
+import argparse
+from typing import List, Tuple
+
+import yaml
+
+# Allow running from any directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from src.agents.crews.legal_support_agents.router import LocalRouter, LOCAL_ROUTER_THRESHOLD, LOCAL_ROUTER_MIN_SCORE
+from src.agents.crews.legal_support_agents.runtime import CONFIG_DIR
+
+# Agent names used in older bulk test runs
+LEGACY_AGENT_NAMES = {"Stakeholder Expert": "Equity Management Expert"}
+
+HELD_OUT_PATH = os.path.join(BASE_DIR, "routing_eval_queries.yaml")
+
+LIVE_TEST_LISTS = {
+    "EMPLOYMENT_QUERIES": "Employment Expert",
+    "COMPLIANCE_QUERIES": "Compliance Specialist",
+    "EQUITY_QUERIES": "Equity Management Expert",
+}
+
+
+def canonical_queries() -> List[Tuple[str, str]]:
+    """Labelled queries from the live routing tests, read without importing the module."""
+    path = os.path.join(BASE_DIR, "tests", "test_orchestrator_routing_live.py")
+    with open(path, 'r') as f:
+        tree = ast.parse(f.read())
+    labelled = []
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) in LIVE_TEST_LISTS:
+            agent = LIVE_TEST_LISTS[node.targets[0].id]
+            labelled.extend((query, agent) for query in ast.literal_eval(node.value))
+    return labelled
+
+
+def held_out_queries() -> List[Tuple[str, str]]:
+    """Labelled queries kept out of the router's training examples."""
+    with open(HELD_OUT_PATH, 'r') as f:
+        queries = yaml.safe_load(f)
+    return [(query, agent) for agent, texts in queries.items() for query in texts]
+
+
+def bulk_queries() -> List[Tuple[str, str]]:
+    """Queries from bulk test result files, labelled by the agent prefix of each answer."""
+    labelled = []
+    for path in sorted(glob.glob(os.path.join(BASE_DIR, "bulk_test_results_*.json"))):
+        with open(path, 'r') as f:
+            results = json.load(f)
+        for group in results.values():
+            for query, answer in group.items():
+                match = re.match(r"\*\*\[(.+?)\]\*\*", answer)
+                if match:
+                    labelled.append((query, LEGACY_AGENT_NAMES.get(match.group(1), match.group(1))))
+    return labelled
+
+
+def evaluate(router: LocalRouter, labelled: List[Tuple[str, str]], verbose: bool = False) -> dict:
+    local = correct_local = correct_top1 = 0
+    for query, expected in labelled:
+        prediction = router.predict(query)
+        correct_top1 += prediction.agent == expected
+        if prediction.confident:
+            local += 1
+            correct_local += prediction.agent == expected
+        if verbose:
+            mark = "LOCAL" if prediction.confident else "LLM  "
+            status = "ok " if prediction.agent == expected else "ERR"
+            print(f"  {mark} {status} {prediction.confidence:.2f} {prediction.agent:<26} {query}")
+    total = len(labelled)
+    return {
+        "queries": total,
+        "llm_calls_avoided": local / total if total else 0.0,
+        "local_accuracy": correct_local / local if local else 0.0,
+        "top1_accuracy": correct_top1 / total if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local fast-path router offline")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[LOCAL_ROUTER_THRESHOLD])
+    parser.add_argument("--min-score", type=float, default=LOCAL_ROUTER_MIN_SCORE)
+    parser.add_argument("--verbose", action="store_true", help="Print every prediction")
+    args = parser.parse_args()
+
+    with open(CONFIG_DIR / "agents.yaml", 'r') as f:
+        agents_config = yaml.safe_load(f)
+    query_sets = {"canonical": canonical_queries(), "held-out": held_out_queries(), "bulk": bulk_queries()}
+
+    print(f"{'threshold':<11}{'set':<11}{'queries':>8}{'LLM calls avoided':>19}{'local acc':>11}{'top-1 acc':>11}")
+    for threshold in args.thresholds:
+        router = LocalRouter.from_config(agents_config, threshold=threshold, min_score=args.min_score)
+        for name, labelled in query_sets.items():
+            if args.verbose:
+                print(f"[{name} @ {threshold}]")
+            result = evaluate(router, labelled, args.verbose)
+            print(f"{threshold:<11.2f}{name:<11}{result['queries']:>8}{result['llm_calls_avoided']:>19.1%}"
+                  f"{result['local_accuracy']:>11.1%}{result['top1_accuracy']:>11.1%}")
+
+
+if __name__ == "__main__":
+    main()
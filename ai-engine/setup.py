@@ -13,7 +13,7 @@ setup(
         "pyyaml>=6.0.2",
         "numpy<2.0.0",
         "pandas>=2.0.0",
-        "lancedb>=0.21.2",
+        "lancedb>=0.40.0",
         "langchain-core>=0.1.28",
         "langchain>=0.0.335",
         "langchain-openai>=0.0.7",
@@ -29,5 +29,9 @@ setup(
         "python-multipart>=0.0.6",
         "python-docx>=0.8.11",
     ],
+    extras_require={
+        # Local CPU embeddings and the cross_encoder fusion (pip install .[local])
+        "local": ["sentence-transformers[onnx]>=3.2"],
+    },
     python_requires=">=3.10",
 ) 
\ No newline at end of file
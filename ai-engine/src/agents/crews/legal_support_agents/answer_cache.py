@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from src.agents.rag.embedding_cache import normalize_text
+from src.agents.rag.ttl_cache import TTLCache
+
+logger = logging.getLogger('legal_support_agents.answer_cache')
+
+# Answer cache backend: "" (disabled), "memory" (per process) or "sqlite" (shared by the workers on a host)
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "")
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache.sqlite3")
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+# Default seconds an answer is reused; agents can override it with answer_cache_ttl in agents.yaml (0 disables)
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+
+class MemoryAnswerStore:
+    """Answers in this process's memory, least recently used evicted first."""
+
+    blocking = False
+
+    def __init__(self, maxsize: int = ANSWER_CACHE_SIZE, clock: Callable[[], float] = time.monotonic):
+        self.answers = TTLCache(maxsize, clock=clock)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.answers.get(key)
+
+    def set(self, key: str, answer: str, ttl: float):
+        self.answers.set(key, answer, ttl)
+
+    def stats(self) -> Dict[str, float]:
+        return self.answers.stats()
+
+    def close(self):
+        self.answers.clear()
+
+
+class SqliteAnswerStore:
+    """
+    Answers in a local SQLite file, so every gunicorn worker on the host
+    shares them. Expired entries are dropped on lookup and the least
+    recently used are evicted beyond max_entries. Methods are blocking;
+    AnswerCache calls them from a worker thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, max_entries: int = ANSWER_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several gunicorn workers share the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT answer, expires_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, answer: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, answer, now + ttl, now),
+            )
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+            overflow = size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AnswerCache:
+    """
+    Final answers to repeated queries, in front of the specialist LLM call.
+
+    Keys cover everything an answer depends on: the query, the agent it was
+    routed to, the LLM deployment, a fingerprint of the agent's config and
+    task template, and for agents that retrieve documents, the retrieved
+    context. Editing an agent or changing the documents a query retrieves
+    therefore makes old answers unreachable; they age out of the store.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def key_for(query: str, agent: str, deployment: Optional[str], fingerprint: str,
+                context: Optional[Dict[str, str]] = None) -> str:
+        payload = json.dumps([normalize_text(query), agent, deployment, fingerprint, context or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            if self.store.blocking:
+                return await asyncio.to_thread(self.store.get, key)
+            return self.store.get(key)
+        except sqlite3.Error as e:
+            logger.error(f"Answer cache lookup failed: {e}")
+            return None
+
+    async def set(self, key: str, answer: str, ttl: float):
+        try:
+            if self.store.blocking:
+                await asyncio.to_thread(self.store.set, key, answer, ttl)
+            else:
+                self.store.set(key, answer, ttl)
+        except sqlite3.Error as e:
+            logger.error(f"Answer cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self.store).__name__, **self.store.stats()}
+
+    def close(self):
+        self.store.close()
+
+
+def create_answer_cache(backend: str = ANSWER_CACHE_BACKEND) -> Optional[AnswerCache]:
+    """Open the configured answer cache, or return None if it is disabled or unusable."""
+    if not backend:
+        return None
+    if backend == "memory":
+        return AnswerCache(MemoryAnswerStore())
+    if backend == "sqlite":
+        try:
+            return AnswerCache(SqliteAnswerStore())
+        except sqlite3.Error as e:
+            logger.error(f"Answer cache unavailable, continuing without it: {e}")
+            return None
+    raise ValueError(f"Unknown ANSWER_CACHE_BACKEND {backend!r}; expected memory or sqlite")
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import heapq
+import random
+import asyncio
+import hashlib
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import openai
+
+from src.agents.rag.tokenizer import count_tokens
+
+logger = logging.getLogger('legal_support_agents.gateway')
+
+# Upstream LLM requests in flight at once, across all queries
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Deployment quota (0 disables the limit); requests wait for capacity instead of hitting 429s
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Worker processes sharing the deployment quota, each limited to its share (gunicorn's default --workers)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Completion tokens assumed per call when charging the token budget
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+# Retries of rate-limited or failed calls, with jittered exponential backoff (seconds)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+
+class Priority(IntEnum):
+    """Order in which waiting calls get a slot; routing gates every answer, so it goes first."""
+    ROUTING = 0
+    ANSWER = 1
+
+
+class PriorityLimiter:
+    """An asyncio semaphore that hands free slots to the highest-priority waiter first (FIFO within a priority)."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled right after being handed a slot: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot moves to the waiter, so the active count is unchanged
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class TokenBucket:
+    """
+    Per-minute quota refilled continuously.
+
+    Callers reserve capacity up front and are told how long to wait for it,
+    so the level may go negative; later callers queue behind the debt.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount from the bucket and return the seconds to wait until it is covered."""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+
+class _InFlight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class LLMGateway:
+    """
+    The single path from the agents to the LLM deployment.
+
+    Calls wait for request/token quota, then for one of max_concurrency
+    slots (routing before answers), identical concurrent calls share one
+    upstream request, and rate-limited or failed calls are retried with
+    jittered backoff. A 429's Retry-After pauses every call, not just the
+    one that received it.
+
+    The quota is the deployment's, split evenly between the `workers`
+    processes that each run a gateway.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        workers: int = WEB_CONCURRENCY,
+    ):
+        self.limiter = PriorityLimiter(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute / workers) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute / workers) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.paused_until = 0.0
+        self._in_flight: Dict[str, _InFlight] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, tokens: int):
+        """
+        Hold one concurrency slot, once request/token quota and any Retry-After pause allow.
+
+        Waits happen before queueing for a slot, so a call waiting for quota
+        does not hold one that a routing call could use.
+        """
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        while True:
+            delay = max(delay, self.paused_until - time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.limiter.acquire(priority)
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                break
+            # A 429 paused calls while this one queued: wait again without the slot
+            self.limiter.release()
+        try:
+            yield
+        finally:
+            self.limiter.release()
+
+    async def call(self, create: Callable[..., Awaitable[Any]], priority: Priority, **kwargs) -> Any:
+        """
+        Run create(**kwargs), e.g. client.chat.completions.create, through the gateway.
+
+        A call identical to one already in flight waits for that call's
+        response instead of sending another request.
+        """
+        key = request_key(kwargs)
+        entry = self._in_flight.get(key)
+        if entry is None:
+            entry = _InFlight(asyncio.ensure_future(self._call_with_retries(create, priority, kwargs)))
+            self._in_flight[key] = entry
+            entry.task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            # Nobody is waiting for the response any more
+            if not entry.waiters and not entry.task.done():
+                entry.task.cancel()
+
+    async def stream(self, create: Callable[..., Awaitable[Any]], priority: Priority, **kwargs) -> AsyncIterator[Any]:
+        """
+        Stream the chunks of create(stream=True, **kwargs), holding a slot until the stream ends.
+
+        Opening the stream is retried like call(); a stream that fails midway is not.
+        """
+        tokens = estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            async with self.slot(priority, tokens):
+                self.calls += 1
+                try:
+                    stream = await create(**kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    async for chunk in stream:
+                        yield chunk
+                    return
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _call_with_retries(self, create: Callable[..., Awaitable[Any]], priority: Priority, kwargs: Dict[str, Any]):
+        tokens = estimate_tokens(kwargs)
+        attempt = 0
+        while True:
+            async with self.slot(priority, tokens):
+                self.calls += 1
+                try:
+                    return await create(**kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+            # Back off without holding a slot
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a failed call, or None if it should not be retried."""
+        upstream = upstream_error(error)
+        if not isinstance(upstream, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+            return None
+        if attempt >= self.max_retries:
+            return None
+        # Full jitter, so callers that failed together do not retry together
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if isinstance(upstream, openai.RateLimitError):
+            self.rate_limited += 1
+            retry_after = retry_after_seconds(upstream)
+            if retry_after is not None:
+                if retry_after > self.backoff_max:
+                    return None
+                delay = retry_after + random.uniform(0, self.backoff_base)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        self.retries += 1
+        logger.warning(f"LLM call failed ({type(upstream).__name__}), retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.limiter.active,
+            "waiting": self.limiter.waiting,
+            "max_concurrency": self.limiter.limit,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+        }
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Identity of a call's arguments, for coalescing identical calls."""
+    normalized = {name: value.__name__ if isinstance(value, type) else value for name, value in kwargs.items()}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """Tokens a call is charged against the per-minute token quota."""
+    prompt_tokens = sum(count_tokens(str(message.get("content") or "")) for message in kwargs.get("messages", []))
+    return prompt_tokens + (kwargs.get("max_tokens") or LLM_COMPLETION_TOKENS_ESTIMATE)
+
+
+def upstream_error(error: BaseException) -> BaseException:
+    """The OpenAI API error behind an exception (instructor wraps them in its retry exception)."""
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        if isinstance(current, openai.OpenAIError):
+            return current
+        seen.add(id(current))
+        current = current.__cause__ or current.__context__
+    return error
+
+
+def retry_after_seconds(error: openai.APIStatusError) -> Optional[float]:
+    """The wait a 429 response asks for, from retry-after-ms or Retry-After (seconds or HTTP date)."""
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        logger.debug(f"Unparseable Retry-After header: {headers.get('retry-after')}")
+    return None
@@ -1,18 +1,21 @@
 import os
-import yaml
-import logging
 import sys
 import json
+import asyncio
+import logging
+from contextlib import aclosing
 from pathlib import Path
-from typing import Type, Optional, Dict, Any
-from dotenv import load_dotenv
+from typing import Type, Optional, Dict, Any, AsyncIterator, List, Set, Tuple
 from enum import Enum
 
-from openai import AsyncAzureOpenAI
-import instructor
 from pydantic import BaseModel, Field
 
-from src.agents.rag.document_store import document_store, initialize_document_store
+from src.agents.rag.context_builder import CONTEXT_SEARCH_LIMIT, CONTEXT_TOKEN_BUDGET, build_context
+from src.agents.rag.document_store import SearchFilter, document_store, initialize_document_store
+from .router import AGENT_CONFIG_KEYS
+from .answer_cache import ANSWER_CACHE_TTL, AnswerCache
+from .gateway import Priority
+from .runtime import LLM_STREAM_INCLUDE_USAGE, AgentRuntime, ChatPrompt, get_agent_runtime
 
 # Configure minimal logging
 logging.basicConfig(
@@ -22,11 +25,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger('legal_support_agents')
 
+# Start context retrieval concurrently with routing (unused results are cancelled)
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+
 class AgentName(str, Enum):
     EMPLOYMENT = "Employment Expert"
     COMPLIANCE = "Compliance Specialist"
     EQUITY = "Equity Management Expert"
 
+# Task template used by each specialist agent
+ANSWER_TASKS = {
+    AgentName.EMPLOYMENT: "answer_employment_question",
+    AgentName.COMPLIANCE: "answer_compliance_question",
+    AgentName.EQUITY: "answer_equity_question",
+}
+
+# Methods that provide each context placeholder an agent's prompt may declare
+CONTEXT_PROVIDERS = {
+    "relevant_context": "get_relevant_context",
+}
+# A context fetch: the placeholder it fills, and the search filter and token budget of the agent it is for
+ContextKey = Tuple[str, Optional[SearchFilter], int]
+# Context given to the agent when retrieval fails; answers built on it are not cached
+CONTEXT_UNAVAILABLE = "Could not retrieve relevant documents due to an error."
+
 class RoutingDecision(BaseModel):
     agent_name: AgentName
 
@@ -36,51 +58,38 @@ class Answer(BaseModel):
 class LegalSupportAgents:
     BASE_DIR = Path(__file__).parent
     
-    def __init__(self, debug_enabled: bool = False):
+    def __init__(self, debug_enabled: bool = False, runtime: Optional[AgentRuntime] = None):
         """
-        Initialize the LegalSupportAgents with configs and an async LLM client.
+        Initialize the LegalSupportAgents on top of a shared agent runtime.
         
         Args:
             debug_enabled: Enable detailed request inspection logging
+            runtime: Runtime providing the LLM client and parsed configs;
+                defaults to the process-wide runtime
         """
-        load_dotenv()
-        
         # Store debug configuration
         self.debug_enabled = debug_enabled
         
-        # Load Azure OpenAI configuration from environment variables
-        self.azure_api_key = os.getenv("AZURE_OPENAI_KEY")
-        self.azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        self.azure_api_version = os.getenv("AZURE_OPENAI_VERSION")
-        self.azure_deployment = os.getenv("GPT4_DEPLOYMENT_NAME")
-
-        # Paths to configuration files
-        self.agents_config_path = os.path.join(self.BASE_DIR, "config", "agents.yaml")
-        self.tasks_config_path = os.path.join(self.BASE_DIR, "config", "tasks.yaml")
-        
-        # Load YAML configuration files
-        try:
-            with open(self.agents_config_path, 'r') as f:
-                self.agents_config = yaml.safe_load(f)
-            with open(self.tasks_config_path, 'r') as f:
-                self.tasks_config = yaml.safe_load(f)
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"Configuration file not found: {e.filename}") from e
-        except yaml.YAMLError as e:
-            raise ValueError(f"Error parsing YAML configuration: {e}") from e
-        
-        # Set up AsyncAzureOpenAI client and patch with Instructor
-        client = AsyncAzureOpenAI(
-            api_key=self.azure_api_key,
-            api_version=self.azure_api_version,
-            azure_endpoint=self.azure_endpoint
-        )
-        # Patch the client with instructor
-        self.client = instructor.apatch(client)
+        # Reuse the pooled client and pre-compiled configs instead of rebuilding them
+        self.runtime = runtime or get_agent_runtime()
+        self.azure_deployment = self.runtime.azure_deployment
+        self.client = self.runtime.client
         
         # Flag for lazy RAG initialization
         self.rag_initialized = False
 
+    @property
+    def agents_config(self) -> Dict[str, Any]:
+        return self.runtime.configs.agents_config
+
+    @property
+    def tasks_config(self) -> Dict[str, Any]:
+        return self.runtime.configs.tasks_config
+
+    @property
+    def prompts(self) -> Dict[str, ChatPrompt]:
+        return self.runtime.configs.prompts
+
     async def process_query(self, query: str) -> str:
         """
         Process a user query by routing it and generating an answer.
@@ -88,165 +97,385 @@ class LegalSupportAgents:
         Args:
             query: The user's query text
         """
+        prefetched: Dict[ContextKey, asyncio.Task] = {}
         try:
-            orchestrator_config = self.agents_config["orchestrator"]
+            prefetched = self.prefetch_context(query)
             employment_config = self.agents_config["employment_expert"]
             compliance_config = self.agents_config["compliance_specialist"]
             equity_config = self.agents_config["equity_management_expert"]
             
-            # Construct prompt for routing the query
-            routing_prompt = self.tasks_config["route_request"]["description"].format(
-                query=query,
-                agent_role=orchestrator_config["role"],
-                agent_goal=orchestrator_config["goal"],
-                agent_backstory=orchestrator_config["backstory"],
-                routing_guidelines="\n".join([f"- {item}" for item in orchestrator_config.get("routing_guidelines", [])]),
-                tone=orchestrator_config.get("tone")
-            )
+            agent_name = await self.route_query(query)
+            self._release_prefetched(prefetched, keep=self.context_keys(agent_name))
 
-            # Log request inspection details if debug is enabled
-            log_request_inspection(model_type=RoutingDecision, prompt=routing_prompt, agent_name="ROUTING", enabled=self.debug_enabled)
-
-            # Route the query using an LLM call
-            routing_decision = await self.client.chat.completions.create(
-                model=self.azure_deployment,
-                messages=[{"role": "user", "content": routing_prompt}],
-                response_model=RoutingDecision,
-                max_retries=2  # Retry on validation failure
-            )
+            # A repeated query over the same documents is answered from the cache, without the answer call
+            cache_key = await self.answer_cache_key(agent_name, query, prefetched)
+            if cache_key is not None:
+                cached = await self.runtime.answer_cache.get(cache_key)
+                if cached is not None:
+                    return cached
 
             # Define agent handlers with their corresponding configs
             agent_handlers = {
-                AgentName.EMPLOYMENT: lambda q: self._handle_employment_query(q, employment_config),
-                AgentName.COMPLIANCE: lambda q: self._handle_compliance_query(q, compliance_config),
-                AgentName.EQUITY: lambda q: self._handle_equity_query(q, equity_config)
+                AgentName.EMPLOYMENT: lambda q: self._handle_employment_query(q, employment_config, prefetched),
+                AgentName.COMPLIANCE: lambda q: self._handle_compliance_query(q, compliance_config, prefetched),
+                AgentName.EQUITY: lambda q: self._handle_equity_query(q, equity_config, prefetched)
             }
             
             # Use the appropriate handler or return a default message
-            handler = agent_handlers.get(routing_decision.agent_name)
+            handler = agent_handlers.get(agent_name)
             if handler:
-                return await handler(query)
+                answer = await handler(query)
+                if cache_key is not None:
+                    await self.runtime.answer_cache.set(cache_key, answer, self.answer_cache_ttl(agent_name))
+                return answer
             
             return "**[Support Request Orchestrator]** I'm sorry, but I cannot answer that question."
 
         except Exception as e:
             logger.error(f"Unexpected error: {e}", exc_info=True)
             return "An error occurred while processing your query."
+        finally:
+            self._release_prefetched(prefetched)
+
+    async def stream_query(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user query, yielding events as soon as they are available.
+
+        Yields a "route" event with the chosen agent, then one "token" event
+        per streamed chunk of the specialist's answer, and finally "done"
+        (or "error" if anything fails along the way).
+
+        Args:
+            query: The user's query text
+        """
+        prefetched: Dict[ContextKey, asyncio.Task] = {}
+        try:
+            prefetched = self.prefetch_context(query)
+            agent_name = await self.route_query(query)
+            self._release_prefetched(prefetched, keep=self.context_keys(agent_name))
+            yield {"event": "route", "data": {"agent": agent_name.value}}
+
+            messages = await self.build_answer_prompt(agent_name, query, prefetched)
+            log_request_inspection(model_type=Answer, messages=messages, agent_name=agent_name.name, enabled=self.debug_enabled)
+
+            # Raw streaming: instructor validation would hold tokens back until the end
+            stream_options = {"stream_options": {"include_usage": True}} if LLM_STREAM_INCLUDE_USAGE else {}
+            stream = self.runtime.gateway.stream(
+                self.runtime.stream_client.chat.completions.create,
+                Priority.ANSWER,
+                model=self.azure_deployment,
+                messages=messages,
+                stream=True,
+                **stream_options
+            )
+            # Closing the stream promptly frees its gateway slot if the client goes away
+            async with aclosing(stream):
+                async for chunk in stream:
+                    # Azure sends content-filter chunks without choices; the usage chunk comes last
+                    if getattr(chunk, "usage", None) is not None:
+                        self.runtime.prompt_cache_stats.record(ANSWER_TASKS[agent_name], chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield {"event": "token", "data": {"content": chunk.choices[0].delta.content}}
+
+            yield {"event": "done", "data": {}}
+
+        except Exception as e:
+            logger.error(f"Unexpected error while streaming: {e}", exc_info=True)
+            yield {"event": "error", "data": {"message": "An error occurred while processing your query."}}
+        finally:
+            self._release_prefetched(prefetched)
+
+    async def route_query(self, query: str) -> AgentName:
+        """
+        Pick the specialist agent for a query.
+
+        Repeated (or, with an embedding, near-identical) queries reuse a
+        cached decision and queries the local router classifies confidently
+        skip the routing LLM call; everything else is routed by the LLM.
+        """
+        configs = self.runtime.configs
+        routing_cache = self.runtime.routing_cache
+        routing_cache.validate(configs.routing_fingerprint)
+        cached = routing_cache.get(query)
+        if cached:
+            return AgentName(cached)
+
+        if configs.local_router:
+            agent_name = configs.local_router.route(query)
+            if agent_name:
+                return AgentName(agent_name)
+
+        query_embedding = await self.routing_embedding(query) if routing_cache.semantic_enabled else None
+        if query_embedding is not None:
+            cached = routing_cache.get_similar(query_embedding)
+            if cached:
+                return AgentName(cached)
+
+        # Construct messages for routing the query
+        routing_messages = configs.prompts["route_request"].render(query=query)
+
+        # Log request inspection details if debug is enabled
+        log_request_inspection(model_type=RoutingDecision, messages=routing_messages, agent_name="ROUTING", enabled=self.debug_enabled)
+
+        # Route the query using an LLM call
+        routing_decision = await self.runtime.gateway.call(
+            self.client.chat.completions.create,
+            Priority.ROUTING,
+            model=self.azure_deployment,
+            messages=routing_messages,
+            response_model=RoutingDecision,
+            max_retries=2  # Retry on validation failure
+        )
+        self.record_usage("route_request", routing_decision)
+        # Skip caching if the configs were reloaded while the call was in flight
+        if routing_cache.fingerprint == configs.routing_fingerprint:
+            routing_cache.set(query, routing_decision.agent_name.value, query_embedding)
+        return routing_decision.agent_name
+
+    async def routing_embedding(self, query: str):
+        """
+        Query embedding for semantic routing cache lookups, or None if unavailable.
+
+        Comes from the document store's query embeddings, which are cached
+        and single-flight, so this lookup and the prefetched search for the
+        same query embed it once.
+        """
+        if document_store.embedding_service is None:
+            return None
+        try:
+            return await document_store.embed_query(query)
+        except Exception as e:
+            logger.warning(f"Routing cache lookup without embedding: {e}")
+            return None
+
+    def context_dependencies(self, agent_name: AgentName) -> Set[str]:
+        """
+        Context placeholders an agent's prompt declares (e.g. {relevant_context}).
+
+        Each one must have a provider in CONTEXT_PROVIDERS; adding a placeholder
+        to an agent's task template is all it takes for the orchestrator to
+        fetch, and prefetch, that context.
+        """
+        return self.prompts[ANSWER_TASKS[agent_name]].fields - {"query"}
+
+    def record_usage(self, task_name: str, response: BaseModel):
+        """Count the prompt tokens of an instructor response that hit the provider's prompt cache."""
+        raw_response = getattr(response, "_raw_response", None)
+        self.runtime.prompt_cache_stats.record(task_name, getattr(raw_response, "usage", None))
+
+    def search_filter(self, agent_name: AgentName) -> Optional[SearchFilter]:
+        """
+        Prefilter for an agent's document searches, from the search_domains
+        of its agents.yaml entry. Untagged documents stay visible to every agent.
+        """
+        domains = self.agents_config.get(AGENT_CONFIG_KEYS[agent_name.value], {}).get("search_domains")
+        return SearchFilter(domains=tuple(domains), include_untagged=True) if domains else None
+
+    def context_token_budget(self, agent_name: AgentName) -> int:
+        """Prompt tokens for an agent's retrieved context, from context_token_budget in agents.yaml."""
+        config = self.agents_config.get(AGENT_CONFIG_KEYS[agent_name.value], {})
+        return int(config.get("context_token_budget", CONTEXT_TOKEN_BUDGET))
+
+    def answer_cache_ttl(self, agent_name: AgentName) -> float:
+        """Seconds an agent's answers are reused, from answer_cache_ttl in agents.yaml (0 disables)."""
+        config = self.agents_config.get(AGENT_CONFIG_KEYS[agent_name.value], {})
+        return float(config.get("answer_cache_ttl", ANSWER_CACHE_TTL))
+
+    async def answer_cache_key(
+        self,
+        agent_name: AgentName,
+        query: str,
+        prefetched: Dict[ContextKey, asyncio.Task]
+    ) -> Optional[str]:
+        """
+        Answer cache key for a routed query, or None if its answer is not cached.
+
+        Answers built on retrieved documents are keyed on the context the
+        agent is given, so every worker builds the same key, a document
+        added or deleted through any worker changes it once retrieval sees
+        the change, and compacting the table does not.
+        """
+        if self.runtime.answer_cache is None or self.answer_cache_ttl(agent_name) <= 0:
+            return None
+        context = await self.answer_context(agent_name, query, prefetched)
+        if CONTEXT_UNAVAILABLE in context.values():
+            return None
+        task_name = ANSWER_TASKS[agent_name]
+        return AnswerCache.key_for(
+            query, agent_name.value, self.azure_deployment,
+            self.runtime.configs.task_fingerprints[task_name], context,
+        )
+
+    def context_keys(self, agent_name: AgentName) -> Set[ContextKey]:
+        """(placeholder, search filter, token budget) keys identifying the context fetches an agent needs."""
+        search_filter = self.search_filter(agent_name)
+        token_budget = self.context_token_budget(agent_name)
+        return {(field, search_filter, token_budget) for field in self.context_dependencies(agent_name)}
+
+    def prefetch_context(self, query: str) -> Dict[ContextKey, asyncio.Task]:
+        """Start fetching every context any agent may need, before routing finishes."""
+        if not SPECULATIVE_RETRIEVAL:
+            return {}
+        # Agents sharing a search filter and budget share the fetch
+        keys = set().union(*(self.context_keys(agent_name) for agent_name in ANSWER_TASKS))
+        return {
+            key: asyncio.create_task(getattr(self, CONTEXT_PROVIDERS[key[0]])(query, *key[1:]))
+            for key in keys
+        }
+
+    @staticmethod
+    def _release_prefetched(prefetched: Dict[ContextKey, asyncio.Task],
+                            keep: Set[ContextKey] = frozenset()):
+        """Cancel speculative context fetches that are no longer needed."""
+        for key, task in prefetched.items():
+            if key not in keep and not task.done():
+                task.cancel()
+
+    async def answer_context(
+        self,
+        agent_name: AgentName,
+        query: str,
+        prefetched: Dict[ContextKey, asyncio.Task]
+    ) -> Dict[str, str]:
+        """
+        Fill in the context placeholders an agent's prompt declares.
+
+        Uses the prefetched fetches; missing ones are started and added to
+        prefetched, so a later call for the same agent reuses them.
+        """
+        values = {}
+        for key in self.context_keys(agent_name):
+            task = prefetched.get(key)
+            if task is None or task.cancelled():
+                task = asyncio.create_task(getattr(self, CONTEXT_PROVIDERS[key[0]])(query, *key[1:]))
+                prefetched[key] = task
+            values[key[0]] = await task
+        return values
+
+    async def build_answer_prompt(
+        self,
+        agent_name: AgentName,
+        query: str,
+        prefetched: Optional[Dict[ContextKey, asyncio.Task]] = None
+    ) -> List[Dict[str, str]]:
+        """Render the specialist's messages for a routed query, filling in any context it declares."""
+        template = self.prompts[ANSWER_TASKS[agent_name]]
+        context = await self.answer_context(agent_name, query, {} if prefetched is None else prefetched)
+        return template.render(query=query, **context)
     
-    async def _handle_employment_query(self, query: str, employment_config: dict) -> str:
+    async def _handle_employment_query(
+        self,
+        query: str,
+        employment_config: dict,
+        prefetched: Optional[Dict[ContextKey, asyncio.Task]] = None
+    ) -> str:
         """Handle queries related to employment and stock options."""
-        relevant_context = await self.get_relevant_context(query)
-
-        employment_prompt = self.tasks_config["answer_employment_question"]["description"].format(
-            query=query, 
-            relevant_context=relevant_context,
-            agent_role=employment_config["role"],
-            agent_goal=employment_config["goal"],
-            agent_backstory=employment_config["backstory"],
-            expertise_areas="\n".join([f"- {item}" for item in employment_config.get("expertise_areas", [])]),
-            response_guidelines=employment_config.get("response_guidelines"),
-            tone=employment_config.get("tone")
-        )
+        employment_messages = await self.build_answer_prompt(AgentName.EMPLOYMENT, query, prefetched)
 
-        log_request_inspection(model_type=Answer, prompt=employment_prompt, agent_name="EMPLOYMENT", enabled=self.debug_enabled)
+        log_request_inspection(model_type=Answer, messages=employment_messages, agent_name="EMPLOYMENT", enabled=self.debug_enabled)
 
-        answer = await self.client.chat.completions.create(
+        answer = await self.runtime.gateway.call(
+            self.client.chat.completions.create,
+            Priority.ANSWER,
             model=self.azure_deployment,
-            messages=[{"role": "user", "content": employment_prompt}],
+            messages=employment_messages,
             response_model=Answer,
             max_retries=2
         )
+        self.record_usage(ANSWER_TASKS[AgentName.EMPLOYMENT], answer)
         return f"**[Employment Expert]** {answer.content}"
     
-    async def _handle_compliance_query(self, query: str, compliance_config: dict) -> str:
+    async def _handle_compliance_query(
+        self,
+        query: str,
+        compliance_config: dict,
+        prefetched: Optional[Dict[ContextKey, asyncio.Task]] = None
+    ) -> str:
         """Handle queries related to compliance and regulatory requirements."""
-        compliance_prompt = self.tasks_config["answer_compliance_question"]["description"].format(
-            query=query,
-            agent_role=compliance_config["role"],
-            agent_goal=compliance_config["goal"],
-            agent_backstory=compliance_config["backstory"],
-            response_guidelines=compliance_config.get("response_guidelines"),
-            tone=compliance_config.get("tone")
-        )
+        compliance_messages = await self.build_answer_prompt(AgentName.COMPLIANCE, query, prefetched)
 
-        log_request_inspection(model_type=Answer, prompt=compliance_prompt, agent_name="COMPLIANCE", enabled=self.debug_enabled)
+        log_request_inspection(model_type=Answer, messages=compliance_messages, agent_name="COMPLIANCE", enabled=self.debug_enabled)
         
-        answer = await self.client.chat.completions.create(
+        answer = await self.runtime.gateway.call(
+            self.client.chat.completions.create,
+            Priority.ANSWER,
             model=self.azure_deployment,
-            messages=[{"role": "user", "content": compliance_prompt}],
+            messages=compliance_messages,
             response_model=Answer,
             max_retries=2
         )
+        self.record_usage(ANSWER_TASKS[AgentName.COMPLIANCE], answer)
         return f"**[Compliance Specialist]** {answer.content}"
     
-    async def _handle_equity_query(self, query: str, equity_config: dict) -> str:
+    async def _handle_equity_query(
+        self,
+        query: str,
+        equity_config: dict,
+        prefetched: Optional[Dict[ContextKey, asyncio.Task]] = None
+    ) -> str:
         """
         Handle queries related to equity management and company structure.
         
         Args:
             query: The user's query text
             equity_config: The configuration for the equity management expert agent
+            prefetched: Context fetches started speculatively during routing
         """
-        equity_prompt = self.tasks_config["answer_equity_question"]["description"].format(
-            query=query,
-            agent_role=equity_config["role"],
-            agent_goal=equity_config["goal"],
-            agent_backstory=equity_config["backstory"],
-            expertise_areas="\n".join([f"- {item}" for item in equity_config.get("expertise_areas", [])]),
-            response_guidelines=equity_config.get("response_guidelines"),
-            tone=equity_config.get("tone")
-        )
+        equity_messages = await self.build_answer_prompt(AgentName.EQUITY, query, prefetched)
 
-        log_request_inspection(model_type=Answer, prompt=equity_prompt, agent_name="EQUITY", enabled=self.debug_enabled)
+        log_request_inspection(model_type=Answer, messages=equity_messages, agent_name="EQUITY", enabled=self.debug_enabled)
         
-        answer = await self.client.chat.completions.create(
+        answer = await self.runtime.gateway.call(
+            self.client.chat.completions.create,
+            Priority.ANSWER,
             model=self.azure_deployment,
-            messages=[{"role": "user", "content": equity_prompt}],
+            messages=equity_messages,
             response_model=Answer,
             max_retries=2
         )
+        self.record_usage(ANSWER_TASKS[AgentName.EQUITY], answer)
         return f"**[Equity Management Expert]** {answer.content}"
     
     async def ensure_rag_initialized(self):
         """Ensure the RAG document store is initialized, but only once."""
         if not self.rag_initialized:
-            await initialize_document_store()
+            # The API lifespan normally initializes the shared store already
+            if document_store.table is None:
+                await initialize_document_store()
             self.rag_initialized = True
     
-    async def search_documents(self, query: str, limit: int = 5):
+    async def search_documents(self, query: str, limit: int = 5, search_filter: Optional[SearchFilter] = None):
         """Search for relevant documents in the document store."""
         await self.ensure_rag_initialized()
-        results = await document_store.search(query, limit)
+        results = await document_store.search(query, limit, search_filter=search_filter)
         return results
     
-    async def get_relevant_context(self, query: str) -> str:
-        """Retrieve and format relevant document context for the query."""
+    async def get_relevant_context(self, query: str, search_filter: Optional[SearchFilter] = None,
+                                   token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+        """
+        Retrieve relevant document context for the query, merged and trimmed to a token budget.
+
+        Args:
+            query: The user's query text
+            search_filter: Prefilter of the agent the context is for
+            token_budget: Maximum prompt tokens of the context
+        """
         try:
             await self.ensure_rag_initialized()
-            results = await self.search_documents(query)
-            
-            if not results or len(results) == 0:
-                return "No relevant documents found."
-            
-            context = "Here is relevant information from our documents:\n\n"
-            for i, result in enumerate(results):
-                context += f"Document {i+1}: {result['document_name']}\n"
-                if result.get('section'):
-                    context += f"Section: {result['section']}\n"
-                context += f"Content: {result['text']}\n\n"
-            return context
+            results = await self.search_documents(query, CONTEXT_SEARCH_LIMIT, search_filter)
+            return build_context(results, token_budget)
         except Exception as e:
             logger.error(f"Error retrieving document context: {e}")
-            return "Could not retrieve relevant documents due to an error."
+            return CONTEXT_UNAVAILABLE
 
 # Function to log request inspection details
-def log_request_inspection(model_type: Type[BaseModel], prompt: str, agent_name: str = "INSTRUCTOR", enabled: bool = True):
+def log_request_inspection(model_type: Type[BaseModel], messages: List[Dict[str, str]], agent_name: str = "INSTRUCTOR", enabled: bool = True):
     """
     Log the request inspection details for an agent call.
     
     Args:
         model_type: The Pydantic model type being used for the response
-        prompt: The prompt text being sent to the agent
+        messages: The chat messages being sent to the agent
         agent_name: Name of the agent for logging purposes
         enabled: Whether logging is enabled
     """
@@ -257,6 +486,6 @@ def log_request_inspection(model_type: Type[BaseModel], prompt: str, agent_name:
     schema = model_type.model_json_schema()
     
     print(f"\n\n==== {agent_name} REQUEST INSPECTION ====")
-    print("Messages:", json.dumps([{"role": "user", "content": prompt}], indent=2))
+    print("Messages:", json.dumps(messages, indent=2))
     print("Pydantic Schema:", json.dumps(schema, indent=2))
     print("=================================================\n\n")
\ No newline at end of file
@@ -0,0 +1,265 @@
+import os
+import re
+import math
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import yaml
+import numpy as np
+
+from src.agents.rag.embedding_cache import normalize_text
+from src.agents.rag.ttl_cache import TTLCache
+
+logger = logging.getLogger('legal_support_agents.router')
+
+# Local fast-path router in front of the LLM orchestrator
+LOCAL_ROUTER_ENABLED = os.getenv("LOCAL_ROUTER_ENABLED", "true").lower() == "true"
+# Minimum relative margin between the best and second-best agent to answer locally
+LOCAL_ROUTER_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.4"))
+# Minimum cosine similarity to the best agent's centroid
+LOCAL_ROUTER_MIN_SCORE = float(os.getenv("LOCAL_ROUTER_MIN_SCORE", "0.15"))
+
+# Cache of LLM routing decisions (entries / seconds)
+ROUTING_CACHE_SIZE = int(os.getenv("ROUTING_CACHE_SIZE", "1024"))
+ROUTING_CACHE_TTL = float(os.getenv("ROUTING_CACHE_TTL", "3600"))
+# Cosine similarity above which a cached decision is reused for a reworded query (0 disables)
+ROUTING_CACHE_SIMILARITY = float(os.getenv("ROUTING_CACHE_SIMILARITY", "0.95"))
+
+ROUTING_EXAMPLES_PATH = Path(__file__).parent / "config" / "routing_examples.yaml"
+
+# agents.yaml entry describing each routable agent
+AGENT_CONFIG_KEYS = {
+    "Employment Expert": "employment_expert",
+    "Compliance Specialist": "compliance_specialist",
+    "Equity Management Expert": "equity_management_expert",
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from has have how i in is it its me my of on or our
+should so that the their there this to was we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords, with plural 's' stripped."""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class RoutingPrediction(NamedTuple):
+    agent: str
+    confidence: float
+    score: float
+    source: str  # "rule" or "classifier"
+    confident: bool
+
+
+class LocalRouter:
+    """
+    Lightweight local query classifier used before the routing LLM call.
+
+    Each agent is represented by the TF-IDF centroid of its example queries;
+    a query goes to the nearest centroid when it clearly beats the runner-up.
+    Regex rules (e.g. "Can the platform help...") are checked first.
+    """
+
+    def __init__(
+        self,
+        examples: Dict[str, List[str]],
+        rules: Optional[List[Tuple[str, str]]] = None,
+        threshold: float = LOCAL_ROUTER_THRESHOLD,
+        min_score: float = LOCAL_ROUTER_MIN_SCORE,
+    ):
+        self.threshold = threshold
+        self.min_score = min_score
+        self.rules = [(re.compile(pattern, re.IGNORECASE), agent) for pattern, agent in (rules or [])]
+        self.local_routes = 0
+        self.fallbacks = 0
+
+        documents = [tokenize(text) for texts in examples.values() for text in texts]
+        document_frequency = Counter(token for tokens in documents for token in set(tokens))
+        self.idf = {
+            token: math.log((1 + len(documents)) / (1 + count)) + 1
+            for token, count in document_frequency.items()
+        }
+
+        self.centroids: Dict[str, Dict[str, float]] = {}
+        for agent, texts in examples.items():
+            centroid: Counter = Counter()
+            for text in texts:
+                for token, weight in self._vectorize(text).items():
+                    centroid[token] += weight / len(texts)
+            self.centroids[agent] = _normalize(centroid)
+
+    @classmethod
+    def from_config(
+        cls,
+        agents_config: dict,
+        examples_path: Union[str, Path] = ROUTING_EXAMPLES_PATH,
+        **kwargs
+    ) -> "LocalRouter":
+        """Train from the labelled examples file plus each agent's expertise areas."""
+        with open(examples_path, 'r') as f:
+            config = yaml.safe_load(f)
+
+        examples = {agent: list(texts) for agent, texts in config.get("examples", {}).items()}
+        for agent, config_key in AGENT_CONFIG_KEYS.items():
+            if agent in examples:
+                examples[agent].extend(agents_config.get(config_key, {}).get("expertise_areas", []))
+
+        rules = [(rule["pattern"], rule["agent"]) for rule in config.get("rules", [])]
+        return cls(examples, rules, **kwargs)
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        counts = Counter(tokenize(text))
+        return _normalize({token: count * self.idf[token] for token, count in counts.items() if token in self.idf})
+
+    def predict(self, query: str) -> RoutingPrediction:
+        """Best-guess agent for a query, with a confidence in [0, 1]."""
+        for pattern, agent in self.rules:
+            if pattern.search(query):
+                return RoutingPrediction(agent, 1.0, 1.0, "rule", True)
+
+        vector = self._vectorize(query)
+        scores = sorted(
+            ((sum(weight * centroid.get(token, 0.0) for token, weight in vector.items()), agent)
+             for agent, centroid in self.centroids.items()),
+            reverse=True,
+        )
+        (best, agent), (runner_up, _) = scores[0], scores[1]
+        confidence = (best - runner_up) / best if best > 0 else 0.0
+        confident = best >= self.min_score and confidence >= self.threshold
+        return RoutingPrediction(agent, confidence, best, "classifier", confident)
+
+    def route(self, query: str) -> Optional[str]:
+        """Agent name if the query can be routed locally, else None for the LLM to decide."""
+        prediction = self.predict(query)
+        if not prediction.confident:
+            self.fallbacks += 1
+            return None
+        self.local_routes += 1
+        logger.debug(f"Routed locally to {prediction.agent} ({prediction.source}, confidence {prediction.confidence:.2f})")
+        return prediction.agent
+
+    def stats(self) -> Dict[str, float]:
+        total = self.local_routes + self.fallbacks
+        return {
+            "local_routes": self.local_routes,
+            "llm_fallbacks": self.fallbacks,
+            "llm_calls_avoided": self.local_routes / total if total else 0.0,
+        }
+
+
+class RoutingCache:
+    """
+    Recent routing decisions, keyed on normalized, case-folded query text.
+
+    Entries also keep the query embedding, so a reworded query whose
+    embedding is close enough to a cached one reuses its decision. The
+    embeddings are kept stacked in one matrix, rebuilt only after new
+    decisions, so a lookup is a single matrix-vector product. All entries
+    are dropped when the routing prompt fingerprint changes.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = ROUTING_CACHE_SIZE,
+        ttl: float = ROUTING_CACHE_TTL,
+        similarity: float = ROUTING_CACHE_SIMILARITY,
+    ):
+        self.decisions = TTLCache(maxsize, ttl)
+        self.similarity = similarity
+        self.fingerprint: Optional[str] = None
+        self.semantic_hits = 0
+        self.invalidations = 0
+        # Unit embeddings of the cached queries, one row per key (None until rebuilt)
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[Tuple[str, str]] = []
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity > 0
+
+    def validate(self, fingerprint: str):
+        """Drop every cached decision if the routing prompt changed since they were made."""
+        if fingerprint != self.fingerprint:
+            if self.fingerprint is not None:
+                self.decisions.clear()
+                self._matrix = None
+                self.invalidations += 1
+            self.fingerprint = fingerprint
+
+    def get(self, query: str) -> Optional[str]:
+        entry = self.decisions.get(_cache_key(query))
+        return entry[0] if entry else None
+
+    def get_similar(self, embedding) -> Optional[str]:
+        """Decision for the most similar cached query, if it clears the similarity threshold."""
+        if not self.semantic_enabled:
+            return None
+        query = _unit(embedding)
+        for _ in range(2):
+            matrix = self._embedding_matrix()
+            if matrix is None:
+                return None
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity:
+                return None
+            key, agent = self._matrix_keys[best]
+            if key in self.decisions:
+                self.semantic_hits += 1
+                logger.debug(f"Reused routing decision for similar query '{key}' ({similarities[best]:.3f})")
+                return agent
+            # The best match expired or was evicted since the matrix was built
+            self._matrix = None
+        return None
+
+    def set(self, query: str, agent: str, embedding=None):
+        self.decisions.set(_cache_key(query), (agent, _unit(embedding) if embedding is not None else None))
+        self._matrix = None
+
+    def _embedding_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None:
+            entries = [(key, entry) for key, entry in self.decisions.items() if entry[1] is not None]
+            self._matrix_keys = [(key, agent) for key, (agent, _) in entries]
+            self._matrix = np.stack([vector for _, (_, vector) in entries]) if entries else np.empty((0, 0), np.float32)
+        return self._matrix if len(self._matrix_keys) else None
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.decisions.stats(), "semantic_hits": self.semantic_hits, "invalidations": self.invalidations}
+
+
+def _cache_key(query: str) -> str:
+    # Case does not change routing, unlike retrieval
+    return normalize_text(query).casefold()
+
+
+def _unit(vector) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {token: weight / norm for token, weight in vector.items()} if norm else {}
+
+
+def load_local_router(agents_config: dict) -> Optional[LocalRouter]:
+    """Build the configured local router, or None if it is disabled or cannot be loaded."""
+    if not LOCAL_ROUTER_ENABLED:
+        return None
+    try:
+        return LocalRouter.from_config(agents_config)
+    except (OSError, yaml.YAMLError, KeyError) as e:
+        logger.error(f"Local router unavailable, all queries will use the LLM router: {e}")
+        return None
@@ -0,0 +1,318 @@
+import os
+import json
+import string
+import hashlib
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Union, Tuple
+
+import yaml
+import httpx
+import instructor
+from openai import AsyncAzureOpenAI
+from dotenv import load_dotenv
+
+from .answer_cache import AnswerCache, create_answer_cache
+from .gateway import LLMGateway
+from .router import LocalRouter, RoutingCache, load_local_router
+
+logger = logging.getLogger('legal_support_agents.runtime')
+
+load_dotenv()
+
+# Connection pool settings for the shared Azure OpenAI client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Seconds between checks for edited YAML configs (0 disables hot reload)
+AGENT_CONFIG_RELOAD_INTERVAL = float(os.getenv("AGENT_CONFIG_RELOAD_INTERVAL", "0"))
+# Ask for token usage at the end of streamed answers (needs Azure OpenAI API version 2024-09-01 or later)
+LLM_STREAM_INCLUDE_USAGE = os.getenv("LLM_STREAM_INCLUDE_USAGE", "false").lower() == "true"
+
+CONFIG_DIR = Path(__file__).parent / "config"
+
+# Agent config whose static fields are rendered into each task template
+TASK_AGENTS = {
+    "route_request": "orchestrator",
+    "answer_employment_question": "employment_expert",
+    "answer_compliance_question": "compliance_specialist",
+    "answer_equity_question": "equity_management_expert",
+}
+
+_FORMATTER = string.Formatter()
+
+
+def agent_template_fields(agent_config: dict) -> Dict[str, Any]:
+    """Build the static template placeholders provided by an agent config."""
+    return {
+        "agent_role": agent_config["role"],
+        "agent_goal": agent_config["goal"],
+        "agent_backstory": agent_config["backstory"],
+        "routing_guidelines": "\n".join([f"- {item}" for item in agent_config.get("routing_guidelines", [])]),
+        "expertise_areas": "\n".join([f"- {item}" for item in agent_config.get("expertise_areas", [])]),
+        "response_guidelines": agent_config.get("response_guidelines"),
+        "tone": agent_config.get("tone"),
+    }
+
+
+class PromptTemplate:
+    """
+    A task template with its static agent fields rendered once up front.
+
+    Only the per-request placeholders (e.g. {query}, {relevant_context}) are
+    filled in at render time, by joining pre-split literal segments.
+    """
+
+    def __init__(self, template: str, static_fields: Dict[str, Any]):
+        self.segments: List[Union[str, Tuple[str, str]]] = []
+        buffer = ""
+        for literal, field, format_spec, conversion in _FORMATTER.parse(template):
+            buffer += literal
+            if field is None:
+                continue
+            if field in static_fields:
+                value = _FORMATTER.convert_field(static_fields[field], conversion)
+                buffer += _FORMATTER.format_field(value, format_spec or "")
+            else:
+                self.segments.append(buffer)
+                self.segments.append((field, format_spec or ""))
+                buffer = ""
+        self.segments.append(buffer)
+        self.fields = {segment[0] for segment in self.segments if isinstance(segment, tuple)}
+
+    def render(self, **values) -> str:
+        """Fill in the per-request placeholders."""
+        return "".join(
+            segment if isinstance(segment, str) else format(values[segment[0]], segment[1])
+            for segment in self.segments
+        )
+
+
+class ChatPrompt:
+    """
+    A task's chat messages: its static description as the system message,
+    followed by a user message rendered from its per-request input template.
+
+    The system message is rendered once and must not depend on the request,
+    so every call for the task starts with the same bytes and the model
+    provider can serve that prefix from its prompt cache.
+    """
+
+    def __init__(self, task_name: str, task_config: Dict[str, Any], static_fields: Dict[str, Any]):
+        system = PromptTemplate(task_config["description"], static_fields)
+        if system.fields:
+            raise ValueError(
+                f"Task {task_name}: per-request fields {sorted(system.fields)} belong in its input, "
+                f"not its description"
+            )
+        self.system_message = system.render()
+        self.user = PromptTemplate(task_config["input"], static_fields)
+        self.fields = self.user.fields
+
+    def render(self, **values) -> List[Dict[str, str]]:
+        """Chat messages for one request."""
+        return [
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": self.user.render(**values)},
+        ]
+
+
+class PromptCacheStats:
+    """Prompt tokens the provider served from its prompt cache, per task."""
+
+    def __init__(self):
+        self.tasks: Dict[str, Dict[str, int]] = {}
+
+    def record(self, task_name: str, usage):
+        """Add the usage of one chat completion (ignored if the response has none)."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        counters = self.tasks.setdefault(task_name, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        counters["calls"] += 1
+        counters["prompt_tokens"] += usage.prompt_tokens or 0
+        counters["cached_tokens"] += (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    def stats(self) -> Dict[str, Any]:
+        prompt_tokens = sum(counters["prompt_tokens"] for counters in self.tasks.values())
+        cached_tokens = sum(counters["cached_tokens"] for counters in self.tasks.values())
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "tasks": {
+                task_name: {
+                    **counters,
+                    "cached_ratio": counters["cached_tokens"] / counters["prompt_tokens"] if counters["prompt_tokens"] else 0.0,
+                }
+                for task_name, counters in self.tasks.items()
+            },
+        }
+
+
+class AgentConfigs:
+    """Immutable snapshot of the parsed YAML configs, compiled prompts and local router."""
+
+    def __init__(self, agents_config_path: Union[str, Path], tasks_config_path: Union[str, Path]):
+        self.agents_config_path = str(agents_config_path)
+        self.tasks_config_path = str(tasks_config_path)
+        self.mtimes = _config_mtimes(self.agents_config_path, self.tasks_config_path)
+
+        try:
+            with open(self.agents_config_path, 'r') as f:
+                self.agents_config = yaml.safe_load(f)
+            with open(self.tasks_config_path, 'r') as f:
+                self.tasks_config = yaml.safe_load(f)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Configuration file not found: {e.filename}") from e
+        except yaml.YAMLError as e:
+            raise ValueError(f"Error parsing YAML configuration: {e}") from e
+
+        self.prompts: Dict[str, ChatPrompt] = {}
+        # Identifies the agent and task config each task's answers were generated with
+        self.task_fingerprints: Dict[str, str] = {}
+        for task_name, agent_key in TASK_AGENTS.items():
+            fields = agent_template_fields(self.agents_config[agent_key])
+            self.prompts[task_name] = ChatPrompt(task_name, self.tasks_config[task_name], fields)
+            config = {"agent": self.agents_config[agent_key], "task": self.tasks_config[task_name]}
+            self.task_fingerprints[task_name] = hashlib.sha256(
+                json.dumps(config, sort_keys=True, default=str).encode()
+            ).hexdigest()
+
+        # Identifies the routing prompt (guidelines, agent roles) cached decisions were made with
+        routing_messages = self.prompts["route_request"].render(query="")
+        self.routing_fingerprint = hashlib.sha256(
+            "\n".join(message["content"] for message in routing_messages).encode()
+        ).hexdigest()
+
+        # Retrained together with the prompts so expertise_areas edits apply on reload
+        self.local_router: Optional[LocalRouter] = load_local_router(self.agents_config)
+
+
+class AgentRuntime:
+    """
+    Process-wide resources shared by every LegalSupportAgents instance: one
+    pooled Azure OpenAI client and the gateway limiting calls to it, the
+    pre-compiled agent configs, the routing decision and answer caches and
+    prompt cache usage counters.
+    """
+
+    def __init__(
+        self,
+        agents_config_path: Optional[Union[str, Path]] = None,
+        tasks_config_path: Optional[Union[str, Path]] = None,
+        reload_interval: float = AGENT_CONFIG_RELOAD_INTERVAL,
+    ):
+        self.azure_api_key = os.getenv("AZURE_OPENAI_KEY")
+        self.azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        self.azure_api_version = os.getenv("AZURE_OPENAI_VERSION")
+        self.azure_deployment = os.getenv("GPT4_DEPLOYMENT_NAME")
+
+        self.configs = AgentConfigs(
+            agents_config_path or CONFIG_DIR / "agents.yaml",
+            tasks_config_path or CONFIG_DIR / "tasks.yaml",
+        )
+        self.routing_cache = RoutingCache()
+        self.prompt_cache_stats = PromptCacheStats()
+        # Concurrency, quota, coalescing and retries for every LLM call
+        self.gateway = LLMGateway()
+        # Optional cache of final answers to repeated queries
+        self.answer_cache: Optional[AnswerCache] = create_answer_cache()
+        self.reload_interval = reload_interval
+        self._reload_task: Optional[asyncio.Task] = None
+
+        # One connection pool for all LLM calls so TLS sessions are reused
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=LLM_TIMEOUT,
+        )
+        # Patch the client with instructor
+        self.client = instructor.apatch(self._create_client())
+        # Unpatched client on the same pool, for raw token streaming
+        self.stream_client = self._create_client()
+
+    def _create_client(self) -> AsyncAzureOpenAI:
+        return AsyncAzureOpenAI(
+            api_key=self.azure_api_key,
+            api_version=self.azure_api_version,
+            azure_endpoint=self.azure_endpoint,
+            http_client=self.http_client,
+            # Retries are the gateway's, so rate-limited calls are not retried twice
+            max_retries=0,
+        )
+
+    async def start(self):
+        """Start watching the YAML configs for changes, if enabled."""
+        if self.reload_interval > 0 and self._reload_task is None:
+            self._reload_task = asyncio.create_task(self._watch_configs())
+
+    async def aclose(self):
+        """Stop the config watcher and close the pooled HTTP client and answer cache."""
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+            try:
+                await self._reload_task
+            except asyncio.CancelledError:
+                pass
+            self._reload_task = None
+        if self.answer_cache is not None:
+            self.answer_cache.close()
+        await self.http_client.aclose()
+
+    def reload_if_changed(self) -> bool:
+        """
+        Re-parse the YAML configs if either file was modified.
+
+        The new snapshot replaces the old one in a single assignment, so
+        in-flight requests keep using a consistent config. A broken edit is
+        logged and the previous snapshot stays active.
+        """
+        current = self.configs
+        try:
+            mtimes = _config_mtimes(current.agents_config_path, current.tasks_config_path)
+            if mtimes == current.mtimes:
+                return False
+            self.configs = AgentConfigs(current.agents_config_path, current.tasks_config_path)
+        except Exception as e:
+            logger.error(f"Error reloading agent configuration: {e}")
+            return False
+
+        logger.info("Agent configuration reloaded")
+        return True
+
+    async def _watch_configs(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            # Parse off the event loop so requests are never blocked by a reload
+            await asyncio.to_thread(self.reload_if_changed)
+
+
+def _config_mtimes(*paths: str) -> Tuple[int, ...]:
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+# Shared runtime, created on first use
+_agent_runtime: Optional[AgentRuntime] = None
+
+
+def get_agent_runtime() -> AgentRuntime:
+    """Return the process-wide agent runtime, creating it if needed."""
+    global _agent_runtime
+    if _agent_runtime is None:
+        _agent_runtime = AgentRuntime()
+    return _agent_runtime
+
+
+async def shutdown_agent_runtime():
+    """Release the process-wide agent runtime at application shutdown."""
+    global _agent_runtime
+    if _agent_runtime is not None:
+        await _agent_runtime.aclose()
+        _agent_runtime = None
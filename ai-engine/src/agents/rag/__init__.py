@@ -1 +1 @@
-from .document_store import document_store, initialize_document_store 
\ No newline at end of file
+from .document_store import document_store, initialize_document_store, shutdown_document_store 
\ No newline at end of file
@@ -0,0 +1,201 @@
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# "structure" follows headings and clause numbering; "recursive" is the generic character splitter
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "structure")
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+# Text buffered before each incremental split of a segment stream
+SPLIT_WINDOW = 40 * CHUNK_SIZE
+
+# Structure-aware chunk sizes (characters): clauses are packed up to the
+# maximum, and a new section only starts a new chunk once the minimum is met
+SECTION_CHUNK_MAX = int(os.getenv("SECTION_CHUNK_MAX", "1200"))
+SECTION_CHUNK_MIN = int(os.getenv("SECTION_CHUNK_MIN", "200"))
+# Headings at or above this depth ("9. Holiday", "Heading 1") always start a new chunk
+SECTION_SPLIT_DEPTH = 1
+# Numbered paragraphs up to this long without a full stop are headings ("9. Holiday")
+HEADING_MAX_LENGTH = 80
+
+SECTION_SEPARATOR = " > "
+# "9." or "9.1" (optionally "9.1."); a bare "3 months" or a year is not a clause number
+CLAUSE_NUMBER_PATTERN = re.compile(r"^\s*(\d{1,3}(?:\.\d{1,3})+|\d{1,3}(?=\.))\.?(?:\s+|$)")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.;:])\s+")
+
+
+class TextBlock(NamedTuple):
+    """A paragraph or table row; clause numbers ("9.1") are part of the text."""
+    text: str
+    heading_level: Optional[int] = None  # From "Heading N" / "Title" styles
+
+
+class Chunk(NamedTuple):
+    text: str
+    section: Optional[str] = None  # Section path, e.g. "9. Holiday > 9.1"
+
+
+@lru_cache(maxsize=1)
+def _text_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", ". ", " "],
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+    )
+
+
+def split_text(text: str) -> List[str]:
+    """Split a document's text into overlapping chunks."""
+    return _text_splitter().split_text(text)
+
+
+def split_segments(segments: Iterable[str], window: int = SPLIT_WINDOW) -> Iterator[str]:
+    """
+    Split a stream of text segments (paragraphs, table rows) into chunks.
+
+    Segments are joined with newlines, as in split_text, but only about
+    `window` characters are held at a time: each window is split and all
+    but its last chunk emitted, the last chunk being carried into the next
+    window so chunk boundaries match those of splitting the whole text.
+    """
+    buffer: List[str] = []
+    buffered = 0
+    for segment in segments:
+        buffer.append(segment)
+        buffered += len(segment) + 1
+        if buffered >= window:
+            chunks = split_text("\n".join(buffer))
+            yield from chunks[:-1]
+            buffer, buffered = chunks[-1:], sum(len(chunk) + 1 for chunk in chunks[-1:])
+    if buffer:
+        yield from split_text("\n".join(buffer))
+
+
+def text_blocks(text: str) -> Iterator[TextBlock]:
+    """Non-empty lines of plain text as blocks; clause numbers are detected from the text."""
+    for line in text.splitlines():
+        if line.strip():
+            yield TextBlock(line)
+
+
+def section_heading(block: TextBlock) -> Optional[Tuple[int, str]]:
+    """
+    Depth and path label if the block opens a section or numbered clause.
+
+    Numbered headings ("9. Holiday") are labelled with their full text,
+    numbered clauses ("9.1 The Employee shall...") with their number only.
+    """
+    match = CLAUSE_NUMBER_PATTERN.match(block.text)
+    if match:
+        number = match.group(1)
+        text = block.text.strip()
+        is_heading = len(text) <= HEADING_MAX_LENGTH and not text.endswith((".", ";", ":"))
+        return number.count(".") + 1, text if is_heading else number
+    if block.heading_level is not None:
+        return block.heading_level, block.text.strip()
+    return None
+
+
+def chunk_blocks(
+    blocks: Iterable[TextBlock],
+    max_size: int = SECTION_CHUNK_MAX,
+    min_size: int = SECTION_CHUNK_MIN,
+) -> Iterator[Chunk]:
+    """
+    Chunk a document along its heading and clause structure in one pass.
+
+    Top-level sections start a new chunk once the current one has
+    min_size characters; clauses within a section are packed together up
+    to max_size. A clause is never split unless it alone is longer than
+    max_size, in which case it is split between sentences. Each chunk
+    carries the section path common to everything it contains.
+    """
+    path: List[Tuple[int, str]] = []
+    parts: List[str] = []
+    size = 0
+    chunk_path: Optional[Tuple[str, ...]] = None
+
+    for block in blocks:
+        heading = section_heading(block)
+        new_section = False
+        if heading:
+            depth, label = heading
+            while path and path[-1][0] >= depth:
+                path.pop()
+            path.append((depth, label))
+            new_section = depth <= SECTION_SPLIT_DEPTH
+        block_path = tuple(label for _, label in path)
+
+        for piece in _pieces(block.text.strip(), max_size):
+            # A chunk below min_size (e.g. just a heading) absorbs the next piece even past max_size
+            if parts and size >= min_size and (new_section or size + len(piece) > max_size):
+                yield Chunk("\n".join(parts), _format_path(chunk_path))
+                parts, size, chunk_path = [], 0, None
+            parts.append(piece)
+            size += len(piece) + 1
+            # Text before the first heading (e.g. the parties) does not narrow the section
+            if block_path:
+                chunk_path = block_path if chunk_path is None else _common_prefix(chunk_path, block_path)
+            new_section = False  # Only the first piece of a heading block opens a section
+
+    if parts:
+        yield Chunk("\n".join(parts), _format_path(chunk_path))
+
+
+def chunk_document(blocks: Iterable[TextBlock]) -> List[Chunk]:
+    """Chunk a document's blocks with the configured CHUNKING_STRATEGY."""
+    if CHUNKING_STRATEGY == "recursive":
+        return [Chunk(text, identify_section(text)) for text in split_segments(block.text for block in blocks)]
+    return list(chunk_blocks(blocks))
+
+
+def chunk_text(text: str) -> List[Chunk]:
+    """Chunk plain document text with the configured CHUNKING_STRATEGY."""
+    return chunk_document(text_blocks(text))
+
+
+def identify_section(text: str) -> Optional[str]:
+    """Extract section number and title from text if available."""
+    # Pattern to match section numbers like "9.", "9.1", "10.", etc.
+    section_pattern = r'^\s*(\d+(?:\.\d+)?)\s+(.+?)(?=\n|$)'
+    match = re.search(section_pattern, text)
+    if match:
+        return f"{match.group(1)} {match.group(2)}"
+    return None
+
+
+def _pieces(text: str, max_size: int) -> Iterator[str]:
+    """The text itself, or sentence-packed pieces of it if longer than max_size."""
+    if len(text) <= max_size:
+        yield text
+        return
+    piece = ""
+    for sentence in SENTENCE_END_PATTERN.split(text):
+        while len(sentence) > max_size:  # A single run-on sentence: cut at the last space
+            cut = sentence.rfind(" ", 0, max_size)
+            cut = cut if cut > 0 else max_size
+            if piece:
+                yield piece
+                piece = ""
+            yield sentence[:cut]
+            sentence = sentence[cut:].lstrip()
+        if piece and len(piece) + 1 + len(sentence) > max_size:
+            yield piece
+            piece = ""
+        piece = f"{piece} {sentence}" if piece else sentence
+    if piece:
+        yield piece
+
+
+def _common_prefix(first: Tuple[str, ...], second: Tuple[str, ...]) -> Tuple[str, ...]:
+    length = 0
+    while length < min(len(first), len(second)) and first[length] == second[length]:
+        length += 1
+    return first[:length]
+
+
+def _format_path(path: Optional[Tuple[str, ...]]) -> Optional[str]:
+    return SECTION_SEPARATOR.join(path) if path else None
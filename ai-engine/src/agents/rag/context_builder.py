@@ -0,0 +1,154 @@
+import os
+import logging
+from typing import Dict, List, Optional
+
+from .chunking import CHUNK_OVERLAP, CHUNKING_STRATEGY
+from .tokenizer import count_tokens, truncate_tokens
+
+logger = logging.getLogger("rag_context")
+
+# Default prompt tokens for retrieved context; agents can override it with context_token_budget in agents.yaml
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Search results considered for the context (the budget decides how many are used)
+CONTEXT_SEARCH_LIMIT = int(os.getenv("CONTEXT_SEARCH_LIMIT", "10"))
+# A passage that does not fit is truncated only if at least this many tokens are left
+CONTEXT_MIN_PASSAGE_TOKENS = int(os.getenv("CONTEXT_MIN_PASSAGE_TOKENS", "100"))
+# Only the recursive splitter repeats text across chunk boundaries, at most CHUNK_OVERLAP characters;
+# structure-aware chunks do not overlap, so nothing is removed when merging them
+SPLITTER_OVERLAP_CHARS = CHUNK_OVERLAP if CHUNKING_STRATEGY == "recursive" else 0
+# Shorter shared suffix/prefixes are taken as coincidence rather than overlap
+MIN_OVERLAP_CHARS = 8
+
+CONTEXT_HEADER = "Here is relevant information from our documents:\n\n"
+NO_CONTEXT = "No relevant documents found."
+
+
+class Passage:
+    """Consecutive chunks of one document section, merged into a single piece of context."""
+
+    def __init__(self, result: dict, rank: int):
+        self.document_id = result.get("document_id")
+        self.document_name = result["document_name"]
+        self.section = result.get("section")
+        self.rank = rank
+        self.first_index = self.last_index = result.get("chunk_index")
+        self.text = result["text"]
+
+    def follows(self, result: dict) -> bool:
+        """Whether a result is the chunk right after this passage in the same document section."""
+        return (
+            self.document_id is not None
+            and result.get("document_id") == self.document_id
+            and result.get("section") == self.section
+            and self.last_index is not None
+            and result.get("chunk_index") == self.last_index + 1
+        )
+
+    def precedes(self, result: dict) -> bool:
+        """Whether a result is the chunk right before this passage in the same document section."""
+        return (
+            self.document_id is not None
+            and result.get("document_id") == self.document_id
+            and result.get("section") == self.section
+            and self.first_index is not None
+            and result.get("chunk_index") == self.first_index - 1
+        )
+
+    def append(self, result: dict, max_overlap: int):
+        self.text = merge_overlapping(self.text, result["text"], max_overlap)
+        self.last_index = result["chunk_index"]
+
+    def prepend(self, result: dict, max_overlap: int):
+        self.text = merge_overlapping(result["text"], self.text, max_overlap)
+        self.first_index = result["chunk_index"]
+
+    def render(self, number: int, text: Optional[str] = None) -> str:
+        block = f"Document {number}: {self.document_name}\n"
+        if self.section:
+            block += f"Section: {self.section}\n"
+        return block + f"Content: {self.text if text is None else text}\n\n"
+
+
+def merge_overlapping(first: str, second: str, max_overlap: int = SPLITTER_OVERLAP_CHARS) -> str:
+    """Join two consecutive chunks, dropping up to max_overlap characters the splitter repeated in both."""
+    for size in range(min(len(first), len(second), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def merge_passages(results: List[dict], max_overlap: int = SPLITTER_OVERLAP_CHARS) -> List[Passage]:
+    """
+    Group search results into passages, ordered by their best-ranked chunk.
+
+    Neighbouring chunks of a document section merge into one passage, so
+    text the splitter repeated across their boundary (up to max_overlap
+    characters) is sent once; exact duplicate chunks are dropped.
+    """
+    passages: List[Passage] = []
+    seen_texts = set()
+    # Chunks join a passage only if they touch it, so merge in document order
+    ordered = sorted(
+        enumerate(results),
+        key=lambda item: (str(item[1].get("document_id")), item[1].get("chunk_index") or 0, item[0]),
+    )
+    by_document: Dict[str, List[Passage]] = {}
+    for rank, result in ordered:
+        text_key = " ".join(result["text"].split())
+        if text_key in seen_texts:
+            continue
+        seen_texts.add(text_key)
+        candidates = by_document.setdefault(str(result.get("document_id")), [])
+        passage = next((p for p in candidates if p.follows(result)), None)
+        if passage is not None:
+            passage.append(result, max_overlap)
+            passage.rank = min(passage.rank, rank)
+            continue
+        passage = next((p for p in candidates if p.precedes(result)), None)
+        if passage is not None:
+            passage.prepend(result, max_overlap)
+            passage.rank = min(passage.rank, rank)
+            continue
+        passage = Passage(result, rank)
+        candidates.append(passage)
+        passages.append(passage)
+    return sorted(passages, key=lambda p: p.rank)
+
+
+def build_context(results: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Format search results as prompt context of at most token_budget tokens.
+
+    Passages are added in relevance order while they fit; the first one that
+    does not is truncated if enough budget is left, otherwise smaller, less
+    relevant passages may still fill the remainder.
+
+    Args:
+        results: Search results, most relevant first
+        token_budget: Maximum tokens of the returned context
+    """
+    passages = merge_passages(results)
+    if not passages:
+        return NO_CONTEXT
+
+    context = CONTEXT_HEADER
+    remaining = token_budget - count_tokens(CONTEXT_HEADER)
+    used = 0
+    for passage in passages:
+        block = passage.render(used + 1)
+        tokens = count_tokens(block)
+        if tokens <= remaining:
+            context += block
+            remaining -= tokens
+            used += 1
+            continue
+        if remaining >= CONTEXT_MIN_PASSAGE_TOKENS:
+            overhead = count_tokens(passage.render(used + 1, text="")) + 1
+            context += passage.render(used + 1, truncate_tokens(passage.text, remaining - overhead))
+            used += 1
+            break
+    if not used:
+        return NO_CONTEXT
+    logger.debug(f"Context: {used} of {len(passages)} passages from {len(results)} results, "
+                 f"{token_budget - remaining} of {token_budget} tokens")
+    return context
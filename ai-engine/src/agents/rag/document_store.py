@@ -1,12 +1,25 @@
 import os
+import time
+import asyncio
+import hashlib
 import lancedb
+import pyarrow as pa
+import pyarrow.compute as pc
 from dotenv import load_dotenv
 from langchain_openai import AzureOpenAIEmbeddings
-from typing import Optional
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
 import uuid
 import logging
+from collections import deque
+from datetime import timedelta
 from lancedb.pydantic import LanceModel, Vector
-import pandas as pd
+from lancedb.index import FTS, IvfPq, IvfSq, HnswSq, BTree, Bitmap
+from .chunking import SECTION_SEPARATOR, Chunk, chunk_text
+from .embedding_service import EmbeddingService
+from .fusion import SEARCH_FTS_CANDIDATES, SEARCH_FUSION, SEARCH_VECTOR_CANDIDATES, fuse_results
+from .embedding_cache import create_embedding_cache, normalize_text
+from .local_embeddings import LOCAL_EMBEDDING_MODEL, LocalEmbeddings, check_dimension
+from .ttl_cache import TTLCache
 
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
@@ -14,10 +27,12 @@ logger = logging.getLogger("rag_document_store")
 
 load_dotenv()
 
-# Azure OpenAI configuration
-os.environ["AZURE_API_KEY"] = os.getenv("AZURE_OPENAI_KEY")
-os.environ["AZURE_API_BASE"] = os.getenv("AZURE_OPENAI_ENDPOINT") 
-os.environ["AZURE_API_VERSION"] = os.getenv("AZURE_OPENAI_VERSION")
+# Azure OpenAI configuration (only mirrored when set, so the module imports without credentials)
+for _target, _source in (("AZURE_API_KEY", "AZURE_OPENAI_KEY"),
+                         ("AZURE_API_BASE", "AZURE_OPENAI_ENDPOINT"),
+                         ("AZURE_API_VERSION", "AZURE_OPENAI_VERSION")):
+    if os.getenv(_source):
+        os.environ[_target] = os.getenv(_source)
 
 # Get configuration values
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
@@ -25,20 +40,118 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_VERSION = os.getenv("AZURE_OPENAI_VERSION")
 EMBEDDING_DEPLOYMENT_NAME = os.getenv("EMBEDDING_DEPLOYMENT_NAME", "text-embedding-ada-002")
 
+# Embedding provider: "azure" (Azure OpenAI) or "local" (sentence-transformers on CPU, no network)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "azure")
+# Vector width; must match the model (1536 for ada-002, 384 for all-MiniLM-L6-v2)
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536" if EMBEDDING_PROVIDER == "azure" else "384"))
+# Stored vector precision: "float32" or "float16" (half the table size); for int8,
+# use a scalar-quantised index (VECTOR_INDEX_TYPE=IVF_SQ or HNSW_SQ)
+EMBEDDING_STORAGE_TYPE = os.getenv("EMBEDDING_STORAGE_TYPE", "float32")
+VECTOR_VALUE_TYPES = {"float32": pa.float32(), "float16": pa.float16()}
+if EMBEDDING_STORAGE_TYPE not in VECTOR_VALUE_TYPES:
+    raise ValueError(f"Unknown EMBEDDING_STORAGE_TYPE {EMBEDDING_STORAGE_TYPE!r}; expected float32 or float16")
+
 # LanceDB configuration
 LANCEDB_STORAGE = os.getenv("LANCEDB_STORAGE", "lancedb_local")
 LANCEDB_URI = os.getenv("LANCEDB_URI", "az://lancedb")
 LANCEDB_ACCOUNT_NAME = os.getenv("LANCEDB_ACCOUNT_NAME", "your-account-name")
 LANCEDB_ACCOUNT_KEY = os.getenv("LANCEDB_ACCOUNT_KEY", "")
+# Chunk table; use a new one when switching embedding model or dimension
+LANCEDB_TABLE = os.getenv("LANCEDB_TABLE", "legal_documents")
+
+# FTS index maintenance (seconds)
+FTS_MAINTENANCE_INTERVAL = float(os.getenv("FTS_MAINTENANCE_INTERVAL", "300"))
+FTS_MAINTENANCE_DEBOUNCE = float(os.getenv("FTS_MAINTENANCE_DEBOUNCE", "5"))
+
+# Table compaction and old version cleanup (seconds); writes also compact via FTS maintenance
+TABLE_COMPACTION_INTERVAL = float(os.getenv("TABLE_COMPACTION_INTERVAL", "3600"))
+TABLE_VERSION_RETENTION = float(os.getenv("TABLE_VERSION_RETENTION", str(7 * 24 * 3600)))
+# Compaction runs reported by maintenance_stats
+MAINTENANCE_HISTORY_SIZE = 20
+
+# Old table versions kept when compacting after deletes (seconds), for readers still on them
+DELETE_VERSION_RETENTION = float(os.getenv("DELETE_VERSION_RETENTION", "3600"))
+# Document ids accepted by one batch delete
+DELETE_MAX_DOCUMENTS = 1000
+DOCUMENT_ID_MAX_LENGTH = 256
+
+# In-process query caches (sizes in entries, TTLs in seconds)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+# Seconds between checks for table versions written by other workers; bounds how stale cached searches get
+TABLE_VERSION_CHECK_INTERVAL = float(os.getenv("TABLE_VERSION_CHECK_INTERVAL", "5"))
+
+# Batch search: concurrent searches per /embeddings/batch request
+SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "8"))
+
+# ANN vector index (below VECTOR_INDEX_MIN_ROWS a brute-force scan is used)
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "IVF_PQ")  # IVF_PQ, IVF_SQ or HNSW_SQ
+VECTOR_INDEX_MIN_ROWS = int(os.getenv("VECTOR_INDEX_MIN_ROWS", "50000"))
+VECTOR_INDEX_REBUILD_GROWTH = float(os.getenv("VECTOR_INDEX_REBUILD_GROWTH", "2.0"))
+VECTOR_SEARCH_NPROBES = int(os.getenv("VECTOR_SEARCH_NPROBES", "20"))
+VECTOR_SEARCH_REFINE_FACTOR = int(os.getenv("VECTOR_SEARCH_REFINE_FACTOR", "0"))
+
+class DocumentExists(ValueError):
+    """A document id given for a new document that is already stored."""
 
 # Define the document schema
 class DocumentChunk(LanceModel):
-    vector: Vector(1536)  # Dimension for OpenAI ada-002 embeddings
+    vector: Vector(EMBEDDING_DIMENSION, value_type=VECTOR_VALUE_TYPES[EMBEDDING_STORAGE_TYPE])
     text: str
     document_id: str
     document_name: str
     chunk_index: int
     section: Optional[str] = None
+    # Stable per-document key for incremental re-ingestion (see chunk_ids)
+    chunk_id: Optional[str] = None
+    # Practice area tag set at ingestion (e.g. "employment"), used to narrow agent searches
+    domain: Optional[str] = None
+
+# Optional columns added to tables created before them
+ADDED_COLUMNS = [pa.field("chunk_id", pa.string()), pa.field("domain", pa.string())]
+# Scalar indexes serving search prefilters: bitmaps for low-cardinality columns, B-trees otherwise
+SCALAR_INDEXES = {"document_id": BTree, "document_name": BTree, "section": BTree, "domain": Bitmap}
+
+class SearchFilter(NamedTuple):
+    """
+    Metadata prefilter for search; each field matches any of its values
+    and an empty field matches everything. Sections match as path
+    prefixes, so "9. Holiday" also matches "9. Holiday > 9.1".
+    """
+    document_ids: Sequence[str] = ()
+    document_names: Sequence[str] = ()
+    sections: Sequence[str] = ()
+    domains: Sequence[str] = ()
+    # Let chunks without a domain tag through a domain filter (documents ingested before tagging)
+    include_untagged: bool = False
+
+    def where(self) -> Optional[str]:
+        """The filter as a LanceDB where() expression, or None if it matches everything."""
+        conditions = [
+            f"{column} IN (" + ", ".join(sql_literal(value) for value in sorted(set(values))) + ")"
+            for column, values in (("document_id", self.document_ids), ("document_name", self.document_names))
+            if values
+        ]
+        domains = sorted({domain for domain in map(normalize_domain, self.domains) if domain})
+        if domains:
+            condition = "domain IN (" + ", ".join(map(sql_literal, domains)) + ")"
+            conditions.append(f"({condition} OR domain IS NULL)" if self.include_untagged else condition)
+        if self.sections:
+            conditions.append("(" + " OR ".join(
+                f"section = {sql_literal(section)} OR starts_with(section, {sql_literal(section + SECTION_SEPARATOR)})"
+                for section in sorted(set(self.sections))
+            ) + ")")
+        return " AND ".join(conditions) or None
+
+# One row per document, maintained on every write so listings never scan the chunks
+class DocumentRecord(LanceModel):
+    document_id: str
+    document_name: str
+    chunks_count: int
+
+CATALOG_TABLE_NAME = "document_catalog"
 
 # Main document store class
 class DocumentStore:
@@ -48,14 +161,51 @@ class DocumentStore:
         """Initialize the document store."""
         self.db = None
         self.table = None
+        self.catalog = None
+        self._catalog_lock = asyncio.Lock()
+        self.catalog_stale = False
         self.embeddings_model = None
+        self.embedding_service: Optional[EmbeddingService] = None
+        
+        # In-process FTS index state, so searches skip the list_indices() round trip
+        self.fts_index_ready = False
+        self.indexed_version: Optional[int] = None
+        self._index_dirty = asyncio.Event()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        # Set by deletes so the next compaction keeps old versions only for DELETE_VERSION_RETENTION
+        self.cleanup_pending = False
+        
+        # Compaction history, and uncached search latency since the last compaction
+        self.last_compaction: Optional[float] = None
+        self.maintenance_history = deque(maxlen=MAINTENANCE_HISTORY_SIZE)
+        self.searches_since_compaction = 0
+        self.search_seconds_since_compaction = 0.0
+        
+        # Query caches; search results are keyed on the table version so writes invalidate them
+        self.table_version: Optional[int] = None
+        self.version_checked_at: Optional[float] = None
+        self.query_embedding_cache = TTLCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
+        self.search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        # Query embeddings being computed, shared by concurrent callers (routing cache, prefetched searches)
+        self._pending_query_embeddings: Dict[str, asyncio.Future] = {}
+        
+        # ANN vector index state, managed by the maintenance task
+        self.vector_index_ready = False
+        self.vector_index_trained_rows = 0
         
     async def initialize(self):
         """Initialize connections and resources."""
         self.embeddings_model = get_embeddings_model()
+        self.embedding_service = EmbeddingService(
+            self.embeddings_model,
+            cache=create_embedding_cache(embedding_model_name())
+        )
         
         # Connect to LanceDB - prioritize Azure Blob Storage
-        if LANCEDB_ACCOUNT_NAME and LANCEDB_ACCOUNT_KEY:
+        if "://" not in LANCEDB_URI:
+            # A local directory, for offline development and tests
+            self.db = await lancedb.connect_async(LANCEDB_URI)
+        elif LANCEDB_ACCOUNT_NAME and LANCEDB_ACCOUNT_KEY:
             # Ensure we're using the correct URI format for Azure
             azure_uri = LANCEDB_URI if LANCEDB_URI.startswith("az://") else f"az://{LANCEDB_URI}"
             
@@ -73,162 +223,728 @@ class DocumentStore:
             raise ValueError("LANCEDB_ACCOUNT_NAME and LANCEDB_ACCOUNT_KEY must be provided")
         
         # Get or create table - use legal_documents for consistency
-        table_name = "legal_documents"
-        tables = await self.db.table_names()
+        table_name = LANCEDB_TABLE
+        tables = await self.list_table_names()
         
         if table_name not in tables:
             self.table = await self.db.create_table(table_name, schema=DocumentChunk)
         else:
             self.table = await self.db.open_table(table_name)
+        await self.check_vector_schema()
+        await self.ensure_schema()
+        await self.ensure_scalar_indices()
+        self._set_table_version(await self.table.version())
+        await self.open_catalog()
             
-        # Always ensure FTS index exists
-        try:
-            from lancedb.index import FTS
-            # Check if FTS index exists
-            indexes = await self.table.list_indices()
-            has_fts = any(isinstance(idx, FTS) for idx in indexes)
-            
-            if not has_fts:
-                logger.info("Creating full-text search index on 'text' column...")
-                await self.table.create_index("text", config=FTS())
-                logger.info("Full-text search index created successfully")
-            else:
-                logger.info("Full-text search index already exists")
-        except Exception as e:
-            logger.error(f"Error creating/verifying FTS index: {e}")
-            raise
+        # Check index state once; searches rely on the tracked state afterwards
+        await self.ensure_fts_index()
+        self._start_index_maintenance()
+        # Have the maintenance task check the vector index right after startup
+        self.mark_index_stale()
     
-    async def add_document(self, text: str, document_name: str, document_id: Optional[str] = None):
+    async def add_document(self, text: str, document_name: str, document_id: Optional[str] = None,
+                           domain: Optional[str] = None):
         """Add a document to the store with chunking."""
+        # Chunking a large document is CPU-bound, so keep it off the event loop
+        chunks = await asyncio.to_thread(chunk_text, text)
+        return await self.add_chunked_document(chunks, document_name, document_id, domain)
+    
+    async def add_chunked_document(self, chunks: List[Chunk], document_name: str, document_id: Optional[str] = None,
+                                   domain: Optional[str] = None):
+        """
+        Add a document that has already been split into chunks.
+        
+        A document_id already in the store is rejected with DocumentExists,
+        since adding to it would store its chunks twice; use upsert_document.
+        """
         if not document_id:
             document_id = str(uuid.uuid4())
+        elif await self.table.count_rows(f"document_id = {sql_literal(document_id)}"):
+            raise DocumentExists(f"Document {document_id!r} already exists; upload it with upsert to replace it")
         
-        # Split text into chunks
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            separators=["\n\n", "\n", ". ", " "],
-            chunk_size=500,
-            chunk_overlap=50,
-        )
-        
-        chunks = text_splitter.split_text(text)
-        
-        if not chunks:
+        documents = await self.prepare_chunks(chunks, document_name, document_id, domain)
+        if not documents:
             logger.warning("No chunks created from document")
             return {"document_id": document_id, "chunks_added": 0}
         
-        # Get embeddings for all chunks
-        embeddings = self.embeddings_model.embed_documents(chunks)
+        await self.add_chunks(documents)
+        return {"document_id": document_id, "chunks_added": len(documents)}
+    
+    async def prepare_chunks(self, chunks: List[Chunk], document_name: str, document_id: str,
+                             domain: Optional[str] = None) -> List[DocumentChunk]:
+        """Embed a document's chunks into rows ready for add_chunks."""
+        if not chunks:
+            return []
+        
+        # Get embeddings for all chunks (batched, concurrent, non-blocking)
+        embeddings = await self.embedding_service.embed_documents([chunk.text for chunk in chunks])
         
         # Create document chunks with vectors
-        documents = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            documents.append(DocumentChunk(
+        return [
+            DocumentChunk(
                 vector=embedding,
-                text=chunk,
+                text=chunk.text,
                 document_id=document_id,
                 document_name=document_name,
                 chunk_index=i,
-                section=identify_section(chunk)
-            ))
+                section=chunk.section,
+                chunk_id=chunk_id,
+                domain=normalize_domain(domain)
+            )
+            for i, (chunk, embedding, chunk_id) in enumerate(
+                zip(chunks, embeddings, chunk_ids(document_id, [chunk.text for chunk in chunks]))
+            )
+        ]
+    
+    async def upsert_document(self, chunks: List[Chunk], document_name: str, document_id: Optional[str] = None,
+                              domain: Optional[str] = None):
+        """
+        Replace a stored document's chunks, embedding only new or changed text.
+        
+        Args:
+            chunks: The document's current chunks
+            document_name: Name of the document; identifies it if no document_id is given
+            document_id: Stored document to replace (created if it does not exist)
+            domain: Practice area tag for the document's chunks
+        """
+        if not document_id:
+            document_id = await self.find_document_id(document_name) or str(uuid.uuid4())
+        document_filter = f"document_id = {sql_literal(document_id)}"
         
+        # Diff against the stored chunks by content hash; unchanged text keeps its vector
+        stored = await self.table.query().where(document_filter).select(["text", "vector"]).to_list()
+        vectors: Dict[str, list] = {content_hash(row["text"]): row["vector"] for row in stored}
+        hashes = [content_hash(chunk.text) for chunk in chunks]
+        changed = {digest: chunk.text for digest, chunk in zip(hashes, chunks) if digest not in vectors}
+        if changed:
+            embeddings = await self.embedding_service.embed_documents(list(changed.values()))
+            vectors.update(zip(changed.keys(), embeddings))
+        
+        rows = [
+            DocumentChunk(
+                vector=vectors[digest],
+                text=chunk.text,
+                document_id=document_id,
+                document_name=document_name,
+                chunk_index=i,
+                section=chunk.section,
+                chunk_id=chunk_id,
+                domain=normalize_domain(domain)
+            )
+            for i, (chunk, digest, chunk_id) in enumerate(
+                zip(chunks, hashes, chunk_ids(document_id, [chunk.text for chunk in chunks]))
+            )
+        ]
+        
+        if rows:
+            # One merge_insert inserts new chunks, re-positions moved ones and deletes removed ones
+            result = await (
+                self.table.merge_insert("chunk_id")
+                .when_matched_update_all(
+                    where="target.chunk_index != source.chunk_index"
+                          " OR target.document_name != source.document_name"
+                          " OR target.section != source.section"
+                          " OR (target.section IS NULL) != (source.section IS NULL)"
+                          " OR target.domain != source.domain"
+                          " OR (target.domain IS NULL) != (source.domain IS NULL)"
+                )
+                .when_not_matched_insert_all()
+                .when_not_matched_by_source_delete(document_filter)
+                .execute(rows)
+            )
+            inserted, deleted = result.num_inserted_rows, result.num_deleted_rows
+        else:
+            await self.table.delete(document_filter)
+            inserted, deleted = 0, len(stored)
+        await self._on_table_write()
+        await self.refresh_catalog([document_id])
+        
+        logger.info(f"Upserted {document_name} ({document_id}): {inserted} chunks added, {deleted} removed")
+        return {
+            "document_id": document_id,
+            "chunks_added": inserted,
+            "chunks_removed": deleted,
+            "chunks_unchanged": len(rows) - inserted,
+            "chunks_embedded": len(changed),
+        }
+    
+    async def find_document_id(self, document_name: str) -> Optional[str]:
+        """The document_id stored under a document name, if any."""
+        rows = await (
+            self.table.query()
+            .where(f"document_name = {sql_literal(document_name)}")
+            .select(["document_id"])
+            .limit(1)
+            .to_list()
+        )
+        return rows[0]["document_id"] if rows else None
+    
+    async def add_chunks(self, documents: List[DocumentChunk]):
+        """Write prepared chunks, possibly from many documents, in one table.add call."""
         try:
             await self.table.add(documents)
         except Exception as e:
             logger.error(f"Error adding documents to LanceDB: {e}")
             raise
 
-        return {"document_id": document_id, "chunks_added": len(documents)}
+        await self._on_table_write()
+        await self.refresh_catalog({document.document_id for document in documents})
+    
+    async def check_vector_schema(self):
+        """Refuse to mix embeddings of different widths in one table."""
+        vector_type = (await self.table.schema()).field("vector").type
+        if vector_type.list_size != EMBEDDING_DIMENSION:
+            raise ValueError(
+                f"Table {LANCEDB_TABLE} holds {vector_type.list_size}-dimensional vectors but "
+                f"EMBEDDING_DIMENSION is {EMBEDDING_DIMENSION}; set LANCEDB_TABLE to a new table "
+                f"when changing embedding model"
+            )
+        if vector_type.value_type != VECTOR_VALUE_TYPES[EMBEDDING_STORAGE_TYPE]:
+            # Rows are cast to the table's type on write, so this only costs the expected savings
+            logger.warning(f"Table {LANCEDB_TABLE} stores {vector_type.value_type} vectors, "
+                           f"not EMBEDDING_STORAGE_TYPE={EMBEDDING_STORAGE_TYPE}")
+
+    async def ensure_schema(self):
+        """Add columns introduced after the table was created (existing rows get nulls)."""
+        schema = await self.table.schema()
+        for field in ADDED_COLUMNS:
+            if field.name not in schema.names:
+                logger.info(f"Adding {field.name} column to {LANCEDB_TABLE}")
+                await self.table.add_columns(field)
+    
+    async def ensure_scalar_indices(self):
+        """
+        Create the scalar indexes that let search prefilters skip
+        non-matching rows; optimize() keeps them up to date afterwards.
+        """
+        indexed = {column for index in await self.table.list_indices() for column in index.columns}
+        for column, index_type in SCALAR_INDEXES.items():
+            if column not in indexed:
+                logger.info(f"Creating {index_type.__name__} index on '{column}' column...")
+                try:
+                    await self.table.create_index(column, config=index_type())
+                except Exception as e:
+                    # Filters still work without the index, just with a scan
+                    logger.warning(f"Could not create index on '{column}': {e}")
     
     async def ensure_fts_index(self):
-        """Ensure the full-text search index exists."""
+        """Ensure the full-text search index exists and record its state."""
         try:
-            from lancedb.index import FTS
             indexes = await self.table.list_indices()
-            has_fts = any(isinstance(idx, FTS) for idx in indexes)
+            has_fts = any(getattr(idx, "index_type", None) == "FTS" for idx in indexes)
             
             if not has_fts:
                 logger.info("Creating full-text search index on 'text' column...")
                 await self.table.create_index("text", config=FTS())
                 logger.info("Full-text search index created successfully")
+            else:
+                logger.info("Full-text search index already exists")
+            
+            self.fts_index_ready = True
+            self.indexed_version = await self.table.version()
         except Exception as e:
+            self.fts_index_ready = False
             logger.error(f"Error ensuring FTS index: {e}")
             raise
 
-    async def search(self, query: str, limit: int = 5):
-        """Search for documents matching the query using hybrid search."""
-        # Ensure FTS index exists before searching
+    def mark_index_stale(self):
+        """Flag that the table changed and the FTS index should be refreshed."""
+        self._index_dirty.set()
+
+    def _set_table_version(self, version: int):
+        """Record the current table version, dropping results cached for older ones."""
+        if version != self.table_version:
+            self.table_version = version
+            self.search_cache.clear()
+
+    async def _on_table_write(self):
+        """Invalidate cached search results and schedule FTS index maintenance after a write."""
+        self._set_table_version(await self.table.version())
+        # Let the maintenance task fold the new rows into the FTS index
+        self.mark_index_stale()
+
+    async def sync_table_version(self) -> int:
+        """
+        Move the table handle to the latest version and record it.
+
+        A handle stays on the version it last read or wrote, so without
+        this, commits made by other workers are never seen.
+        """
+        self.version_checked_at = time.monotonic()
+        await self.table.checkout_latest()
+        version = await self.table.version()
+        self._set_table_version(version)
+        return version
+
+    async def refresh_fts_index(self):
+        """Bring the FTS index up to date if the table version moved on, in this worker or another."""
+        version = await self.sync_table_version()
+        if self.fts_index_ready and version == self.indexed_version:
+            return
+        
         await self.ensure_fts_index()
+        # Index rows written since the index was built (also compacts fragments)
+        await self.compact_table()
+        self.indexed_version = await self.table.version()
+        self._set_table_version(self.indexed_version)
+        logger.info(f"FTS index refreshed at table version {self.indexed_version}")
+
+    async def ensure_vector_index(self):
+        """
+        Create the ANN vector index once the table is large enough, and
+        retrain it when the table has grown well past the rows it was
+        trained on. Smaller additions are folded in by optimize().
+        """
+        rows = await self.table.count_rows()
+        indexes = await self.table.list_indices()
+        vector_index = next((idx for idx in indexes if "vector" in idx.columns), None)
+        
+        if vector_index is None:
+            if rows < VECTOR_INDEX_MIN_ROWS:
+                self.vector_index_ready = False
+                return
+            reason = "creating"
+        else:
+            if not self.vector_index_trained_rows:
+                # First check since startup: assume the index was trained on what it covers
+                stats = await self.table.index_stats(vector_index.name)
+                self.vector_index_trained_rows = stats.num_indexed_rows if stats else rows
+            self.vector_index_ready = True
+            if rows < self.vector_index_trained_rows * VECTOR_INDEX_REBUILD_GROWTH:
+                return
+            reason = "retraining"
+        
+        logger.info(f"{reason.capitalize()} {VECTOR_INDEX_TYPE} vector index over {rows} rows...")
+        await self.table.create_index("vector", config=vector_index_config(rows), replace=True)
+        self.vector_index_ready = True
+        self.vector_index_trained_rows = rows
+        logger.info("Vector index ready")
+
+    async def compact_table(self):
+        """
+        Compact small fragments, fold new rows into the FTS and vector
+        indices and remove versions older than TABLE_VERSION_RETENTION
+        (DELETE_VERSION_RETENTION after deletes).
+        
+        Each run is recorded with the fragment counts before and after and
+        the mean search latency since the previous run.
+        """
+        retention = timedelta(seconds=DELETE_VERSION_RETENTION if self.cleanup_pending else TABLE_VERSION_RETENTION)
+        self.cleanup_pending = False
+        started = time.perf_counter()
+        before = await self.table.stats()
+        result = await self.table.optimize(cleanup_older_than=retention)
+        after = await self.table.stats()
+        if self.catalog is not None:
+            async with self._catalog_lock:
+                await self.catalog.optimize(cleanup_older_than=retention)
+        
+        searches, search_seconds = self.searches_since_compaction, self.search_seconds_since_compaction
+        self.searches_since_compaction, self.search_seconds_since_compaction = 0, 0.0
+        self.last_compaction = time.monotonic()
+        run = {
+            "finished_at": time.time(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "fragments_before": before["fragment_stats"]["num_fragments"],
+            "fragments_after": after["fragment_stats"]["num_fragments"],
+            "small_fragments_after": after["fragment_stats"]["num_small_fragments"],
+            "versions_removed": result.prune.old_versions_removed,
+            "bytes_removed": result.prune.bytes_removed,
+            "searches_before": searches,
+            "search_latency_before_ms": round(search_seconds / searches * 1000, 1) if searches else None,
+        }
+        self.maintenance_history.append(run)
+        logger.info(
+            f"Compacted table: {run['fragments_before']} -> {run['fragments_after']} fragments, "
+            f"{run['versions_removed']} old versions removed"
+        )
+        return run
+
+    async def maintain_indices(self):
+        """Bring the FTS and vector indices up to date, and compact the table when due."""
+        # Start from the latest version, so rows and fragments written by other workers are counted
+        await self.sync_table_version()
+        await self.refresh_fts_index()
+        await self.ensure_vector_index()
+        # Timed as well, so fragments written only by other workers are compacted too
+        if self.last_compaction is None or time.monotonic() - self.last_compaction >= TABLE_COMPACTION_INTERVAL:
+            await self.compact_table()
+
+    async def maintenance_stats(self):
+        """Current fragment counts, recent compaction runs and search latency since the last one."""
+        stats = await self.table.stats()
+        searches = self.searches_since_compaction
+        return {
+            "table_version": self.table_version,
+            "rows": stats["num_rows"],
+            "total_bytes": stats["total_bytes"],
+            "fragments": stats["fragment_stats"]["num_fragments"],
+            "small_fragments": stats["fragment_stats"]["num_small_fragments"],
+            "searches_since_compaction": searches,
+            "search_latency_since_compaction_ms": (
+                round(self.search_seconds_since_compaction / searches * 1000, 1) if searches else None
+            ),
+            "compactions": list(self.maintenance_history),
+        }
+
+    def _start_index_maintenance(self):
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.create_task(self._index_maintenance_loop())
+
+    async def _index_maintenance_loop(self):
+        """Refresh the indices after ingestion batches, or periodically."""
+        while True:
+            # asyncio.wait rather than wait_for: on Python 3.11, wait_for swallows a
+            # cancellation that arrives as the event is set, and close() would hang
+            changed = asyncio.ensure_future(self._index_dirty.wait())
+            try:
+                done, _ = await asyncio.wait({changed}, timeout=FTS_MAINTENANCE_INTERVAL)
+            finally:
+                changed.cancel()
+            if done:
+                # Wait for the rest of an ingestion batch before re-indexing
+                await asyncio.sleep(FTS_MAINTENANCE_DEBOUNCE)
+            self._index_dirty.clear()
+            
+            try:
+                await self.maintain_indices()
+            except Exception as e:
+                logger.error(f"Error during index maintenance: {e}")
+
+    async def close(self):
+        """Stop background index maintenance and the local embedding threads."""
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+        if isinstance(self.embeddings_model, LocalEmbeddings):
+            self.embeddings_model.close()
+
+    async def embed_query(self, query: str):
+        """
+        Embedding for a search query, cached by normalized text.
+
+        Concurrent calls for the same text wait for one embedding request.
+        """
+        normalized_query = normalize_text(query)
+        query_embedding = self.query_embedding_cache.get(normalized_query)
+        if query_embedding is not None:
+            return query_embedding
+        pending = self._pending_query_embeddings.get(normalized_query)
+        if pending is None:
+            pending = asyncio.ensure_future(self._embed_uncached_query(query, normalized_query))
+            self._pending_query_embeddings[normalized_query] = pending
+            pending.add_done_callback(lambda _: self._pending_query_embeddings.pop(normalized_query, None))
+        # A cancelled caller must not cancel the request other callers wait for
+        return await asyncio.shield(pending)
+
+    async def _embed_uncached_query(self, query: str, normalized_query: str):
+        query_embedding = await self.embedding_service.embed_query(query)
+        self.query_embedding_cache.set(normalized_query, query_embedding)
+        return query_embedding
+
+    async def embed_queries(self, queries: List[str]) -> List[list]:
+        """Embeddings for many search queries; the uncached ones are embedded in one batched call."""
+        vectors = {}
+        missing = {}
+        for query in queries:
+            normalized_query = normalize_text(query)
+            if normalized_query in vectors or normalized_query in missing:
+                continue
+            query_embedding = self.query_embedding_cache.get(normalized_query)
+            if query_embedding is None:
+                missing[normalized_query] = query
+            else:
+                vectors[normalized_query] = query_embedding
+        if missing:
+            # Queries and chunks share one embedding model, so the batched document path serves queries too
+            embeddings = await self.embedding_service.embed_documents(list(missing.values()))
+            for normalized_query, query_embedding in zip(missing, embeddings):
+                self.query_embedding_cache.set(normalized_query, query_embedding)
+                vectors[normalized_query] = query_embedding
+        return [vectors[normalize_text(query)] for query in queries]
+
+    async def search_many(
+        self,
+        queries: List[str],
+        limit: int = 5,
+        search_filter: Optional[SearchFilter] = None,
+        fusion: Optional[str] = None,
+        concurrency: int = SEARCH_BATCH_CONCURRENCY
+    ) -> List[list]:
+        """
+        Run many searches with shared options, returning results in query order.
+        
+        Args:
+            queries: The search texts; repeats are searched once
+            limit: Maximum number of results per query
+            search_filter: Metadata prefilter for every query
+            fusion: Fusion strategy for every query
+            concurrency: Searches running at once
+        """
+        # Embed everything up front so each search finds its embedding cached
+        await self.embed_queries(queries)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def search_one(query: str):
+            async with semaphore:
+                return await self.search(query, limit, search_filter=search_filter, fusion=fusion)
+        
+        unique_queries = {}
+        for query in queries:
+            unique_queries.setdefault(normalize_text(query), query)
+        results = dict(zip(unique_queries, await asyncio.gather(*map(search_one, unique_queries.values()))))
+        return [[dict(result) for result in results[normalize_text(query)]] for query in queries]
+
+    async def search(
+        self,
+        query: str,
+        limit: int = 5,
+        nprobes: Optional[int] = None,
+        refine_factor: Optional[int] = None,
+        search_filter: Optional[SearchFilter] = None,
+        fusion: Optional[str] = None
+    ):
+        """
+        Search for documents matching the query using hybrid search.
+        
+        Args:
+            query: The search text
+            limit: Maximum number of results
+            nprobes: IVF partitions to probe (defaults to VECTOR_SEARCH_NPROBES)
+            refine_factor: Re-rank limit * refine_factor candidates on full
+                vectors (defaults to VECTOR_SEARCH_REFINE_FACTOR, 0 disables)
+            search_filter: Metadata prefilter applied to both the vector and
+                text search before ranking
+            fusion: How the vector and text candidates are combined, "rrf",
+                "linear" or "cross_encoder" (defaults to SEARCH_FUSION)
+        """
+        nprobes = nprobes or VECTOR_SEARCH_NPROBES
+        refine_factor = VECTOR_SEARCH_REFINE_FACTOR if refine_factor is None else refine_factor
+        where = search_filter.where() if search_filter else None
+        fusion = fusion or SEARCH_FUSION
+        normalized_query = normalize_text(query)
+        if self.version_checked_at is None or time.monotonic() - self.version_checked_at >= TABLE_VERSION_CHECK_INTERVAL:
+            # Drop cached results if another worker added or deleted documents
+            await self.sync_table_version()
+        cache_key = (normalized_query, limit, nprobes, refine_factor, where, fusion, self.table_version)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+        
+        started = time.perf_counter()
+        # Only touch index metadata if it was never verified (e.g. lost on error)
+        if not self.fts_index_ready:
+            await self.ensure_fts_index()
         
         # Get query embedding
-        query_embedding = self.embeddings_model.embed_query(query)
+        query_embedding = await self.embed_query(query)
+        
+        # Run the vector and text legs separately so each over-fetches its own candidates
+        vector_query = self.table.query().nearest_to(query_embedding)  # Vector similarity search
+        vector_query = vector_query.nprobes(nprobes)                   # ANN index partitions to probe
+        if refine_factor:
+            vector_query = vector_query.refine_factor(refine_factor)
+        vector_query = vector_query.limit(max(limit, SEARCH_VECTOR_CANDIDATES))
+        fts_query = self.table.query().nearest_to_text(query)          # Text search component
+        fts_query = fts_query.limit(max(limit, SEARCH_FTS_CANDIDATES))
+        if where:
+            vector_query = vector_query.where(where)                   # Metadata prefilter
+            fts_query = fts_query.where(where)
+        vector_results, fts_results = await asyncio.gather(
+            vector_query.with_row_id().to_arrow(),
+            fts_query.with_row_id().to_arrow()
+        )
         
-        # Build hybrid search query step by step
-        search_query = self.table.query()
-        search_query = search_query.nearest_to(query_embedding)  # Vector similarity search
-        search_query = search_query.nearest_to_text(query)       # Text search component
-        search_query = search_query.rerank()                     # Combine and normalize scores
-        search_query = search_query.limit(limit)                 # Limit results
+        # Combine and rank the candidates; the cross-encoder is CPU-bound
+        if fusion == "cross_encoder":
+            fused = await asyncio.to_thread(fuse_results, query, vector_results, fts_results, fusion, limit)
+        else:
+            fused = fuse_results(query, vector_results, fts_results, fusion, limit)
+        results = fused.to_pylist()
+        self.searches_since_compaction += 1
+        self.search_seconds_since_compaction += time.perf_counter() - started
         
-        # Execute search and return results
-        results = await search_query.to_list()
+        # Skip caching if a write landed while this search was running
+        if cache_key[-1] == self.table_version:
+            self.search_cache.set(cache_key, [dict(result) for result in results])
         
         return results
+
+    def cache_stats(self):
+        """Hit/miss statistics for the query, search result and embedding caches."""
+        embedding_cache = self.embedding_service.cache if self.embedding_service else None
+        return {
+            "table_version": self.table_version,
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "search_results": self.search_cache.stats(),
+            "embeddings": embedding_cache.stats() if embedding_cache else None,
+        }
     
     async def delete_document(self, document_id: str):
         """Delete all chunks with the given document_id from the store."""
+        result = await self.delete_documents([document_id])
+        return {"document_id": document_id, "chunks_deleted": result["chunks_deleted"]}
+
+    async def delete_documents(self, document_ids: List[str]):
+        """
+        Delete the chunks of many documents with a single table.delete.
+        
+        Per-document counts come from the document catalog rather than from
+        reading the chunks, and compaction of the fragments left behind is
+        scheduled on the index maintenance task.
+        
+        Args:
+            document_ids: Documents to delete; unknown ids are ignored
+        """
+        document_ids = sorted(set(validate_document_ids(document_ids)))
+        id_filter = document_id_filter(document_ids)
         try:
-            # Create a filter condition to match the document_id
-            delete_condition = f"document_id = '{document_id}'"
+            counts = {}
+            if self.catalog is not None:
+                records = await self.catalog.query().where(id_filter).select(["document_id", "chunks_count"]).to_list()
+                counts = {record["document_id"]: record["chunks_count"] for record in records}
             
-            # Get number of chunks to delete (for reporting)
-            count_query = await self.table.query().where(delete_condition).to_pandas()
-            chunks_count = len(count_query)
-            
-            if chunks_count == 0:
-                logger.warning(f"No chunks found with document_id: {document_id}")
-                return {"document_id": document_id, "chunks_deleted": 0}
-            
-            # Delete rows matching the condition
-            await self.table.delete(delete_condition)
+            result = await self.table.delete(id_filter)
+            chunks_deleted = result.num_deleted_rows
+            if chunks_deleted == 0:
+                logger.warning(f"No chunks found for document_ids: {document_ids}")
+            else:
+                self.cleanup_pending = True
+                await self._on_table_write()
+                logger.info(f"Deleted {chunks_deleted} chunks of {len(document_ids)} documents")
+            await self.remove_from_catalog(document_ids)
             
-            logger.info(f"Deleted {chunks_count} chunks with document_id: {document_id}")
-            return {"document_id": document_id, "chunks_deleted": chunks_count}
+            return {
+                "chunks_deleted": chunks_deleted,
+                "documents": [
+                    {"document_id": document_id, "chunks_deleted": counts.get(document_id, 0)}
+                    for document_id in document_ids
+                ],
+            }
             
         except Exception as e:
-            logger.error(f"Error deleting document from LanceDB: {e}")
+            logger.error(f"Error deleting documents from LanceDB: {e}")
             raise
             
-    async def get_all_documents(self):
-        """Retrieve all unique documents in the store."""
+    async def list_table_names(self) -> List[str]:
+        """Names of all tables in the database, across list_tables() pages."""
+        names, page_token = [], None
+        while True:
+            response = await self.db.list_tables(page_token=page_token)
+            names.extend(response.tables)
+            page_token = response.page_token
+            if not page_token:
+                return names
+
+    async def open_catalog(self):
+        """Open the document catalog table, building it from the chunks if it is new or empty."""
+        if CATALOG_TABLE_NAME in await self.list_table_names():
+            self.catalog = await self.db.open_table(CATALOG_TABLE_NAME)
+        else:
+            self.catalog = await self.db.create_table(CATALOG_TABLE_NAME, schema=DocumentRecord)
+        if await self.catalog.count_rows() == 0 and await self.table.count_rows() > 0:
+            await self.rebuild_catalog()
+
+    async def rebuild_catalog(self):
+        """Recompute the whole catalog with a projected, vector-free scan of the chunks."""
+        async with self._catalog_lock:
+            records = await self._document_counts()
+            if records.num_rows:
+                await (
+                    self.catalog.merge_insert("document_id")
+                    .when_matched_update_all()
+                    .when_not_matched_insert_all()
+                    .when_not_matched_by_source_delete()
+                    .execute(records)
+                )
+            else:
+                await self.catalog.delete("true")
+            self.catalog_stale = False
+        logger.info(f"Document catalog rebuilt with {records.num_rows} documents")
+
+    async def refresh_catalog(self, document_ids: Iterable[str]):
+        """
+        Recount the chunks of the given documents into the catalog.
+        
+        A failure only marks the catalog stale, so the next listing rebuilds it.
+        """
+        document_ids = sorted(set(document_ids))
+        if not document_ids or self.catalog is None:
+            return
+        id_filter = document_id_filter(document_ids)
         try:
-            # Get all documents from the table
-            df = await self.table.query().to_pandas()
-            
-            if df.empty:
-                logger.info("No documents found in the store")
-                return []
-            
-            # Group by document_id and get the first document_name for each
-            # Use drop_duplicates to get unique document_id/document_name pairs
-            unique_docs = df[['document_id', 'document_name']].drop_duplicates()
-            
-            # Count chunks for each document
-            chunk_counts = df.groupby('document_id').size().reset_index(name='chunks_count')
-            
-            # Merge to get document info with chunk counts
-            result = pd.merge(unique_docs, chunk_counts, on='document_id')
-            
-            # Convert to list of dictionaries
-            documents = result.to_dict('records')
-            
-            logger.info(f"Found {len(documents)} unique documents")
-            return documents
-            
+            async with self._catalog_lock:
+                records = await self._document_counts(id_filter)
+                if records.num_rows:
+                    await (
+                        self.catalog.merge_insert("document_id")
+                        .when_matched_update_all()
+                        .when_not_matched_insert_all()
+                        .execute(records)
+                    )
+                removed = set(document_ids) - set(records.column("document_id").to_pylist())
+                if removed:
+                    await self.catalog.delete(document_id_filter(sorted(removed)))
         except Exception as e:
-            logger.error(f"Error getting all documents from LanceDB: {e}")
+            self.catalog_stale = True
+            logger.error(f"Error updating document catalog: {e}")
+
+    async def remove_from_catalog(self, document_ids: List[str]):
+        """Drop deleted documents from the catalog."""
+        if not document_ids or self.catalog is None:
+            return
+        try:
+            async with self._catalog_lock:
+                await self.catalog.delete(document_id_filter(document_ids))
+        except Exception as e:
+            self.catalog_stale = True
+            logger.error(f"Error updating document catalog: {e}")
+
+    async def _document_counts(self, where: Optional[str] = None) -> pa.Table:
+        """Chunk counts per document, reading only the id and name columns."""
+        query = self.table.query().select(["document_id", "document_name"])
+        if where:
+            query = query.where(where)
+        chunks = await query.to_arrow()
+        counts = chunks.group_by("document_id").aggregate([("document_id", "count"), ("document_name", "max")])
+        return pa.table(
+            [counts["document_id"], counts["document_name_max"], counts["document_id_count"]],
+            schema=DocumentRecord.to_arrow_schema(),
+        )
+
+    async def list_documents(self, offset: int = 0, limit: Optional[int] = None, name: Optional[str] = None):
+        """
+        List stored documents from the catalog, sorted by name.
+        
+        Args:
+            offset: Documents to skip
+            limit: Maximum number of documents to return (all if None)
+            name: Only documents whose name contains this text (case-insensitive)
+        
+        Returns:
+            Dict with the number of matching documents ("total") and the requested page
+        """
+        try:
+            if self.catalog_stale:
+                await self.rebuild_catalog()
+            records = await self.catalog.query().select(["document_id", "document_name", "chunks_count"]).to_arrow()
+            if name:
+                records = records.filter(pc.match_substring(records["document_name"], name, ignore_case=True))
+            records = records.sort_by([("document_name", "ascending"), ("document_id", "ascending")])
+            page = records.slice(offset, limit)
+            return {"total": records.num_rows, "documents": page.to_pylist()}
+        except Exception as e:
+            logger.error(f"Error listing documents from LanceDB: {e}")
             raise
 
+    async def get_all_documents(self):
+        """Retrieve all unique documents in the store."""
+        return (await self.list_documents())["documents"]
+
 # Create a global instance for use across the application
 document_store = DocumentStore()
 
@@ -237,23 +953,85 @@ async def initialize_document_store():
     """Initialize the document store at application startup."""
     await document_store.initialize() 
 
-# Initialize Azure OpenAI Embeddings
+# Shutdown function for application teardown
+async def shutdown_document_store():
+    """Stop the document store's background tasks at application shutdown."""
+    await document_store.close()
+
+# Initialize the embeddings model of the configured provider
 def get_embeddings_model():
-    """Initialize and return the Azure OpenAI Embeddings model."""
+    """Initialize and return the EMBEDDING_PROVIDER embeddings model."""
+    if EMBEDDING_PROVIDER == "local":
+        model = LocalEmbeddings()
+        # Loads the model now, once per worker, rather than on the first upload
+        check_dimension(model, EMBEDDING_DIMENSION)
+        return model
+    if EMBEDDING_PROVIDER != "azure":
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER {EMBEDDING_PROVIDER!r}; expected azure or local")
     return AzureOpenAIEmbeddings(
         azure_deployment=EMBEDDING_DEPLOYMENT_NAME,
         openai_api_version=AZURE_OPENAI_VERSION,
         azure_endpoint=AZURE_OPENAI_ENDPOINT,
         api_key=AZURE_OPENAI_KEY,
+        # Retries are handled by EmbeddingService so rate limits are not retried twice
+        max_retries=0,
     )
 
-# Extract section from text if available
-def identify_section(text: str) -> Optional[str]:
-    """Extract section number and title from text if available."""
-    import re
-    # Pattern to match section numbers like "9.", "9.1", "10.", etc.
-    section_pattern = r'^\s*(\d+(?:\.\d+)?)\s+(.+?)(?=\n|$)'
-    match = re.search(section_pattern, text)
-    if match:
-        return f"{match.group(1)} {match.group(2)}"
-    return None 
\ No newline at end of file
+def embedding_model_name() -> str:
+    """Name of the active embedding model, which keys the persistent embedding cache."""
+    return LOCAL_EMBEDDING_MODEL if EMBEDDING_PROVIDER == "local" else EMBEDDING_DEPLOYMENT_NAME
+
+def content_hash(text: str) -> str:
+    """Hash identifying a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_ids(document_id: str, texts: List[str]) -> List[str]:
+    """
+    Stable keys for a document's chunks: the document id plus the content
+    hash, with an occurrence number for repeated text (e.g. boilerplate).
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for text in texts:
+        digest = content_hash(text)
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{document_id}:{digest[:32]}:{occurrence}")
+    return ids
+
+def normalize_domain(domain: Optional[str]) -> Optional[str]:
+    """Domain tags are stored trimmed and lower-cased; blank means untagged."""
+    return (domain.strip().lower() or None) if domain else None
+
+def sql_literal(value: str) -> str:
+    """Quote a string for a LanceDB filter expression."""
+    return "'" + value.replace("'", "''") + "'"
+
+def validate_document_ids(document_ids: List[str]) -> List[str]:
+    """Reject empty, oversized or too many document ids before they reach a filter."""
+    if not document_ids:
+        raise ValueError("No document ids given")
+    if len(document_ids) > DELETE_MAX_DOCUMENTS:
+        raise ValueError(f"At most {DELETE_MAX_DOCUMENTS} document ids per request")
+    for document_id in document_ids:
+        if not isinstance(document_id, str) or not document_id.strip() or len(document_id) > DOCUMENT_ID_MAX_LENGTH:
+            raise ValueError(f"Invalid document id: {document_id!r}")
+    return document_ids
+
+def document_id_filter(document_ids: List[str]) -> str:
+    """Filter expression matching any of the given document ids."""
+    return "document_id IN (" + ", ".join(sql_literal(document_id) for document_id in document_ids) + ")"
+
+def vector_index_config(num_rows: int):
+    """ANN index configuration for a table of num_rows vectors."""
+    if VECTOR_INDEX_TYPE == "HNSW_SQ":
+        return HnswSq(distance_type="l2")
+    if VECTOR_INDEX_TYPE == "IVF_SQ":
+        # Vectors quantised to int8 in the index: a quarter of float32, with better recall than PQ
+        return IvfSq(distance_type="l2", num_partitions=max(1, num_rows // 4096))
+    # Roughly 4k vectors per partition, with 16 dimensions per PQ sub-vector
+    return IvfPq(
+        distance_type="l2",
+        num_partitions=max(1, num_rows // 4096),
+        num_sub_vectors=EMBEDDING_DIMENSION // 16,
+    )
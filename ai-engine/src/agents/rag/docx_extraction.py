@@ -0,0 +1,164 @@
+import os
+import io
+import re
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from .chunking import Chunk, TextBlock, chunk_document
+
+logger = logging.getLogger("rag_docx_extraction")
+
+# Processes parsing uploaded .docx files (0 parses in a thread instead)
+DOCX_EXTRACTION_WORKERS = int(os.getenv("DOCX_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+
+def iter_docx_blocks(source: Union[str, BinaryIO]) -> Iterator[TextBlock]:
+    """
+    Yield the non-empty paragraphs and table rows of a .docx document in
+    document order, so callers can start chunking before the whole text is
+    assembled. Paragraphs carry their heading style level, and automatic
+    clause numbering is rendered into their text as Word displays it.
+
+    Args:
+        source: File path or binary file-like object
+    """
+    try:
+        doc = Document(source)
+    except Exception as e:
+        raise Exception(f"Failed to extract text from document: {str(e)}")
+
+    numbering_formats = _numbering_formats(doc)
+    counters: Dict[str, List[int]] = {}
+    for element in doc.element.body.iterchildren():
+        if element.tag == qn("w:p"):
+            paragraph = Paragraph(element, doc)
+            # Empty numbered paragraphs still advance the numbering
+            number = _list_number(paragraph, numbering_formats, counters)
+            if paragraph.text.strip():  # Only count non-empty paragraphs
+                text = f"{number} {paragraph.text}" if number else paragraph.text
+                yield TextBlock(text, _heading_level(paragraph))
+        elif element.tag == qn("w:tbl"):
+            for row in Table(element, doc).rows:
+                cells: List[str] = []
+                for cell in row.cells:
+                    text = cell.text.strip()
+                    # Only count non-empty cells; merged cells repeat their text
+                    if text and (not cells or cells[-1] != text):
+                        cells.append(text)
+                if cells:
+                    yield TextBlock(" | ".join(cells))
+
+
+def iter_docx_text(source: Union[str, BinaryIO]) -> Iterator[str]:
+    """Yield the text of each paragraph and table row of a .docx document."""
+    return (block.text for block in iter_docx_blocks(source))
+
+
+def extract_text_from_docx(source: Union[str, BinaryIO]) -> str:
+    """Extract the full paragraph and table text of a .docx document."""
+    return "\n".join(iter_docx_text(source))
+
+
+def chunk_docx_bytes(content: bytes) -> List[Chunk]:
+    """Parse an in-memory .docx and chunk it; runs in the extraction pool."""
+    return chunk_document(iter_docx_blocks(io.BytesIO(content)))
+
+
+def _heading_level(paragraph: Paragraph) -> Optional[int]:
+    style_name = paragraph.style.name if paragraph.style is not None else ""
+    if style_name == "Title":
+        return 0
+    match = re.fullmatch(r"Heading (\d)", style_name)
+    return int(match.group(1)) if match else None
+
+
+def _numbering_formats(doc) -> Dict[Tuple[str, str], str]:
+    """Number format ("decimal", "bullet", ...) of each (numId, ilvl) list level."""
+    try:
+        numbering = doc.part.numbering_part.element
+    except (KeyError, NotImplementedError):
+        return {}
+    abstract_formats = {
+        abstract.get(qn("w:abstractNumId")): {
+            level.get(qn("w:ilvl")): level.find(qn("w:numFmt")).get(qn("w:val"))
+            for level in abstract.findall(qn("w:lvl")) if level.find(qn("w:numFmt")) is not None
+        }
+        for abstract in numbering.findall(qn("w:abstractNum"))
+    }
+    formats = {}
+    for num in numbering.findall(qn("w:num")):
+        abstract_id = num.find(qn("w:abstractNumId"))
+        if abstract_id is not None:
+            for ilvl, fmt in abstract_formats.get(abstract_id.get(qn("w:val")), {}).items():
+                formats[(num.get(qn("w:numId")), ilvl)] = fmt
+    return formats
+
+
+def _list_number(paragraph: Paragraph, formats: Dict[Tuple[str, str], str],
+                 counters: Dict[str, List[int]]) -> Optional[str]:
+    """Rendered clause number ("9." or "9.1") of an automatically numbered paragraph."""
+    num_properties = _num_properties(paragraph._p)
+    if num_properties is None and paragraph.style is not None:
+        # Numbering applied through the paragraph style, e.g. "List Number"
+        num_properties = _num_properties(paragraph.style.element)
+    if num_properties is None or num_properties.numId is None:
+        return None
+    num_id = str(num_properties.numId.val)
+    ilvl = num_properties.ilvl.val if num_properties.ilvl is not None else 0
+    if formats.get((num_id, str(ilvl))) not in ("decimal", "decimalZero"):
+        return None
+    levels = counters.setdefault(num_id, [])
+    del levels[ilvl + 1:]
+    levels.extend([0] * (ilvl + 1 - len(levels)))
+    levels[ilvl] += 1
+    number = ".".join(str(count) for count in levels)
+    return number if ilvl else f"{number}."
+
+
+def _num_properties(element):
+    properties = element.pPr
+    return properties.numPr if properties is not None else None
+
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    if _extraction_pool is None:
+        # spawn, not fork: the parent process runs LanceDB and HTTP client threads
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=DOCX_EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _extraction_pool
+
+
+async def extract_docx_chunks(content: bytes) -> List[Chunk]:
+    """
+    Extract and chunk an uploaded .docx without blocking the event loop.
+
+    Parsing and splitting run in a bounded process pool, straight from the
+    upload bytes (no temporary file), so large contracts with many tables do
+    not stall other requests.
+    """
+    if DOCX_EXTRACTION_WORKERS <= 0:
+        return await asyncio.to_thread(chunk_docx_bytes, content)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_extraction_pool(), chunk_docx_bytes, content)
+
+
+# Shutdown function for application teardown
+def shutdown_extraction_pool():
+    """Stop the extraction processes at application shutdown."""
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
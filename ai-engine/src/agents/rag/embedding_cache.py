@@ -0,0 +1,130 @@
+import os
+import re
+import time
+import array
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("rag_embedding_cache")
+
+# Persistent embedding cache (empty path disables it)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+def normalize_text(text: str) -> str:
+    """Normalise chunk text so trivially different copies share a cache entry."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache stored in SQLite.
+
+    Entries are keyed by a hash of the normalised text plus the embedding
+    deployment name, so switching models never serves stale vectors. The
+    least recently used entries are evicted beyond max_entries. Methods are
+    blocking; EmbeddingService calls them from a worker thread.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several gunicorn workers share the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def key_for(self, text: str) -> str:
+        """Cache key for a chunk of text under this cache's embedding model."""
+        payload = f"{self.model_name}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for whichever keys are present."""
+        found: Dict[str, List[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array.array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]):
+        """Store vectors and evict the least recently used overflow."""
+        now = time.time()
+        rows = [(key, array.array("f", vector).tobytes(), now) for key, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            overflow = size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                logger.info(f"Evicted {overflow} embeddings from cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_embedding_cache(model_name: str) -> Optional[EmbeddingCache]:
+    """Open the configured embedding cache, or return None if it is disabled or unusable."""
+    if not EMBEDDING_CACHE_PATH:
+        return None
+    try:
+        return EmbeddingCache(EMBEDDING_CACHE_PATH, model_name)
+    except sqlite3.Error as e:
+        logger.error(f"Embedding cache unavailable, continuing without it: {e}")
+        return None
@@ -0,0 +1,147 @@
+import os
+import random
+import asyncio
+import logging
+from typing import List, Optional
+
+import openai
+
+from .tokenizer import count_tokens
+from .embedding_cache import EmbeddingCache
+
+logger = logging.getLogger("rag_embedding_service")
+
+# Batching and concurrency for embedding calls
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+# Retry policy for rate limits and transient failures
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_BACKOFF_BASE = float(os.getenv("EMBEDDING_BACKOFF_BASE", "1"))
+EMBEDDING_BACKOFF_MAX = float(os.getenv("EMBEDDING_BACKOFF_MAX", "30"))
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def plan_batches(texts: List[str], max_tokens: int, max_size: int) -> List[List[str]]:
+    """Group texts, in order, into batches bounded by token count and size."""
+    batches: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_size):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def retry_delay(error: Exception, attempt: int, base: float, cap: float) -> float:
+    """Delay before the next attempt: Retry-After if the server sent one, else jittered backoff."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), cap)
+            except ValueError:
+                pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class EmbeddingService:
+    """
+    Async embedding layer over a LangChain embeddings model.
+
+    Documents are split into token-bounded batches that are embedded
+    concurrently (bounded by a semaphore) via the model's async API, with
+    retry and backoff on rate limits. Nothing here blocks the event loop.
+    When a cache is given, only texts it has not seen are sent to the model.
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        self.model = model
+        self.cache = cache
+        self.batch_tokens = batch_tokens
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in concurrent batches, returning vectors in input order."""
+        if not texts:
+            return []
+        if self.cache is None:
+            return await self._embed_uncached(texts)
+
+        keys = [self.cache.key_for(text) for text in texts]
+        vectors = await asyncio.to_thread(self.cache.get_many, keys)
+
+        # Embed each distinct missing text once, even if it repeats in the document
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        if missing:
+            new_vectors = await self._embed_uncached(list(missing.values()))
+            fresh = dict(zip(missing.keys(), new_vectors))
+            await asyncio.to_thread(self.cache.put_many, fresh.items())
+            vectors.update(fresh)
+
+        return [vectors[key] for key in keys]
+
+    async def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        if self.cache is not None:
+            key = self.cache.key_for(text)
+            cached = await asyncio.to_thread(self.cache.get_many, [key])
+            if key in cached:
+                return cached[key]
+
+        async with self._semaphore:
+            vector = await self._with_retries(self.model.aembed_query, text)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put_many, [(key, vector)])
+        return vector
+
+    async def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        # Tokenizing a large document is CPU-bound, so plan batches off the loop
+        batches = await asyncio.to_thread(plan_batches, texts, self.batch_tokens, self.batch_size)
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        async with self._semaphore:
+            return await self._with_retries(self.model.aembed_documents, batch)
+
+    async def _with_retries(self, call, payload):
+        attempt = 0
+        while True:
+            try:
+                return await call(payload)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = retry_delay(e, attempt, EMBEDDING_BACKOFF_BASE, EMBEDDING_BACKOFF_MAX)
+                logger.warning(f"Embedding call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
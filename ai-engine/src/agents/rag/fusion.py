@@ -0,0 +1,80 @@
+import os
+import logging
+import threading
+from typing import Dict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from lancedb.rerankers import CrossEncoderReranker, LinearCombinationReranker, Reranker, RRFReranker
+
+logger = logging.getLogger("rag_fusion")
+
+# How vector and FTS candidates are combined: "rrf", "linear" or "cross_encoder"
+SEARCH_FUSION = os.getenv("SEARCH_FUSION", "rrf")
+# Candidates each leg contributes before fusion (at least the requested limit)
+SEARCH_VECTOR_CANDIDATES = int(os.getenv("SEARCH_VECTOR_CANDIDATES", "20"))
+SEARCH_FTS_CANDIDATES = int(os.getenv("SEARCH_FTS_CANDIDATES", "20"))
+# Reciprocal rank fusion constant
+SEARCH_RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+# Linear fusion: weight of the vector score (1 - alpha goes to the FTS score)
+SEARCH_FUSION_ALPHA = float(os.getenv("SEARCH_FUSION_ALPHA", "0.7"))
+# Local cross-encoder; needs the "local" extra (sentence-transformers) installed
+SEARCH_CROSS_ENCODER_MODEL = os.getenv("SEARCH_CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+FUSION_STRATEGIES = ("rrf", "linear", "cross_encoder")
+
+_rerankers: Dict[str, Reranker] = {}
+# Searches fuse in worker threads; the first ones must not each load the cross-encoder
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(strategy: str) -> Reranker:
+    """The reranker for a fusion strategy, built once (the cross-encoder loads a model)."""
+    with _rerankers_lock:
+        reranker = _rerankers.get(strategy)
+        if reranker is None:
+            reranker = _rerankers[strategy] = _build_reranker(strategy)
+        return reranker
+
+
+def _build_reranker(strategy: str) -> Reranker:
+    if strategy == "rrf":
+        return RRFReranker(K=SEARCH_RRF_K)
+    if strategy == "linear":
+        return LinearCombinationReranker(weight=SEARCH_FUSION_ALPHA)
+    if strategy == "cross_encoder":
+        logger.info(f"Loading cross-encoder {SEARCH_CROSS_ENCODER_MODEL}...")
+        reranker = CrossEncoderReranker(model_name=SEARCH_CROSS_ENCODER_MODEL)
+        # The model is a lazy property; load it now, while holding the lock
+        reranker.model
+        return reranker
+    raise ValueError(f"Unknown fusion strategy {strategy!r}; expected one of {', '.join(FUSION_STRATEGIES)}")
+
+
+def fuse_results(query: str, vector_results: pa.Table, fts_results: pa.Table, strategy: str, limit: int) -> pa.Table:
+    """
+    Combine the candidates of the vector and FTS legs into the top `limit` results.
+
+    Both legs must include _rowid. Scores are min-max normalised per leg
+    before fusion, as LanceDB's own hybrid query does, and the original
+    _distance/_score values are dropped in favour of _relevance_score.
+    The cross-encoder strategy is CPU-bound; call it from a worker thread.
+    """
+    if vector_results.num_rows == 0 and fts_results.num_rows == 0:
+        results = vector_results.append_column("_relevance_score", pa.array([], type=pa.float32()))
+    else:
+        if vector_results.num_rows:
+            vector_results = _set_normalized(vector_results, "_distance")
+        if fts_results.num_rows:
+            fts_results = _set_normalized(fts_results, "_score")
+        results = get_reranker(strategy).rerank_hybrid(query, vector_results, fts_results)
+        results = results.slice(0, limit)
+    return results.drop([column for column in ("_rowid", "_distance", "_score") if column in results.column_names])
+
+
+def _set_normalized(results: pa.Table, column: str) -> pa.Table:
+    scores = pc.cast(results[column], pa.float32())
+    low, high = pc.min(scores).as_py(), pc.max(scores).as_py()
+    span = high - low
+    normalized = pc.divide(pc.subtract(scores, low), span) if span else pc.multiply(scores, 0.0)
+    return results.set_column(results.column_names.index(column), column, normalized)
@@ -0,0 +1,437 @@
+import os
+import io
+import json
+import time
+import zlib
+import uuid
+import asyncio
+import logging
+import sqlite3
+import zipfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .document_store import DocumentChunk, DocumentStore, document_store
+from .docx_extraction import extract_docx_chunks
+
+logger = logging.getLogger("rag_ingestion")
+
+# Bulk ingestion worker pool
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "4"))
+# Chunks coalesced into one table.add call
+INGESTION_BATCH_ROWS = int(os.getenv("INGESTION_BATCH_ROWS", "2000"))
+# Seconds a partial batch waits for more chunks before it is written
+INGESTION_FLUSH_INTERVAL = float(os.getenv("INGESTION_FLUSH_INTERVAL", "1.0"))
+# Upload limits (bytes per document / documents and expanded bytes per job)
+INGESTION_MAX_FILE_SIZE = int(os.getenv("INGESTION_MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+INGESTION_MAX_FILES = int(os.getenv("INGESTION_MAX_FILES", "1000"))
+INGESTION_MAX_TOTAL_SIZE = int(os.getenv("INGESTION_MAX_TOTAL_SIZE", str(200 * 1024 * 1024)))
+# Finished jobs kept for status queries
+INGESTION_MAX_JOBS = int(os.getenv("INGESTION_MAX_JOBS", "200"))
+# Job records shared by the workers on a host, so any of them can report a job (empty keeps them per worker)
+INGESTION_JOBS_PATH = os.getenv("INGESTION_JOBS_PATH", "ingestion_jobs.sqlite3")
+
+
+class UploadRejected(ValueError):
+    """An upload that cannot be turned into an ingestion job."""
+
+
+class UploadBudget:
+    """
+    Documents and bytes one ingestion job may still take, shared by all
+    files of the request. Uploads are checked against it while they are
+    read and archives while they are expanded, so an over-limit request
+    is rejected before it is held in memory.
+    """
+
+    def __init__(self, max_files: int = INGESTION_MAX_FILES, max_bytes: int = INGESTION_MAX_TOTAL_SIZE):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.files = max_files
+        self.bytes = max_bytes
+
+    def check_bytes(self, name: str, size: int):
+        if size > self.bytes:
+            raise UploadRejected(f"{name}: uploads are limited to {self.max_bytes} bytes per job")
+
+    def charge(self, name: str, size: int):
+        """Take one document of size bytes out of the budget."""
+        if not self.files:
+            raise UploadRejected(f"At most {self.max_files} documents per job")
+        self.check_bytes(name, size)
+        self.files -= 1
+        self.bytes -= size
+
+
+def expand_upload(filename: str, content: bytes, max_file_size: int = INGESTION_MAX_FILE_SIZE,
+                  budget: Optional[UploadBudget] = None) -> List[Tuple[str, bytes]]:
+    """
+    Turn one uploaded file into (filename, bytes) pairs of .docx documents.
+
+    Zip archives are expanded to the .docx files they contain; sizes are
+    checked before decompressing so an archive cannot expand unbounded.
+
+    Args:
+        filename: Name of the uploaded file
+        content: Its bytes
+        max_file_size: Largest document accepted, in bytes
+        budget: Documents and bytes left for the job, charged for every
+            document returned (a fresh budget if not given)
+    """
+    budget = budget or UploadBudget()
+    lower_name = filename.lower()
+    if lower_name.endswith(".docx"):
+        if len(content) > max_file_size:
+            raise UploadRejected(f"{filename} is too large")
+        budget.charge(filename, len(content))
+        return [(filename, content)]
+    if not lower_name.endswith(".zip"):
+        raise UploadRejected(f"{filename}: only .docx files and .zip archives of them are supported")
+
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        raise UploadRejected(f"{filename} is not a valid zip archive")
+    documents = []
+    with archive:
+        for info in archive.infolist():
+            member_name = os.path.basename(info.filename)
+            # Skip folders, macOS resource forks and Word lock files
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or member_name.startswith(("~$", "._")):
+                continue
+            if not member_name.lower().endswith(".docx"):
+                continue
+            if info.file_size > max_file_size:
+                raise UploadRejected(f"{filename}: {info.filename} is too large")
+            budget.charge(f"{filename}: {info.filename}", info.file_size)
+            try:
+                # Reads stop at the declared size, so a forged header cannot expand further
+                documents.append((member_name, archive.read(info)))
+            except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                raise UploadRejected(f"{filename}: {info.filename} is corrupt ({e})")
+    return documents
+
+
+class IngestionJob:
+    """Progress of one bulk upload."""
+
+    def __init__(self, files: List[Tuple[str, bytes]], upsert: bool = False, domain: Optional[str] = None):
+        self.job_id = str(uuid.uuid4())
+        self.upsert = upsert
+        self.domain = domain
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.documents = [
+            {"filename": filename, "status": "queued", "document_id": None, "chunks_added": 0, "error": None}
+            for filename, _ in files
+        ]
+        self.pending = len(files)
+        # Bumped on every change, so stored records are only ever replaced by newer ones
+        self.revision = 0
+        self.saved_revision = -1
+
+    @property
+    def status(self) -> str:
+        statuses = {document["status"] for document in self.documents}
+        if self.pending:
+            return "queued" if statuses == {"queued"} else "running"
+        if statuses == {"failed"}:
+            return "failed"
+        return "completed_with_errors" if "failed" in statuses else "completed"
+
+    def start_document(self, index: int):
+        self.documents[index]["status"] = "running"
+        self.revision += 1
+
+    def finish_document(self, index: int, **fields):
+        self.documents[index].update(fields)
+        self.revision += 1
+        self.pending -= 1
+        if not self.pending:
+            self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        counts = {"total": len(self.documents), "completed": 0, "failed": 0}
+        for document in self.documents:
+            if document["status"] in ("completed", "failed"):
+                counts[document["status"]] += 1
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            **counts,
+            "chunks_added": sum(document["chunks_added"] for document in self.documents),
+            "documents": self.documents,
+        }
+
+
+class SqliteJobStore:
+    """
+    Ingestion job records in a local SQLite file, so a status poll that
+    lands on any gunicorn worker on the host finds the job. A record is
+    only replaced by a newer revision, and finished jobs beyond max_jobs
+    are dropped oldest first. Methods are blocking; IngestionQueue calls
+    them from a worker thread.
+    """
+
+    def __init__(self, path: str = INGESTION_JOBS_PATH, max_jobs: int = INGESTION_MAX_JOBS):
+        self.path = path
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several gunicorn workers share the file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, revision INTEGER NOT NULL, record TEXT NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+        self._conn.commit()
+
+    def save(self, job_id: str, revision: int, record: str, finished_at: Optional[float]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, revision, record, finished_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (job_id) DO UPDATE SET"
+                " revision = excluded.revision, record = excluded.record, finished_at = excluded.finished_at"
+                " WHERE excluded.revision > jobs.revision",
+                (job_id, revision, record, finished_at),
+            )
+            if finished_at is not None:
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE finished_at IS NOT NULL AND job_id NOT IN"
+                    " (SELECT job_id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+                    (self.max_jobs,),
+                )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ChunkWriter:
+    """
+    Coalesces chunks from many documents into large table.add calls.
+
+    A batch is written once it reaches batch_rows, or flush_interval seconds
+    after its first chunk arrived; write() returns once the caller's chunks
+    are stored.
+    """
+
+    def __init__(self, store: DocumentStore, batch_rows: int = INGESTION_BATCH_ROWS,
+                 flush_interval: float = INGESTION_FLUSH_INTERVAL):
+        self.store = store
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        # Each caller's chunks with the future it waits on
+        self._pending: List[Tuple[List[DocumentChunk], asyncio.Future]] = []
+        self._pending_rows = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self.batches_written = 0
+
+    async def write(self, chunks: List[DocumentChunk]):
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending.append((chunks, waiter))
+        self._pending_rows += len(chunks)
+        if self._pending_rows >= self.batch_rows:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+        await waiter
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            # Chunks of a cancelled write (e.g. at shutdown) are not stored
+            pending = [(chunks, waiter) for chunks, waiter in self._pending if not waiter.done()]
+            self._pending, self._pending_rows = [], 0
+            if not pending:
+                return
+            rows = [row for chunks, _ in pending for row in chunks]
+            waiters = [waiter for _, waiter in pending]
+            try:
+                await self.store.add_chunks(rows)
+                self.batches_written += 1
+            except Exception as e:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+            else:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+
+class IngestionQueue:
+    """
+    Background worker pool that extracts, embeds and stores uploaded documents.
+
+    Jobs run in the worker that accepted them; their records are also
+    saved to a SqliteJobStore at jobs_path (INGESTION_JOBS_PATH if not
+    given) so the other workers on the host can report them.
+    """
+
+    def __init__(self, store: DocumentStore = document_store, workers: int = INGESTION_WORKERS,
+                 batch_rows: int = INGESTION_BATCH_ROWS, flush_interval: float = INGESTION_FLUSH_INTERVAL,
+                 jobs_path: Optional[str] = None):
+        self.store = store
+        self.workers = workers
+        self.writer = ChunkWriter(store, batch_rows, flush_interval)
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self.jobs_path = jobs_path
+        self._job_store: Optional[SqliteJobStore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the worker tasks (idempotent)."""
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop the workers; documents that were queued or still running are marked failed."""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        await self.writer.close()
+        for job in self.jobs.values():
+            for index, document in enumerate(job.documents):
+                if document["status"] in ("queued", "running"):
+                    job.finish_document(index, status="failed", error="Ingestion stopped before the document was stored")
+            if job.revision != job.saved_revision:
+                await self._save(job)
+        if self._job_store is not None:
+            self._job_store.close()
+            self._job_store = None
+
+    @property
+    def job_store(self) -> Optional[SqliteJobStore]:
+        """The shared job records, opened on first use (None if disabled)."""
+        if self._job_store is None:
+            path = INGESTION_JOBS_PATH if self.jobs_path is None else self.jobs_path
+            if path:
+                self._job_store = SqliteJobStore(path)
+        return self._job_store
+
+    async def _save(self, job: IngestionJob):
+        """Write the job's current record to the shared job store."""
+        # Serialised now, so the record matches the revision it is saved under
+        revision, record = job.revision, json.dumps(job.to_dict())
+        try:
+            store = self.job_store
+            if store is None:
+                return
+            await asyncio.to_thread(store.save, job.job_id, revision, record, job.finished_at)
+            job.saved_revision = max(job.saved_revision, revision)
+        except sqlite3.Error as e:
+            logger.error(f"Could not save ingestion job {job.job_id}: {e}")
+
+    async def submit(self, files: List[Tuple[str, bytes]], upsert: bool = False, domain: Optional[str] = None) -> IngestionJob:
+        """
+        Queue documents for ingestion and return their job immediately.
+
+        Args:
+            files: (filename, .docx bytes) pairs
+            upsert: Update documents already stored under the same file name
+                incrementally instead of adding them again
+            domain: Practice area tag for every document in the job
+        """
+        if not files:
+            raise UploadRejected("No .docx documents found in the upload")
+        if len(files) > INGESTION_MAX_FILES:
+            raise UploadRejected(f"At most {INGESTION_MAX_FILES} documents per job")
+        self.start()
+
+        job = IngestionJob(files, upsert, domain)
+        self.jobs[job.job_id] = job
+        self._prune_jobs()
+        # Saved before the job id is returned, so a poll on another worker finds it
+        await self._save(job)
+        for index, (filename, content) in enumerate(files):
+            self._queue.put_nowait((job, index, filename, content))
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """A job's progress, from this worker if it runs the job, otherwise from the shared job store."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        try:
+            store = self.job_store
+            record = await asyncio.to_thread(store.get, job_id) if store is not None else None
+        except sqlite3.Error as e:
+            logger.error(f"Could not read ingestion job {job_id}: {e}")
+            return None
+        return json.loads(record) if record else None
+
+    def _prune_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(self.jobs) - INGESTION_MAX_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job, index, filename, content = await self._queue.get()
+            try:
+                await self._ingest(job, index, filename, content)
+            finally:
+                self._queue.task_done()
+
+    async def _ingest(self, job: IngestionJob, index: int, filename: str, content: bytes):
+        job.start_document(index)
+        await self._save(job)
+        document_id = str(uuid.uuid4())
+        try:
+            chunks = await extract_docx_chunks(content)
+            if job.upsert:
+                # Incremental updates are one merge_insert per document, not coalesced
+                result = await self.store.upsert_document(chunks, filename, domain=job.domain)
+                document_id, chunks_added = result["document_id"], result["chunks_added"]
+            else:
+                rows = await self.store.prepare_chunks(chunks, filename, document_id, job.domain)
+                if rows:
+                    await self.writer.write(rows)
+                chunks_added = len(rows)
+        except Exception as e:
+            logger.error(f"Error ingesting {filename} (job {job.job_id}): {e}")
+            job.finish_document(index, status="failed", error=str(e))
+        else:
+            job.finish_document(index, status="completed", document_id=document_id, chunks_added=chunks_added)
+        await self._save(job)
+
+    async def join(self):
+        """Wait until every queued document has been processed."""
+        if self._queue is not None:
+            await self._queue.join()
+
+
+# Create a global instance for use across the application
+ingestion_queue = IngestionQueue()
+
+# Shutdown function for application teardown
+async def shutdown_ingestion_queue():
+    """Stop the ingestion workers at application shutdown."""
+    await ingestion_queue.close()
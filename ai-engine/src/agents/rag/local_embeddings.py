@@ -0,0 +1,87 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("rag_local_embeddings")
+
+# sentence-transformers model for EMBEDDING_PROVIDER=local (all-MiniLM-L6-v2 has 384 dimensions)
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "torch", or "onnx" for ONNX Runtime inference (needs sentence-transformers[onnx])
+LOCAL_EMBEDDING_BACKEND = os.getenv("LOCAL_EMBEDDING_BACKEND", "torch")
+LOCAL_EMBEDDING_DEVICE = os.getenv("LOCAL_EMBEDDING_DEVICE", "cpu")
+# Texts per forward pass, and threads running inference (each pass already uses several cores)
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "1"))
+
+_models: Dict[str, object] = {}
+_models_lock = threading.Lock()
+
+
+def load_model(model_name: str, backend: str = LOCAL_EMBEDDING_BACKEND, device: str = LOCAL_EMBEDDING_DEVICE):
+    """Load a sentence-transformers model once per process."""
+    with _models_lock:
+        if model_name not in _models:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise ImportError("EMBEDDING_PROVIDER=local needs sentence-transformers: pip install \".[local]\"")
+            logger.info(f"Loading local embedding model {model_name} ({backend} on {device})...")
+            _models[model_name] = SentenceTransformer(model_name, backend=backend, device=device)
+        return _models[model_name]
+
+
+class LocalEmbeddings:
+    """
+    CPU embedding model with the LangChain embeddings interface, so it
+    drops in under EmbeddingService in place of AzureOpenAIEmbeddings.
+
+    The model is loaded on first use and shared by every instance in the
+    process. Async calls run batched inference on a small thread pool,
+    keeping the event loop free; vectors are L2-normalised.
+    """
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+                 threads: int = LOCAL_EMBEDDING_THREADS):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="local-embeddings")
+
+    @property
+    def dimensions(self) -> int:
+        return load_model(self.model_name).get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = load_model(self.model_name).encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def check_dimension(model: LocalEmbeddings, expected: Optional[int]):
+    """Fail fast if the model's vectors do not fit the configured EMBEDDING_DIMENSION."""
+    if expected is not None and model.dimensions != expected:
+        raise ValueError(
+            f"{model.model_name} produces {model.dimensions}-dimensional vectors, "
+            f"but EMBEDDING_DIMENSION is {expected}"
+        )
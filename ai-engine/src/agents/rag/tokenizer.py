@@ -0,0 +1,37 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger("rag_tokenizer")
+
+# Rough characters-per-token ratio for English text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the cl100k_base encoding once, or None if it cannot be loaded."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the local cl100k_base tokenizer (ada-002 / GPT-4)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, -(-len(text) // CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of text that is at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
@@ -5,10 +5,65 @@ This file is automatically loaded by pytest and can contain fixtures, hooks, and
 
 import os
 import sys
+import hashlib
 import pytest
+import pytest_asyncio
+import lancedb
 
 # Add the project root to the path so imports work correctly
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Configure pytest to recognize the asyncio marker
-pytest_plugins = ["pytest_asyncio"] 
\ No newline at end of file
+pytest_plugins = ["pytest_asyncio"]
+
+from src.agents.rag.document_store import DocumentStore, DocumentChunk
+from src.agents.rag.embedding_service import EmbeddingService
+
+
+@pytest.fixture
+def azure_env(monkeypatch):
+    """Dummy Azure OpenAI settings so clients can be constructed for offline tests."""
+    monkeypatch.setenv("AZURE_OPENAI_KEY", "test-key")
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+    monkeypatch.setenv("AZURE_OPENAI_VERSION", "2024-02-01")
+    monkeypatch.setenv("GPT4_DEPLOYMENT_NAME", "gpt-4")
+
+
+class FakeEmbeddings:
+    """Deterministic offline stand-in for AzureOpenAIEmbeddings."""
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def _embed(self, text: str):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [digest[i % len(digest)] / 255.0 for i in range(self.dimensions)]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self._embed(text)
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+@pytest_asyncio.fixture
+async def store(tmp_path):
+    """A DocumentStore backed by a local LanceDB directory and fake embeddings."""
+    document_store = DocumentStore()
+    document_store.embeddings_model = FakeEmbeddings()
+    document_store.embedding_service = EmbeddingService(document_store.embeddings_model)
+    document_store.db = await lancedb.connect_async(str(tmp_path / "lancedb"))
+    document_store.table = await document_store.db.create_table("legal_documents", schema=DocumentChunk)
+    await document_store.open_catalog()
+    await document_store.ensure_fts_index()
+    yield document_store
+    await document_store.close()
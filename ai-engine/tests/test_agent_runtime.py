@@ -0,0 +1,142 @@
+import os
+import sys
+import shutil
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.crews.legal_support_agents.legal_support_agents import LegalSupportAgents, AgentName, RoutingDecision
+from src.agents.crews.legal_support_agents.runtime import (
+    AgentRuntime, ChatPrompt, PromptTemplate, TASK_AGENTS, CONFIG_DIR, agent_template_fields
+)
+
+
+@pytest.fixture
+def config_copy(tmp_path):
+    """Editable copies of the shipped agent and task configs."""
+    agents_path = tmp_path / "agents.yaml"
+    tasks_path = tmp_path / "tasks.yaml"
+    shutil.copy(CONFIG_DIR / "agents.yaml", agents_path)
+    shutil.copy(CONFIG_DIR / "tasks.yaml", tasks_path)
+    return agents_path, tasks_path
+
+
+def test_compiled_prompts_match_str_format(azure_env):
+    runtime = AgentRuntime()
+    configs = runtime.configs
+    values = {"query": "What is {John} Doe's salary?", "relevant_context": "Document 1: contract.docx"}
+
+    for task_name, agent_key in TASK_AGENTS.items():
+        task_config = configs.tasks_config[task_name]
+        fields = agent_template_fields(configs.agents_config[agent_key])
+        expected = [
+            {"role": "system", "content": task_config["description"].format(**fields)},
+            {"role": "user", "content": task_config["input"].format(**fields, **values)},
+        ]
+
+        assert configs.prompts[task_name].render(**values) == expected
+
+
+def test_system_prefix_is_identical_across_queries(azure_env):
+    configs = AgentRuntime().configs
+    queries = ["What is John Doe's salary?", "Who are the directors?", ""]
+
+    for task_name, prompt in configs.prompts.items():
+        system_messages = {
+            prompt.render(query=query, relevant_context=f"Document 1: {query}")[0]["content"].encode()
+            for query in queries
+        }
+        assert system_messages == {prompt.system_message.encode()}, task_name
+        assert "John Doe" not in prompt.system_message
+
+
+def test_per_request_fields_are_rejected_in_system_instructions():
+    with pytest.raises(ValueError, match="input"):
+        ChatPrompt("answer", {"description": "{agent_role}: answer {query}", "input": "{query}"}, {"agent_role": "Expert"})
+
+
+def test_prompt_template_keeps_only_dynamic_fields():
+    template = PromptTemplate("{agent_role}: {query} ({tone})", {"agent_role": "Expert", "tone": None})
+
+    assert template.fields == {"query"}
+    assert template.render(query="Q") == "Expert: Q (None)"
+
+
+def test_agents_share_runtime_client(azure_env):
+    runtime = AgentRuntime()
+    first = LegalSupportAgents(runtime=runtime)
+    second = LegalSupportAgents(runtime=runtime)
+
+    assert first.client is second.client
+    assert first.prompts is second.prompts
+
+
+def test_reload_if_changed_swaps_snapshot(azure_env, config_copy):
+    agents_path, tasks_path = config_copy
+    runtime = AgentRuntime(agents_config_path=agents_path, tasks_config_path=tasks_path)
+    original = runtime.configs
+
+    assert runtime.reload_if_changed() is False
+
+    agents_path.write_text(agents_path.read_text().replace("neutral and helpful", "brief"))
+    os.utime(agents_path, ns=(original.mtimes[0] + 1_000_000_000,) * 2)
+
+    assert runtime.reload_if_changed() is True
+    assert runtime.configs is not original
+    assert "brief" in runtime.configs.prompts["route_request"].system_message
+
+
+def test_reload_keeps_previous_snapshot_on_broken_yaml(azure_env, config_copy):
+    agents_path, tasks_path = config_copy
+    runtime = AgentRuntime(agents_config_path=agents_path, tasks_config_path=tasks_path)
+    original = runtime.configs
+
+    tasks_path.write_text("route_request: [unclosed")
+    os.utime(tasks_path, ns=(original.mtimes[1] + 1_000_000_000,) * 2)
+
+    assert runtime.reload_if_changed() is False
+    assert runtime.configs is original
+
+
+@pytest.mark.asyncio
+async def test_routing_guideline_edit_invalidates_routing_cache(azure_env, config_copy):
+    agents_path, tasks_path = config_copy
+    crew = LegalSupportAgents(runtime=AgentRuntime(agents_config_path=agents_path, tasks_config_path=tasks_path))
+    decision = SimpleNamespace(agent_name=AgentName.EMPLOYMENT)
+    crew.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=decision))))
+    llm_call = crew.client.chat.completions.create
+
+    await crew.route_query("Tell me something interesting")
+    await crew.route_query("Tell me something interesting")
+    assert llm_call.await_count == 1
+
+    mtime = crew.runtime.configs.mtimes[0]
+    agents_path.write_text(agents_path.read_text().replace("HR-related matters", "HR or payroll matters"))
+    os.utime(agents_path, ns=(mtime + 1_000_000_000,) * 2)
+    assert crew.runtime.reload_if_changed() is True
+
+    await crew.route_query("Tell me something interesting")
+    assert llm_call.await_count == 2
+    assert crew.runtime.routing_cache.stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_prompt_tokens_are_counted_per_task(azure_env):
+    crew = LegalSupportAgents(runtime=AgentRuntime())
+    usage = SimpleNamespace(prompt_tokens=1200, prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+    decision = RoutingDecision(agent_name=AgentName.EMPLOYMENT)
+    decision._raw_response = SimpleNamespace(usage=usage)
+    crew.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=decision))))
+    crew.runtime.configs.local_router = None
+
+    await crew.route_query("Tell me something interesting")
+    crew.record_usage("route_request", RoutingDecision(agent_name=AgentName.EMPLOYMENT))
+
+    stats = crew.runtime.prompt_cache_stats.stats()
+    assert stats["tasks"]["route_request"] == {
+        "calls": 1, "prompt_tokens": 1200, "cached_tokens": 1024, "cached_ratio": 1024 / 1200
+    }
+    assert stats["cached_ratio"] == 1024 / 1200
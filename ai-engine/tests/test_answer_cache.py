@@ -0,0 +1,145 @@
+import os
+import sys
+import pytest
+from unittest.mock import AsyncMock
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.crews.legal_support_agents.answer_cache import AnswerCache, MemoryAnswerStore, SqliteAnswerStore
+from src.agents.crews.legal_support_agents.legal_support_agents import (
+    CONTEXT_UNAVAILABLE, LegalSupportAgents, AgentName, document_store,
+)
+from src.agents.crews.legal_support_agents.runtime import AgentRuntime
+
+
+def worker(store) -> LegalSupportAgents:
+    """LegalSupportAgents on an answer store, with stubbed routing, retrieval and answers."""
+    crew = LegalSupportAgents(runtime=AgentRuntime())
+    crew.runtime.answer_cache = AnswerCache(store)
+    crew.route_query = AsyncMock(return_value=AgentName.EMPLOYMENT)
+    crew.rag_initialized = True
+    crew.get_relevant_context = AsyncMock(return_value="Document 1: contract.docx")
+    crew._handle_employment_query = AsyncMock(return_value="**[Employment Expert]** 50,000 GBP")
+    crew._handle_compliance_query = AsyncMock(return_value="**[Compliance Specialist]** Register with the ICO")
+    return crew
+
+
+@pytest.fixture
+def agents(azure_env):
+    return worker(MemoryAnswerStore())
+
+
+def test_memory_store_expires_entries():
+    now = [0.0]
+    store = MemoryAnswerStore(clock=lambda: now[0])
+    store.set("key", "answer", ttl=60)
+
+    assert store.get("key") == "answer"
+    now[0] = 61
+    assert store.get("key") is None
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    first, second = SqliteAnswerStore(path, max_entries=2), SqliteAnswerStore(path, max_entries=2)
+
+    first.set("a", "answer a", ttl=60)
+    assert second.get("a") == "answer a"
+
+    first.set("expired", "old", ttl=-1)
+    assert second.get("expired") is None
+
+    second.set("b", "answer b", ttl=60)
+    second.set("c", "answer c", ttl=60)
+    # The least recently used entry is evicted beyond max_entries
+    assert [first.get(key) for key in "abc"] == [None, "answer b", "answer c"]
+    assert second.stats()["size"] == 2
+    first.close()
+    second.close()
+
+
+def test_keys_normalise_whitespace_only():
+    context = {"relevant_context": "Document 1: contract.docx"}
+    key = AnswerCache.key_for("What is  the notice period?", "Employment Expert", "gpt-4", "f1", context)
+
+    assert key == AnswerCache.key_for(" What is the notice period? ", "Employment Expert", "gpt-4", "f1", context)
+    assert key != AnswerCache.key_for("What is the notice period?", "Employment Expert", "gpt-4", "f1", {})
+    assert key != AnswerCache.key_for("What is the notice period?", "Employment Expert", "gpt-4", "f2", context)
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_is_answered_from_cache(agents):
+    first = await agents.process_query("How much is John Doe's salary?")
+    second = await agents.process_query("How much is  John Doe's salary?")
+
+    assert first == second == "**[Employment Expert]** 50,000 GBP"
+    assert agents._handle_employment_query.await_count == 1
+    assert agents.runtime.answer_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_a_delete_on_one_worker_invalidates_answers_on_another(azure_env, tmp_path, monkeypatch):
+    path = str(tmp_path / "answers.sqlite3")
+    first, second = worker(SqliteAnswerStore(path)), worker(SqliteAnswerStore(path))
+    query = "How much is John Doe's salary?"
+
+    await first.process_query(query)
+    # Workers build the same key, whatever table version each process last saw
+    monkeypatch.setattr(document_store, "table_version", 12)
+    assert await second.process_query(query) == "**[Employment Expert]** 50,000 GBP"
+    assert second._handle_employment_query.await_count == 0
+
+    # The first worker deletes the contract; retrieval on both now returns other documents
+    for crew in (first, second):
+        crew.get_relevant_context.return_value = "Document 1: handbook.docx"
+    await second.process_query(query)
+    assert second._handle_employment_query.await_count == 1
+
+    first.runtime.answer_cache.close()
+    second.runtime.answer_cache.close()
+
+
+@pytest.mark.asyncio
+async def test_table_versions_alone_do_not_invalidate_answers(agents, monkeypatch):
+    await agents.process_query("How much is John Doe's salary?")
+    # Compaction or an FTS refresh moves the version without changing what is retrieved
+    monkeypatch.setattr(document_store, "table_version", 8)
+    await agents.process_query("How much is John Doe's salary?")
+    assert agents._handle_employment_query.await_count == 1
+    # Retrieval ran for both queries, so the context check saw current documents
+    assert agents.get_relevant_context.await_count == 2
+
+    # Compliance answers do not use retrieved documents
+    agents.route_query.return_value = AgentName.COMPLIANCE
+    await agents.process_query("Do we need to register with the ICO?")
+    await agents.process_query("Do we need to register with the ICO?")
+    assert agents._handle_compliance_query.await_count == 1
+    assert agents.get_relevant_context.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_agent_config_and_ttl_control_caching(agents):
+    await agents.process_query("How much is John Doe's salary?")
+    agents.runtime.configs.task_fingerprints["answer_employment_question"] = "edited"
+    await agents.process_query("How much is John Doe's salary?")
+    assert agents._handle_employment_query.await_count == 2
+
+    agents.agents_config["employment_expert"]["answer_cache_ttl"] = 0
+    await agents.process_query("What is the notice period?")
+    await agents.process_query("What is the notice period?")
+    assert agents._handle_employment_query.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_failed_answers_are_not_cached(agents):
+    agents._handle_employment_query.side_effect = [RuntimeError("boom"), "**[Employment Expert]** 50,000 GBP"]
+
+    assert await agents.process_query("How much is John Doe's salary?") == "An error occurred while processing your query."
+    assert await agents.process_query("How much is John Doe's salary?") == "**[Employment Expert]** 50,000 GBP"
+
+    # Nor are answers given without the documents
+    agents.get_relevant_context.return_value = CONTEXT_UNAVAILABLE
+    await agents.process_query("What is the notice period?")
+    await agents.process_query("What is the notice period?")
+    assert agents._handle_employment_query.await_count == 4
@@ -0,0 +1,58 @@
+import os
+import sys
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.rag.chunking import Chunk, TextBlock, chunk_blocks, chunk_text, section_heading
+
+CONTRACT = """Employment Contract
+9. Holiday
+9.1 The Employee shall be entitled to 25 days of paid holiday in each holiday year, in addition to the usual public holidays in England.
+9.2 Holiday may only be taken at such times as are agreed with the Employer. The Employee shall give at least two weeks' notice of any planned holiday.
+9.3 On termination of employment the Employee shall be entitled to pay in lieu of accrued but untaken holiday for the current holiday year.
+10. Notice
+10.1 Either party may terminate this contract by giving the other not less than three months' written notice.
+10.2 The Employer may make a payment in lieu of notice equal to the basic salary the Employee would have received during the notice period."""
+
+
+def test_section_heading_distinguishes_headings_from_clauses():
+    assert section_heading(TextBlock("9. Holiday")) == (1, "9. Holiday")
+    assert section_heading(TextBlock("9.1 The Employee shall be entitled to 25 days.")) == (2, "9.1")
+    assert section_heading(TextBlock("Holiday entitlement", heading_level=2)) == (2, "Holiday entitlement")
+    assert section_heading(TextBlock("3 months' notice is required.")) is None
+
+
+def test_chunks_follow_sections_and_keep_clauses_intact():
+    chunks = list(chunk_blocks((TextBlock(line) for line in CONTRACT.splitlines()), max_size=300, min_size=100))
+
+    # Clauses 9.2 and 9.3 are packed together under their common section
+    assert [chunk.section for chunk in chunks] == ["9. Holiday", "9. Holiday", "10. Notice"]
+    assert chunks[0].text.startswith("Employment Contract\n9. Holiday\n9.1 The Employee")
+    assert chunks[1].text.startswith("9.2 Holiday") and "\n9.3 On termination" in chunks[1].text
+    assert chunks[2].text.startswith("10. Notice\n10.1 Either party")
+    clauses = [line for line in CONTRACT.splitlines() if line[:2].isdigit()]
+    assert all(any(clause in chunk.text for chunk in chunks) for clause in clauses)
+
+
+def test_top_level_sections_start_new_chunks():
+    chunks = list(chunk_blocks((TextBlock(line) for line in CONTRACT.splitlines()), max_size=2000, min_size=100))
+
+    assert [chunk.section for chunk in chunks] == ["9. Holiday", "10. Notice"]
+
+
+def test_oversized_clause_is_split_between_sentences_with_its_section():
+    clause = "9.1 " + " ".join(f"Sentence number {i} of the clause." for i in range(40))
+
+    chunks = list(chunk_blocks([TextBlock("9. Holiday"), TextBlock(clause)], max_size=300, min_size=50))
+
+    assert len(chunks) > 2
+    assert all(len(chunk.text) <= 300 + 50 for chunk in chunks)
+    assert all(chunk.section.startswith("9. Holiday") for chunk in chunks)
+    assert all(chunk.text.endswith(".") for chunk in chunks)
+
+
+def test_chunk_text_uses_structure_strategy_by_default():
+    assert chunk_text("1. Parties\nThis contract is made between Acme Ltd and John Doe.") == [
+        Chunk("1. Parties\nThis contract is made between Acme Ltd and John Doe.", "1. Parties")
+    ]
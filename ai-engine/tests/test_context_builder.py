@@ -0,0 +1,76 @@
+import os
+import sys
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.rag.context_builder import NO_CONTEXT, build_context, merge_overlapping, merge_passages
+from src.agents.rag.tokenizer import count_tokens
+
+
+def result(document_id, chunk_index, text, section=None):
+    return {"document_id": document_id, "document_name": f"{document_id}.docx", "chunk_index": chunk_index,
+            "section": section, "text": text}
+
+
+def test_overlap_repeated_by_the_splitter_is_sent_once():
+    assert merge_overlapping("notice must be given in writing", "in writing to the employer", max_overlap=50) == \
+        "notice must be given in writing to the employer"
+    assert merge_overlapping("Salary is paid monthly.", "Holidays are 25 days.", max_overlap=50) == \
+        "Salary is paid monthly.\nHolidays are 25 days."
+
+
+def test_chunks_without_splitter_overlap_keep_their_text():
+    # Structure-aware chunks do not overlap: a repeated phrase is content
+    assert merge_overlapping("The Secretary shall report to the Board.", "the Board. 2. Duties", max_overlap=0) == \
+        "The Secretary shall report to the Board.\nthe Board. 2. Duties"
+    # Overlap is bounded by the splitter's CHUNK_OVERLAP
+    assert merge_overlapping("aaaa the employee", "aaaa the employee must", max_overlap=10) == \
+        "aaaa the employee\naaaa the employee must"
+
+
+def test_neighbouring_chunks_merge_and_keep_best_rank():
+    passages = merge_passages([
+        result("b", 4, "Bonus is discretionary."),
+        result("a", 1, "must give four weeks notice in writing.", section="9. Notice"),
+        result("a", 0, "The employee must give four weeks notice", section="9. Notice"),
+        result("a", 5, "Unrelated later clause."),
+        result("c", 0, "Bonus is  discretionary."),
+    ], max_overlap=50)
+
+    assert [(p.document_id, p.first_index, p.last_index) for p in passages] == [("b", 4, 4), ("a", 0, 1), ("a", 5, 5)]
+    assert passages[1].text == "The employee must give four weeks notice in writing."
+    assert passages[1].section == "9. Notice"
+
+
+def test_neighbouring_chunks_of_different_sections_stay_apart():
+    passages = merge_passages([
+        result("a", 3, "The Secretary shall report to the Board.", section="1. Appointment"),
+        result("a", 4, "2. Duties The Secretary keeps the registers.", section="2. Duties"),
+    ], max_overlap=50)
+
+    assert [(p.section, p.text) for p in passages] == [
+        ("1. Appointment", "The Secretary shall report to the Board."),
+        ("2. Duties", "2. Duties The Secretary keeps the registers."),
+    ]
+
+
+def test_context_fills_budget_in_relevance_order():
+    long_text = "The options vest monthly over four years. " * 60
+    results = [result("a", 0, "Salary is 50,000 GBP."), result("b", 0, long_text), result("c", 0, "Notice is four weeks.")]
+
+    context = build_context(results, token_budget=200)
+
+    assert count_tokens(context) <= 200
+    assert context.index("Document 1: a.docx") < context.index("Document 2: b.docx")
+    # The truncated second passage used the rest of the budget
+    assert "c.docx" not in context
+
+    context = build_context(results, token_budget=80)
+    assert "Document 2: c.docx" in context
+    assert long_text not in context
+
+
+def test_empty_or_unfittable_results_have_no_context():
+    assert build_context([]) == NO_CONTEXT
+    assert build_context([result("a", 0, "Salary is 50,000 GBP.")], token_budget=5) == NO_CONTEXT
@@ -0,0 +1,428 @@
+import os
+import sys
+import asyncio
+import importlib
+import pytest
+import lancedb
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+document_store_module = importlib.import_module("src.agents.rag.document_store")
+from src.agents.rag.document_store import DocumentChunk, DocumentExists, SearchFilter
+from src.agents.rag.chunking import Chunk
+
+CONTRACT_TEXT = """1. Parties
+This employment contract is made between Acme Ltd and John Doe.
+
+2. Salary
+John Doe's salary is 50,000 GBP per annum, paid monthly.
+
+3. Notice Period
+Either party may terminate this contract with three months' notice."""
+
+
+@pytest.mark.asyncio
+async def test_search_skips_index_listing_once_verified(store, monkeypatch):
+    await store.add_document(CONTRACT_TEXT, "contract.docx")
+
+    async def fail_list_indices():
+        raise AssertionError("search must not list indices")
+
+    monkeypatch.setattr(store.table, "list_indices", fail_list_indices)
+    results = await store.search("salary", limit=2)
+
+    assert results
+    assert any("salary" in result["text"] for result in results)
+
+
+@pytest.mark.asyncio
+async def test_writes_mark_index_stale_and_refresh_catches_up(store):
+    await store.add_document(CONTRACT_TEXT, "contract.docx")
+
+    assert store._index_dirty.is_set()
+    assert store.indexed_version != await store.table.version()
+
+    await store.refresh_fts_index()
+
+    assert store.indexed_version == await store.table.version()
+    stats = await store.table.index_stats("text_idx")
+    assert stats.num_unindexed_rows == 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_catches_up_with_writes_from_another_worker(store, tmp_path):
+    other = await lancedb.connect_async(str(tmp_path / "lancedb"))
+    other_table = await other.open_table("legal_documents")
+    await store.refresh_fts_index()
+    indexed_version = store.indexed_version
+
+    await other_table.add([{
+        "vector": [0.0] * 1536, "text": "The notice period is three months.", "document_id": "d1",
+        "document_name": "contract.docx", "chunk_index": 0,
+    }])
+    await store.refresh_fts_index()
+
+    assert store.indexed_version > indexed_version
+    assert store.table_version == store.indexed_version
+    stats = await store.table.index_stats("text_idx")
+    assert stats.num_indexed_rows == 1 and stats.num_unindexed_rows == 0
+
+
+@pytest.mark.asyncio
+async def test_repeated_search_is_served_from_cache(store, monkeypatch):
+    await store.add_document(CONTRACT_TEXT, "contract.docx")
+    first = await store.search("What is John Doe's salary?", limit=2)
+
+    def fail_query():
+        raise AssertionError("cached search must not touch storage")
+
+    monkeypatch.setattr(store.table, "query", fail_query)
+    second = await store.search("What is  John Doe's salary?", limit=2)
+
+    assert [r["text"] for r in second] == [r["text"] for r in first]
+    assert store.cache_stats()["search_results"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_cached_search_results(store):
+    await store.add_document(CONTRACT_TEXT, "contract.docx")
+    await store.search("notice period", limit=5)
+    embedding_calls = store.embeddings_model.calls
+
+    await store.add_document("4. Holidays\nEmployees receive 25 days of annual leave.", "handbook.docx")
+    results = await store.search("notice period", limit=5)
+
+    assert any(r["document_name"] == "handbook.docx" for r in results)
+    # The query embedding itself is still reused
+    assert store.embeddings_model.calls == embedding_calls + 1
+
+
+@pytest.mark.asyncio
+async def test_writes_from_another_worker_invalidate_cached_search_results(store, tmp_path, monkeypatch):
+    await store.add_document(CONTRACT_TEXT, "contract.docx")
+    other = await lancedb.connect_async(str(tmp_path / "lancedb"))
+    other_table = await other.open_table("legal_documents")
+    await store.search("notice period", limit=5)
+
+    await other_table.delete("document_name = 'contract.docx'")
+    # Within the check interval the cached results are served
+    assert await store.search("notice period", limit=5)
+
+    monkeypatch.setattr(document_store_module, "TABLE_VERSION_CHECK_INTERVAL", 0)
+    assert await store.search("notice period", limit=5) == []
+    assert store.table_version == await other_table.version()
+
+
+@pytest.mark.asyncio
+async def test_vector_index_created_once_table_crosses_threshold(store, monkeypatch):
+    monkeypatch.setattr(document_store_module, "VECTOR_INDEX_MIN_ROWS", 300)
+    rows = [
+        DocumentChunk(vector=store.embeddings_model._embed(f"clause {i}"), text=f"Clause {i} text",
+                      document_id="doc", document_name="bulk.docx", chunk_index=i)
+        for i in range(299)
+    ]
+    await store.table.add(rows)
+
+    await store.ensure_vector_index()
+    assert not store.vector_index_ready
+
+    await store.add_document(CONTRACT_TEXT, "contract.docx")
+    await store.ensure_vector_index()
+
+    indexes = await store.table.list_indices()
+    assert store.vector_index_ready
+    assert any(idx.columns == ["vector"] for idx in indexes)
+    assert await store.search("salary", limit=3, nprobes=4, refine_factor=2)
+
+
+CLAUSES = [
+    Chunk("1. Parties\nThis employment contract is made between Acme Ltd and John Doe.", "1. Parties"),
+    Chunk("2. Salary\nJohn Doe's salary is 50,000 GBP per annum, paid monthly.", "2. Salary"),
+    Chunk("3. Notice Period\nEither party may terminate this contract with three months' notice.", "3. Notice Period"),
+]
+
+
+@pytest.mark.asyncio
+async def test_upsert_embeds_only_changed_chunks(store):
+    first = await store.upsert_document(CLAUSES, "contract.docx")
+    revised = [
+        CLAUSES[0],
+        Chunk("2. Salary\nJohn Doe's salary is 55,000 GBP per annum, paid monthly.", "2. Salary"),
+        Chunk("2A. Bonus\nJohn Doe is eligible for an annual bonus.", "2. Salary"),
+        CLAUSES[2],
+    ]
+
+    second = await store.upsert_document(revised, "contract.docx")
+
+    assert second["document_id"] == first["document_id"]
+    assert second["chunks_embedded"] == 2
+    assert (second["chunks_added"], second["chunks_removed"], second["chunks_unchanged"]) == (2, 1, 2)
+    rows = sorted(await store.table.query().select(["text", "chunk_index"]).to_list(), key=lambda r: r["chunk_index"])
+    assert [(row["chunk_index"], row["text"]) for row in rows] == list(enumerate(chunk.text for chunk in revised))
+
+
+@pytest.mark.asyncio
+async def test_upsert_migrates_rows_without_chunk_ids(tmp_path, store):
+    legacy_schema = DocumentChunk.to_arrow_schema()
+    legacy_schema = legacy_schema.remove(legacy_schema.get_field_index("chunk_id"))
+    store.table = await store.db.create_table("legacy_documents", schema=legacy_schema)
+    await store.table.add([
+        {"vector": store.embeddings_model._embed(chunk.text), "text": chunk.text, "document_id": "doc-1",
+         "document_name": "contract.docx", "chunk_index": i, "section": chunk.section}
+        for i, chunk in enumerate(CLAUSES)
+    ])
+
+    await store.ensure_schema()
+    result = await store.upsert_document(CLAUSES, "contract.docx")
+
+    assert result["document_id"] == "doc-1"
+    assert result["chunks_embedded"] == 0
+    assert await store.table.count_rows() == len(CLAUSES)
+    assert await store.table.count_rows("chunk_id IS NULL") == 0
+
+
+@pytest.mark.asyncio
+async def test_adding_an_existing_document_id_is_rejected(store):
+    await store.add_document(CONTRACT_TEXT, "contract.docx", document_id="contract-1")
+    rows = await store.table.count_rows()
+    embedding_calls = store.embeddings_model.calls
+
+    with pytest.raises(DocumentExists):
+        await store.add_document(CONTRACT_TEXT, "contract.docx", document_id="contract-1")
+    assert await store.table.count_rows() == rows
+    assert store.embeddings_model.calls == embedding_calls
+
+
+@pytest.mark.asyncio
+async def test_document_name_lookup_is_quoted(store):
+    await store.upsert_document(CLAUSES[:1], "O'Brien contract.docx")
+
+    assert await store.find_document_id("O'Brien contract.docx")
+    assert await store.find_document_id("x' OR '1'='1") is None
+
+
+@pytest.mark.asyncio
+async def test_catalog_tracks_adds_upserts_and_deletes(store, monkeypatch):
+    first = await store.add_chunked_document(CLAUSES, "Employment contract.docx")
+    second = await store.upsert_document(CLAUSES[:2], "NDA.docx")
+    await store.upsert_document(CLAUSES[:1], "NDA.docx")
+
+    def fail_query():
+        raise AssertionError("listing must not scan the chunks table")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(store.table, "query", fail_query)
+        listing = await store.list_documents()
+    assert listing["total"] == 2
+    assert listing["documents"] == [
+        {"document_id": first["document_id"], "document_name": "Employment contract.docx", "chunks_count": 3},
+        {"document_id": second["document_id"], "document_name": "NDA.docx", "chunks_count": 1},
+    ]
+
+    await store.delete_document(first["document_id"])
+    assert [document["document_name"] for document in await store.get_all_documents()] == ["NDA.docx"]
+
+
+@pytest.mark.asyncio
+async def test_list_documents_filters_and_paginates(store):
+    for name in ["Lease B.docx", "lease A.docx", "Employment contract.docx"]:
+        await store.add_chunked_document(CLAUSES[:1], name)
+
+    leases = await store.list_documents(name="LEASE", limit=1)
+    assert leases["total"] == 2
+    assert [document["document_name"] for document in leases["documents"]] == ["Lease B.docx"]
+    next_page = await store.list_documents(name="lease", offset=1, limit=1)
+    assert [document["document_name"] for document in next_page["documents"]] == ["lease A.docx"]
+
+
+@pytest.mark.asyncio
+async def test_catalog_is_built_from_existing_chunks(store):
+    await store.add_chunked_document(CLAUSES, "contract.docx")
+    await store.db.drop_table(document_store_module.CATALOG_TABLE_NAME)
+
+    await store.open_catalog()
+
+    assert (await store.list_documents())["documents"][0]["chunks_count"] == len(CLAUSES)
+
+
+@pytest.mark.asyncio
+async def test_batch_delete_counts_without_reading_chunks(store, monkeypatch):
+    documents = [await store.add_chunked_document(CLAUSES[:n], f"contract_{n}.docx") for n in (1, 2, 3)]
+    doomed = [documents[0]["document_id"], documents[2]["document_id"], "missing' OR '1'='1"]
+
+    def fail_query():
+        raise AssertionError("delete must not read the chunks table")
+
+    monkeypatch.setattr(store.table, "query", fail_query)
+    result = await store.delete_documents(doomed)
+    monkeypatch.undo()
+
+    assert not store.catalog_stale
+    assert result["chunks_deleted"] == 4
+    assert {d["document_id"]: d["chunks_deleted"] for d in result["documents"]}[documents[2]["document_id"]] == 3
+    assert await store.table.count_rows() == 2
+    assert [d["document_name"] for d in await store.get_all_documents()] == ["contract_2.docx"]
+    assert store.cleanup_pending
+
+    await store.refresh_fts_index()
+    assert not store.cleanup_pending
+
+
+@pytest.mark.asyncio
+async def test_delete_rejects_invalid_ids(store):
+    with pytest.raises(ValueError):
+        await store.delete_documents([])
+    with pytest.raises(ValueError):
+        await store.delete_document(" ")
+
+
+@pytest.mark.asyncio
+async def test_compaction_merges_upload_fragments_and_records_metrics(store):
+    for n in range(4):
+        await store.add_chunked_document(CLAUSES[:1], f"contract_{n}.docx")
+    await store.search("salary")
+
+    before = await store.maintenance_stats()
+    run = await store.compact_table()
+    after = await store.maintenance_stats()
+
+    assert before["fragments"] == run["fragments_before"] >= 4
+    assert after["fragments"] == run["fragments_after"] == 1
+    assert run["searches_before"] == 1 and run["search_latency_before_ms"] is not None
+    assert after["searches_since_compaction"] == 0
+    assert after["compactions"] == [run]
+    assert await store.table.count_rows() == 4
+
+
+@pytest.mark.asyncio
+async def test_maintenance_compacts_periodically_without_writes(store, monkeypatch):
+    await store.add_chunked_document(CLAUSES, "contract.docx")
+    await store.maintain_indices()
+    assert len(store.maintenance_history) == 1
+
+    await store.maintain_indices()
+    assert len(store.maintenance_history) == 1
+
+    monkeypatch.setattr(document_store_module, "TABLE_COMPACTION_INTERVAL", 0)
+    await store.maintain_indices()
+    assert len(store.maintenance_history) == 2
+
+
+@pytest.mark.asyncio
+async def test_maintenance_covers_writes_from_another_worker(store, tmp_path):
+    other = await lancedb.connect_async(str(tmp_path / "lancedb"))
+    other_table = await other.open_table("legal_documents")
+    await store.maintain_indices()
+    for n in range(3):
+        await other_table.add([{
+            "vector": [0.0] * 1536, "text": f"Clause {n}", "document_id": f"d{n}",
+            "document_name": f"contract_{n}.docx", "chunk_index": 0,
+        }])
+    await store.maintain_indices()
+
+    # Compacted by this worker although it wrote nothing
+    run = store.maintenance_history[-1]
+    assert run["fragments_before"] >= 3 and run["fragments_after"] == 1
+    assert (await store.maintenance_stats())["rows"] == 3
+
+
+@pytest.mark.asyncio
+async def test_search_prefilters_on_metadata(store):
+    employment = await store.add_chunked_document(CLAUSES, "employment.docx", domain="Employment")
+    await store.add_chunked_document(CLAUSES, "shareholders.docx", domain="equity")
+    await store.add_chunked_document(CLAUSES[:1], "legacy.docx")
+
+    async def names(search_filter):
+        results = await store.search("salary notice contract", limit=10, search_filter=search_filter)
+        return {(result["document_name"], result["section"]) for result in results}
+
+    assert {name for name, _ in await names(SearchFilter(domains=["employment"]))} == {"employment.docx"}
+    assert {name for name, _ in await names(SearchFilter(domains=["employment"], include_untagged=True))} == {
+        "employment.docx", "legacy.docx"
+    }
+    assert await names(SearchFilter(document_ids=[employment["document_id"]], sections=["2. Salary"])) == {
+        ("employment.docx", "2. Salary")
+    }
+    assert await names(SearchFilter(document_names=["x' OR '1'='1"])) == set()
+
+
+def test_section_filter_matches_subsections():
+    where = SearchFilter(sections=["9. Holiday"]).where()
+
+    assert where == "(section = '9. Holiday' OR starts_with(section, '9. Holiday > '))"
+    assert SearchFilter().where() is None
+
+
+@pytest.mark.asyncio
+async def test_scalar_indexes_serve_prefilters(store):
+    await store.add_chunked_document(CLAUSES, "employment.docx", domain="employment")
+
+    await store.ensure_scalar_indices()
+
+    indexes = {index.columns[0]: index.index_type for index in await store.table.list_indices()}
+    assert indexes["domain"] == "Bitmap"
+    assert indexes["document_id"] == indexes["section"] == "BTree"
+    plan = await store.table.query().where(SearchFilter(domains=["employment"]).where()).explain_plan()
+    assert "ScalarIndexQuery" in plan
+
+
+@pytest.mark.asyncio
+async def test_search_many_embeds_queries_in_one_call(store, monkeypatch):
+    await store.add_document(CONTRACT_TEXT, "contract.docx")
+    store.embeddings_model.calls = 0
+    running = 0
+    max_running = 0
+    search = store.search
+
+    async def tracking_search(*args, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        try:
+            return await search(*args, **kwargs)
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(store, "search", tracking_search)
+    queries = ["salary", "notice period", "parties", "salary ", "holiday", "termination"]
+
+    results = await store.search_many(queries, limit=2, concurrency=2)
+
+    assert store.embeddings_model.calls == 1
+    assert len(results) == len(queries)
+    assert [result["text"] for result in results[0]] == [result["text"] for result in results[3]]
+    assert results[0] == await search("salary", limit=2)
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_close_stops_maintenance_woken_by_a_write(store):
+    store._start_index_maintenance()
+    await asyncio.sleep(0)
+
+    # The cancellation lands in the same loop iteration as the wake-up
+    store._index_dirty.set()
+    closing = asyncio.ensure_future(store.close())
+    done, _ = await asyncio.wait({closing}, timeout=1)
+
+    assert closing in done
+
+
+@pytest.mark.asyncio
+async def test_concurrent_query_embeddings_share_one_request(store, monkeypatch):
+    calls = []
+    embed_query = store.embedding_service.embed_query
+
+    async def slow_embed_query(query):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return await embed_query(query)
+
+    monkeypatch.setattr(store.embedding_service, "embed_query", slow_embed_query)
+    # e.g. the routing cache lookup and a prefetched search for the same query
+    first, second = await asyncio.gather(store.embed_query("notice period"), store.embed_query(" notice  period"))
+
+    assert first == second
+    assert calls == ["notice period"]
+    assert await store.embed_query("notice period") == first and len(calls) == 1
@@ -0,0 +1,69 @@
+import io
+import os
+import sys
+import pytest
+from docx import Document
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.rag.chunking import TextBlock, split_segments, split_text
+from src.agents.rag.docx_extraction import (
+    chunk_docx_bytes, extract_docx_chunks, iter_docx_blocks, iter_docx_text, shutdown_extraction_pool
+)
+
+CLAUSE = "The Employee shall be entitled to {} days of paid holiday in each holiday year, in addition to bank holidays."
+
+
+def contract_docx(clauses: int = 3) -> bytes:
+    document = Document()
+    document.add_paragraph("1. Holiday")
+    table = document.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Salary"
+    table.cell(0, 1).text = "50,000 GBP"
+    document.add_paragraph("")
+    for i in range(clauses):
+        document.add_paragraph(CLAUSE.format(i))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def test_iter_docx_text_keeps_document_order():
+    segments = list(iter_docx_text(io.BytesIO(contract_docx(clauses=1))))
+
+    assert segments == ["1. Holiday", "Salary | 50,000 GBP", CLAUSE.format(0)]
+
+
+def test_iter_docx_blocks_renders_automatic_numbering_and_headings():
+    document = Document()
+    document.add_paragraph("Employment Contract", style="Title")
+    document.add_paragraph("Holiday", style="List Number")
+    document.add_paragraph(CLAUSE.format(25))
+    document.add_paragraph("Notice", style="List Number")
+    buffer = io.BytesIO()
+    document.save(buffer)
+
+    blocks = list(iter_docx_blocks(io.BytesIO(buffer.getvalue())))
+
+    assert blocks[0] == TextBlock("Employment Contract", 0)
+    assert [block.text for block in blocks[1:]] == ["1. Holiday", CLAUSE.format(25), "2. Notice"]
+
+
+def test_split_segments_matches_splitting_whole_text():
+    segments = [CLAUSE.format(i) for i in range(200)]
+
+    assert list(split_segments(segments, window=2000)) == split_text("\n".join(segments))
+
+
+@pytest.mark.asyncio
+async def test_extract_docx_chunks_in_process_pool():
+    content = contract_docx(clauses=50)
+    try:
+        chunks = await extract_docx_chunks(content)
+    finally:
+        shutdown_extraction_pool()
+
+    assert chunks == chunk_docx_bytes(content)
+    assert chunks[0].text.startswith("1. Holiday\nSalary | 50,000 GBP")
+    assert chunks[0].section == "1. Holiday"
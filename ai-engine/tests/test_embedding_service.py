@@ -0,0 +1,123 @@
+import os
+import sys
+import asyncio
+import httpx
+import openai
+import pytest
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.rag import embedding_service
+from src.agents.rag.embedding_service import EmbeddingService, plan_batches, retry_delay
+from src.agents.rag.embedding_cache import EmbeddingCache
+
+
+class RecordingEmbeddings:
+    """Async embeddings stub that records batches and tracks concurrency."""
+
+    def __init__(self, failures: int = 0):
+        self.batches = []
+        self.failures = failures
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aembed_documents(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures:
+                self.failures -= 1
+                raise rate_limit_error(retry_after="0")
+            self.batches.append(list(texts))
+            return [[float(len(text))] for text in texts]
+        finally:
+            self.in_flight -= 1
+
+    async def aembed_query(self, text):
+        return [float(len(text))]
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    request = httpx.Request("POST", "https://example.openai.azure.com/embeddings")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Too Many Requests", response=response, body=None)
+
+
+def test_plan_batches_respects_token_and_size_limits():
+    texts = [f"clause {i} " * 20 for i in range(10)]
+
+    batches = plan_batches(texts, max_tokens=100, max_size=3)
+
+    assert [text for batch in batches for text in batch] == texts
+    assert all(len(batch) <= 3 for batch in batches)
+    assert len(batches) > 1
+
+
+def test_retry_delay_honours_retry_after():
+    assert retry_delay(rate_limit_error(retry_after="7"), attempt=0, base=1, cap=30) == 7
+    assert 0 <= retry_delay(rate_limit_error(), attempt=3, base=1, cap=2) <= 2
+
+
+@pytest.mark.asyncio
+async def test_embed_documents_preserves_order_and_bounds_concurrency():
+    model = RecordingEmbeddings()
+    service = EmbeddingService(model, batch_tokens=10_000, batch_size=2, concurrency=2)
+    texts = [f"chunk {i}" * (i + 1) for i in range(9)]
+
+    vectors = await service.embed_documents(texts)
+
+    assert vectors == [[float(len(text))] for text in texts]
+    assert len(model.batches) == 5
+    assert model.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_embed_documents_retries_rate_limits(monkeypatch):
+    monkeypatch.setattr(embedding_service, "EMBEDDING_BACKOFF_BASE", 0)
+    model = RecordingEmbeddings(failures=2)
+    service = EmbeddingService(model, max_retries=3)
+
+    vectors = await service.embed_documents(["a", "bb"])
+
+    assert vectors == [[1.0], [2.0]]
+
+
+@pytest.mark.asyncio
+async def test_embed_documents_gives_up_after_max_retries():
+    model = RecordingEmbeddings(failures=5)
+    service = EmbeddingService(model, max_retries=1)
+
+    with pytest.raises(openai.RateLimitError):
+        await service.embed_documents(["a"])
+
+
+@pytest.mark.asyncio
+async def test_cache_skips_previously_embedded_chunks(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), "text-embedding-ada-002")
+    model = RecordingEmbeddings()
+    service = EmbeddingService(model, cache=cache)
+
+    await service.embed_documents(["Clause one.", "Clause two."])
+    vectors = await service.embed_documents(["Clause  one.", "Clause three.", "Clause three."])
+
+    assert model.batches == [["Clause one.", "Clause two."], ["Clause three."]]
+    assert vectors == [[11.0], [13.0], [13.0]]
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_keys_depend_on_model_and_evict_least_recently_used(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, "ada-002", max_entries=2)
+
+    assert cache.key_for("text") != EmbeddingCache(path, "other-model").key_for("text")
+
+    first, second, third = (cache.key_for(text) for text in ("a", "b", "c"))
+    cache.put_many([(first, [1.0]), (second, [2.0])])
+    cache.get_many([first])
+    cache.put_many([(third, [3.0])])
+
+    assert set(cache.get_many([first, second, third])) == {first, third}
+    assert cache.stats()["size"] == 2
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import types
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pytest
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.rag.fusion import fuse_results, get_reranker
+from src.agents.rag.chunking import Chunk
+
+fusion_module = importlib.import_module("src.agents.rag.fusion")
+document_store_module = importlib.import_module("src.agents.rag.document_store")
+
+
+def leg(texts, scores, column):
+    return pa.table({
+        "text": texts,
+        "_rowid": pa.array([int(text[1:]) for text in texts], pa.uint64()),
+        column: pa.array(scores, pa.float32()),
+    })
+
+
+# d1 is the closest vector, d3 the best keyword match; d2 is found by both legs
+VECTOR_RESULTS = leg(["d1", "d2", "d4"], [0.1, 0.2, 0.9], "_distance")
+FTS_RESULTS = leg(["d3", "d2"], [9.0, 5.0], "_score")
+
+
+@pytest.fixture
+def alpha(monkeypatch):
+    def set_alpha(value):
+        monkeypatch.setattr(fusion_module, "SEARCH_FUSION_ALPHA", value)
+        monkeypatch.setattr(fusion_module, "_rerankers", {})
+    return set_alpha
+
+
+class FakeCrossEncoder:
+    """sentence_transformers.CrossEncoder stand-in: slow to load, scores passages by their number."""
+
+    loads = 0
+
+    def __init__(self, model_name, **kwargs):
+        FakeCrossEncoder.loads += 1
+        time.sleep(0.05)
+
+    def predict(self, pairs, batch_size=32):
+        return [float(passage[1:]) for _, passage in pairs]
+
+
+@pytest.fixture
+def cross_encoder(monkeypatch):
+    FakeCrossEncoder.loads = 0
+    torch = types.SimpleNamespace(cuda=types.SimpleNamespace(is_available=lambda: False))
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(CrossEncoder=FakeCrossEncoder))
+    monkeypatch.setattr(fusion_module, "_rerankers", {})
+    return FakeCrossEncoder
+
+
+def ranked(strategy, limit=4):
+    return fuse_results("salary", VECTOR_RESULTS, FTS_RESULTS, strategy, limit)["text"].to_pylist()
+
+
+def test_rrf_promotes_candidates_found_by_both_legs():
+    assert ranked("rrf")[0] == "d2"
+    assert ranked("rrf", limit=2) == ranked("rrf")[:2]
+
+
+def test_linear_fusion_alpha_weights_vector_against_text(alpha):
+    alpha(1.0)
+    assert ranked("linear")[0] == "d1"
+
+    alpha(0.0)
+    assert ranked("linear")[0] == "d3"
+
+
+def test_fused_results_keep_only_relevance_score():
+    results = fuse_results("salary", VECTOR_RESULTS, FTS_RESULTS, "rrf", 4)
+
+    assert results.column_names == ["text", "_relevance_score"]
+    empty = fuse_results("salary", VECTOR_RESULTS.slice(0, 0), FTS_RESULTS.slice(0, 0), "rrf", 4)
+    assert empty.num_rows == 0 and empty.column_names == ["text", "_relevance_score"]
+
+
+def test_cross_encoder_is_loaded_once_by_concurrent_searches(cross_encoder):
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        rankings = list(pool.map(lambda _: ranked("cross_encoder"), range(4)))
+
+    assert cross_encoder.loads == 1
+    # Candidates from both legs, ordered by the cross-encoder's scores alone
+    assert rankings == [["d4", "d3", "d2", "d1"]] * 4
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        get_reranker("bm42")
+
+
+@pytest.mark.asyncio
+async def test_each_leg_over_fetches_its_own_candidates(store, monkeypatch):
+    await store.add_chunked_document([Chunk(f"Clause {i}: the notice period is {i} weeks.") for i in range(12)], "contract.docx")
+    legs = []
+    fuse = document_store_module.fuse_results
+
+    def recording_fuse(query, vector_results, fts_results, strategy, limit):
+        legs.append((vector_results.num_rows, fts_results.num_rows, strategy))
+        return fuse(query, vector_results, fts_results, strategy, limit)
+
+    monkeypatch.setattr(document_store_module, "fuse_results", recording_fuse)
+    monkeypatch.setattr(document_store_module, "SEARCH_VECTOR_CANDIDATES", 8)
+    monkeypatch.setattr(document_store_module, "SEARCH_FTS_CANDIDATES", 3)
+
+    results = await store.search("notice period", limit=2, fusion="linear")
+
+    assert len(results) == 2
+    assert legs == [(8, 3, "linear")]
@@ -0,0 +1,170 @@
+import io
+import os
+import sys
+import asyncio
+import zipfile
+import importlib
+import pytest
+from docx import Document
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.rag.ingestion import IngestionQueue, SqliteJobStore, UploadBudget, UploadRejected, expand_upload
+
+docx_extraction_module = importlib.import_module("src.agents.rag.docx_extraction")
+ingestion_module = importlib.import_module("src.agents.rag.ingestion")
+
+
+@pytest.fixture(autouse=True)
+def extract_in_thread(monkeypatch):
+    """Queue behaviour does not depend on the extraction process pool, so skip spawning it."""
+    monkeypatch.setattr(docx_extraction_module, "DOCX_EXTRACTION_WORKERS", 0)
+
+
+@pytest.fixture(autouse=True)
+def jobs_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "ingestion_jobs.sqlite3")
+    monkeypatch.setattr(ingestion_module, "INGESTION_JOBS_PATH", path)
+    return path
+
+
+def docx_bytes(*paragraphs: str) -> bytes:
+    document = Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def zip_bytes(members) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_expand_upload_unpacks_docx_members_of_zip():
+    contract = docx_bytes("Salary: 50,000 GBP")
+    archive = zip_bytes({
+        "contracts/a.docx": contract,
+        "contracts/b.docx": contract,
+        "__MACOSX/contracts/._a.docx": b"resource fork",
+        "contracts/notes.txt": b"not a contract",
+    })
+
+    assert [name for name, _ in expand_upload("contracts.zip", archive)] == ["a.docx", "b.docx"]
+
+
+def test_expand_upload_rejects_oversized_and_unsupported_files():
+    with pytest.raises(UploadRejected):
+        expand_upload("big.docx", b"x" * 11, max_file_size=10)
+    with pytest.raises(UploadRejected):
+        expand_upload("archive.zip", zip_bytes({"big.docx": b"x" * 11}), max_file_size=10)
+    with pytest.raises(UploadRejected):
+        expand_upload("contract.pdf", b"%PDF")
+
+
+def test_one_budget_limits_documents_and_bytes_across_files():
+    contract = docx_bytes("Salary: 50,000 GBP")
+    budget = UploadBudget(max_files=3, max_bytes=10 * len(contract))
+
+    expand_upload("a.docx", contract, budget=budget)
+    expand_upload("contracts.zip", zip_bytes({"b.docx": contract, "c.docx": contract}), budget=budget)
+    with pytest.raises(UploadRejected, match="At most 3 documents"):
+        expand_upload("d.docx", contract, budget=budget)
+
+    budget = UploadBudget(max_files=10, max_bytes=len(contract) + 10)
+    with pytest.raises(UploadRejected, match="bytes per job"):
+        expand_upload("contracts.zip", zip_bytes({"a.docx": contract, "b.docx": contract}), budget=budget)
+
+
+@pytest.mark.asyncio
+async def test_job_coalesces_documents_into_batched_writes(store, monkeypatch):
+    batch_sizes = []
+    add_chunks = store.add_chunks
+
+    async def recording_add_chunks(chunks):
+        batch_sizes.append(len(chunks))
+        await add_chunks(chunks)
+
+    monkeypatch.setattr(store, "add_chunks", recording_add_chunks)
+    queue = IngestionQueue(store, workers=4, batch_rows=10_000, flush_interval=0.05)
+    files = [(f"contract_{i}.docx", docx_bytes(f"Employee {i} salary is {i},000 GBP.")) for i in range(6)]
+
+    job = await queue.submit(files)
+    await queue.join()
+    await queue.close()
+
+    summary = job.to_dict()
+    assert summary["status"] == "completed"
+    assert summary["completed"] == 6
+    assert sum(batch_sizes) == summary["chunks_added"] == await store.table.count_rows()
+    assert len(batch_sizes) < len(files)
+
+
+@pytest.mark.asyncio
+async def test_failed_document_does_not_fail_job(store):
+    queue = IngestionQueue(store, workers=2, flush_interval=0.01)
+
+    job = await queue.submit([("good.docx", docx_bytes("Notice period is three months.")), ("broken.docx", b"not a docx")])
+    await queue.join()
+    await queue.close()
+
+    summary = job.to_dict()
+    assert summary["status"] == "completed_with_errors"
+    assert [document["status"] for document in summary["documents"]] == ["completed", "failed"]
+    assert await queue.get_job(job.job_id) == summary
+
+
+@pytest.mark.asyncio
+async def test_documents_left_at_shutdown_are_marked_failed(store, monkeypatch):
+    queue = IngestionQueue(store, workers=1, flush_interval=60)
+    job = await queue.submit([(f"contract_{i}.docx", docx_bytes(f"Employee {i} salary.")) for i in range(3)])
+    while job.documents[0]["status"] != "running":
+        await asyncio.sleep(0.01)
+
+    await queue.close()
+
+    summary = job.to_dict()
+    assert summary["status"] == "failed" and job.finished_at is not None
+    assert [document["status"] for document in summary["documents"]] == ["failed"] * 3
+    # The interrupted document's chunks were not written at shutdown either
+    assert await store.table.count_rows() == 0
+
+
+@pytest.mark.asyncio
+async def test_any_worker_reports_a_job(store, jobs_path):
+    queue, other_worker = IngestionQueue(store, workers=1, flush_interval=60), IngestionQueue(store)
+    job = await queue.submit([(f"contract_{i}.docx", docx_bytes(f"Employee {i} salary.")) for i in range(2)])
+
+    async def reported_status():
+        return (await other_worker.get_job(job.job_id))["documents"][0]["status"]
+
+    assert (await other_worker.get_job(job.job_id))["status"] == "queued"
+    for _ in range(200):
+        if await reported_status() == "running":
+            break
+        await asyncio.sleep(0.01)
+    assert await reported_status() == "running"
+
+    await queue.close()
+    assert await other_worker.get_job(job.job_id) == job.to_dict()
+    assert await other_worker.get_job("unknown") is None
+    await other_worker.close()
+
+
+def test_job_store_keeps_newest_revision_and_recent_jobs(tmp_path):
+    jobs = SqliteJobStore(str(tmp_path / "jobs.sqlite3"), max_jobs=2)
+
+    jobs.save("a", 2, "running", None)
+    jobs.save("a", 1, "queued", None)
+    assert jobs.get("a") == "running"
+
+    for n, job_id in enumerate("bcd"):
+        jobs.save(job_id, 1, "completed", finished_at=float(n))
+    # The unfinished job is kept; of the finished ones, only the newest max_jobs
+    assert [jobs.get(job_id) for job_id in "abcd"] == ["running", None, "completed", "completed"]
+    jobs.close()
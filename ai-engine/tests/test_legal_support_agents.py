@@ -0,0 +1,233 @@
+import os
+import sys
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.crews.legal_support_agents.legal_support_agents import LegalSupportAgents, AgentName
+from src.agents.crews.legal_support_agents.router import RoutingCache
+from src.agents.crews.legal_support_agents.runtime import AgentRuntime
+from src.agents.rag.tokenizer import count_tokens
+
+
+class FakeStream:
+    """Async iterator over chat completion chunks, like openai.AsyncStream."""
+
+    def __init__(self, pieces):
+        self.chunks = [SimpleNamespace(choices=[])]  # Azure content-filter preamble
+        self.chunks += [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+            for piece in pieces
+        ]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.fixture
+def agents(azure_env):
+    """LegalSupportAgents on a private runtime with every LLM call stubbed."""
+    crew = LegalSupportAgents(runtime=AgentRuntime())
+    crew.route_query = AsyncMock(return_value=AgentName.COMPLIANCE)
+    crew.runtime.stream_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock()))
+    )
+    return crew
+
+
+@pytest.mark.asyncio
+async def test_stream_query_emits_route_then_tokens(agents):
+    agents.runtime.stream_client.chat.completions.create.return_value = FakeStream(["GDPR ", "applies."])
+
+    events = [event async for event in agents.stream_query("What GDPR obligations do we have?")]
+
+    assert events == [
+        {"event": "route", "data": {"agent": "Compliance Specialist"}},
+        {"event": "token", "data": {"content": "GDPR "}},
+        {"event": "token", "data": {"content": "applies."}},
+        {"event": "done", "data": {}},
+    ]
+    kwargs = agents.runtime.stream_client.chat.completions.create.call_args.kwargs
+    assert kwargs["stream"] is True
+    assert "What GDPR obligations do we have?" in kwargs["messages"][-1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_stream_query_reports_errors_as_events(agents):
+    agents.runtime.stream_client.chat.completions.create.side_effect = RuntimeError("boom")
+
+    events = [event async for event in agents.stream_query("What GDPR obligations do we have?")]
+
+    assert events[0]["event"] == "route"
+    assert events[-1]["event"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_context_prefetch_errors_are_reported_like_other_errors(agents, monkeypatch):
+    monkeypatch.setattr(agents, "prefetch_context", lambda query: {}["unknown placeholder"])
+
+    assert await agents.process_query("What GDPR obligations do we have?") == "An error occurred while processing your query."
+    events = [event async for event in agents.stream_query("What GDPR obligations do we have?")]
+    assert events == [{"event": "error", "data": {"message": "An error occurred while processing your query."}}]
+
+
+@pytest.mark.asyncio
+async def test_retrieval_overlaps_routing_for_employment_queries(agents):
+    routing_done = asyncio.Event()
+    retrieval_started_before_routing_done = []
+
+    async def slow_route(query):
+        await asyncio.sleep(0.05)
+        routing_done.set()
+        return AgentName.EMPLOYMENT
+
+    async def context(query, search_filter=None, token_budget=None):
+        retrieval_started_before_routing_done.append(not routing_done.is_set())
+        return "Document 1: contract.docx"
+
+    agents.route_query = slow_route
+    agents.get_relevant_context = context
+    agents.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=AsyncMock(return_value=SimpleNamespace(content="50,000 GBP"))
+    )))
+
+    result = await agents.process_query("How much is John Doe's salary?")
+
+    assert result == "**[Employment Expert]** 50,000 GBP"
+    assert retrieval_started_before_routing_done == [True]
+    prompt = agents.client.chat.completions.create.call_args.kwargs["messages"][-1]["content"]
+    assert "Document 1: contract.docx" in prompt
+
+
+@pytest.mark.asyncio
+async def test_speculative_retrieval_is_cancelled_for_agents_without_context(agents):
+    retrieval_cancelled = asyncio.Event()
+
+    async def never_finishing_context(query, search_filter=None, token_budget=None):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            retrieval_cancelled.set()
+            raise
+
+    async def slow_route(query):
+        await asyncio.sleep(0.01)
+        return AgentName.COMPLIANCE
+
+    agents.route_query = slow_route
+    agents.get_relevant_context = never_finishing_context
+    agents._handle_compliance_query = AsyncMock(return_value="COMPLIANCE_HANDLER_OK")
+
+    result = await agents.process_query("What GDPR obligations does our company have?")
+    await asyncio.sleep(0)
+
+    assert result == "COMPLIANCE_HANDLER_OK"
+    assert retrieval_cancelled.is_set()
+
+
+def test_agent_searches_are_narrowed_to_their_domains(agents):
+    search_filter = agents.search_filter(AgentName.EMPLOYMENT)
+
+    assert search_filter.where() == "(domain IN ('employment') OR domain IS NULL)"
+    assert agents.context_keys(AgentName.EMPLOYMENT) == {("relevant_context", search_filter, 1500)}
+    assert agents.context_keys(AgentName.COMPLIANCE) == set()
+
+
+def test_context_dependencies_come_from_prompt_templates(agents):
+    assert agents.context_dependencies(AgentName.EMPLOYMENT) == {"relevant_context"}
+    assert agents.context_dependencies(AgentName.COMPLIANCE) == set()
+
+
+@pytest.mark.asyncio
+async def test_confident_local_route_skips_llm(azure_env):
+    crew = LegalSupportAgents(runtime=AgentRuntime())
+    crew.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock())))
+
+    assert await crew.route_query("Who are the current shareholders of the company?") == AgentName.EQUITY
+    assert await crew.route_query("Can the platform help me with onboarding?") == AgentName.COMPLIANCE
+    crew.client.chat.completions.create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ambiguous_query_falls_back_to_llm_router(azure_env):
+    crew = LegalSupportAgents(runtime=AgentRuntime())
+    decision = SimpleNamespace(agent_name=AgentName.EMPLOYMENT)
+    crew.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=decision))))
+
+    assert await crew.route_query("Tell me something interesting") == AgentName.EMPLOYMENT
+    crew.client.chat.completions.create.assert_awaited_once()
+    assert crew.runtime.configs.local_router.stats()["llm_fallbacks"] == 1
+
+
+def llm_router_returning(crew, agent_name):
+    """Replace the crew's instructor client with one whose routing call returns agent_name."""
+    decision = SimpleNamespace(agent_name=agent_name)
+    crew.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=decision))))
+    return crew.client.chat.completions.create
+
+
+@pytest.mark.asyncio
+async def test_routing_cache_serves_repeated_queries(azure_env):
+    crew = LegalSupportAgents(runtime=AgentRuntime())
+    llm_call = llm_router_returning(crew, AgentName.EMPLOYMENT)
+
+    assert await crew.route_query("Tell me something interesting") == AgentName.EMPLOYMENT
+    assert await crew.route_query("  tell me something   INTERESTING ") == AgentName.EMPLOYMENT
+    llm_call.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_routing_cache_matches_similar_embeddings(azure_env, monkeypatch):
+    crew = LegalSupportAgents(runtime=AgentRuntime())
+    llm_call = llm_router_returning(crew, AgentName.EQUITY)
+    embeddings = {"Tell me something interesting": [1.0, 0.0, 0.0], "Tell me anything interesting": [0.99, 0.05, 0.0],
+                  "Something unrelated": [0.0, 1.0, 0.0]}
+    monkeypatch.setattr(crew, "routing_embedding", AsyncMock(side_effect=lambda q: embeddings[q]))
+
+    await crew.route_query("Tell me something interesting")
+    assert await crew.route_query("Tell me anything interesting") == AgentName.EQUITY
+    assert llm_call.await_count == 1
+
+    await crew.route_query("Something unrelated")
+    assert llm_call.await_count == 2
+    assert crew.runtime.routing_cache.stats()["semantic_hits"] == 1
+
+
+def test_routing_cache_reuses_its_embedding_matrix():
+    cache = RoutingCache(similarity=0.9)
+    cache.set("Tell me something interesting", AgentName.EQUITY.value, [1.0, 0.0])
+    cache.set("Tell me anything interesting", AgentName.EMPLOYMENT.value, [0.95, 0.1])
+
+    assert cache.get_similar([1.0, 0.0]) == AgentName.EQUITY.value
+    matrix = cache._matrix
+    assert cache.get_similar([0.0, 1.0]) is None
+    assert cache._matrix is matrix
+
+    # An entry that left the cache is not matched, and the next best one is
+    cache.decisions.pop("tell me something interesting")
+    assert cache.get_similar([1.0, 0.0]) == AgentName.EMPLOYMENT.value
+
+
+@pytest.mark.asyncio
+async def test_relevant_context_is_fitted_to_the_agent_budget(agents):
+    clause = "The employee must give four weeks notice. " * 40
+    agents.rag_initialized = True
+    agents.search_documents = AsyncMock(return_value=[
+        {"document_id": f"doc-{i}", "document_name": f"contract-{i}.docx", "chunk_index": 0, "text": f"{i}. {clause}"}
+        for i in range(10)
+    ])
+    budget = agents.context_token_budget(AgentName.EMPLOYMENT)
+
+    context = await agents.get_relevant_context("notice period", token_budget=budget)
+
+    assert count_tokens(context) <= budget
+    assert "Document 1: contract-0.docx" in context
+    assert "contract-9.docx" not in context
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import pytest
+import pytest_asyncio
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from openai import AsyncAzureOpenAI
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.crews.legal_support_agents.gateway import LLMGateway, Priority, PriorityLimiter, TokenBucket
+from src.agents.crews.legal_support_agents.legal_support_agents import LegalSupportAgents, AgentName
+from src.agents.crews.legal_support_agents.runtime import AgentRuntime
+
+
+class MockOpenAI:
+    """Local Azure OpenAI-compatible chat completions server that can add latency and answer 429."""
+
+    def __init__(self):
+        self.requests = []
+        self.latency = 0.0
+        self.rate_limits = 0
+        self.retry_after = "0.2"
+        self.active = 0
+        self.max_active = 0
+        self.url = None
+        self.app = FastAPI()
+        self.app.post("/openai/deployments/{deployment}/chat/completions")(self.completions)
+
+    async def completions(self, deployment: str, request: Request):
+        body = await request.json()
+        self.requests.append(body)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.rate_limits:
+                self.rate_limits -= 1
+                return JSONResponse(
+                    {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                    status_code=429,
+                    headers={"retry-after": self.retry_after},
+                )
+            return JSONResponse(completion(deployment, body))
+        finally:
+            self.active -= 1
+
+
+def completion(deployment: str, body: dict) -> dict:
+    if body.get("tools"):
+        # instructor's tool-calling mode: answer with the requested function's arguments
+        message = {"role": "assistant", "content": None, "tool_calls": [{
+            "id": "call_1",
+            "type": "function",
+            "function": {
+                "name": body["tools"][0]["function"]["name"],
+                "arguments": json.dumps({"agent_name": "Employment Expert"}),
+            },
+        }]}
+    else:
+        message = {"role": "assistant", "content": f"echo: {body['messages'][-1]['content']}"}
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+@pytest_asyncio.fixture
+async def mock_openai():
+    mock = MockOpenAI()
+    server = uvicorn.Server(uvicorn.Config(mock.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    mock.url = f"http://127.0.0.1:{port}"
+    yield mock
+    server.should_exit = True
+    await task
+
+
+@pytest_asyncio.fixture
+async def client(mock_openai):
+    client = AsyncAzureOpenAI(api_key="test-key", api_version="2024-02-01", azure_endpoint=mock_openai.url, max_retries=0)
+    yield client
+    await client.close()
+
+
+def ask(gateway, client, content, priority=Priority.ANSWER):
+    return gateway.call(client.chat.completions.create, priority, model="gpt-4",
+                        messages=[{"role": "user", "content": content}])
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_calls_wait_for_retry_after(mock_openai, client):
+    mock_openai.rate_limits = 2
+    gateway = LLMGateway(backoff_base=0.01)
+
+    start = time.monotonic()
+    response = await ask(gateway, client, "What is the notice period?")
+
+    assert response.choices[0].message.content == "echo: What is the notice period?"
+    assert time.monotonic() - start >= 0.4
+    assert len(mock_openai.requests) == 3
+    assert gateway.stats()["retries"] == 2 and gateway.stats()["rate_limited"] == 2
+
+
+@pytest.mark.asyncio
+async def test_retries_are_bounded(mock_openai, client):
+    mock_openai.rate_limits = 10
+    mock_openai.retry_after = "0"
+    gateway = LLMGateway(max_retries=2, backoff_base=0.01)
+
+    with pytest.raises(Exception, match="429"):
+        await ask(gateway, client, "What is the notice period?")
+    assert len(mock_openai.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_capped(mock_openai, client):
+    mock_openai.latency = 0.05
+    gateway = LLMGateway(max_concurrency=2)
+
+    responses = await asyncio.gather(*(ask(gateway, client, f"Question {i}") for i in range(8)))
+
+    assert len(responses) == len(mock_openai.requests) == 8
+    assert mock_openai.max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_identical_in_flight_calls_share_one_request(mock_openai, client):
+    mock_openai.latency = 0.1
+    gateway = LLMGateway()
+
+    responses = await asyncio.gather(*(ask(gateway, client, "Who are the directors?") for _ in range(5)))
+
+    assert len(mock_openai.requests) == 1
+    assert {response.choices[0].message.content for response in responses} == {"echo: Who are the directors?"}
+    assert gateway.stats()["coalesced"] == 4
+    # Later calls are sent again
+    await ask(gateway, client, "Who are the directors?")
+    assert len(mock_openai.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_routing_calls_get_free_slots_first():
+    limiter = PriorityLimiter(1)
+    order = []
+
+    async def run(name, priority):
+        await limiter.acquire(priority)
+        order.append(name)
+        limiter.release()
+
+    await limiter.acquire(Priority.ANSWER)
+    waiting = [asyncio.create_task(run("answer", Priority.ANSWER)), asyncio.create_task(run("routing", Priority.ROUTING))]
+    await asyncio.sleep(0)
+    limiter.release()
+    await asyncio.gather(*waiting)
+
+    assert order == ["routing", "answer"]
+    assert limiter.active == 0
+
+
+def test_token_bucket_makes_callers_wait_for_quota():
+    bucket = TokenBucket(per_minute=60)
+
+    assert bucket.reserve(60) == 0
+    assert bucket.reserve(30) == pytest.approx(30, abs=0.1)
+
+
+def test_quota_is_split_between_workers():
+    gateway = LLMGateway(requests_per_minute=600, tokens_per_minute=80000, workers=4)
+
+    assert gateway.requests.capacity == 150
+    assert gateway.tokens.capacity == 20000
+
+
+@pytest.mark.asyncio
+async def test_calls_waiting_for_quota_or_retry_after_hold_no_slot():
+    gateway = LLMGateway(max_concurrency=1, tokens_per_minute=600)
+    gateway.tokens.reserve(600)
+    entered = []
+
+    async def run(name, priority, tokens):
+        async with gateway.slot(priority, tokens):
+            entered.append(name)
+
+    waiting_for_quota = asyncio.create_task(run("answer", Priority.ANSWER, 100))
+    await asyncio.sleep(0.05)
+    assert gateway.limiter.active == 0
+
+    gateway.tokens = None
+    gateway.paused_until = time.monotonic() + 0.1
+    paused = asyncio.create_task(run("routing", Priority.ROUTING, 10))
+    await asyncio.sleep(0.05)
+    assert gateway.limiter.active == 0 and entered == []
+
+    await paused
+    assert entered == ["routing"]
+    waiting_for_quota.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting_for_quota
+    assert gateway.limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_instructor_routing_call_is_retried_by_the_gateway_only(mock_openai, monkeypatch, azure_env):
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", mock_openai.url)
+    runtime = AgentRuntime()
+    runtime.configs.local_router = None
+    runtime.gateway = LLMGateway(backoff_base=0.01)
+    mock_openai.rate_limits = 1
+    mock_openai.retry_after = "0"
+    try:
+        agent_name = await LegalSupportAgents(runtime=runtime).route_query("How much is John Doe's salary?")
+    finally:
+        await runtime.aclose()
+
+    assert agent_name == AgentName.EMPLOYMENT
+    # One 429 and one successful retry: neither the SDK nor instructor retried as well
+    assert len(mock_openai.requests) == 2
+    assert runtime.gateway.stats()["retries"] == 1
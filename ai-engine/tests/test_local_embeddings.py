@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import subprocess
+import importlib
+import numpy as np
+import pyarrow as pa
+import pytest
+import lancedb
+
+# Add the project root to the path so imports work correctly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.agents.rag.local_embeddings import LocalEmbeddings, check_dimension
+from src.agents.rag.document_store import DocumentStore, DocumentChunk
+from src.agents.rag.embedding_service import EmbeddingService
+from conftest import FakeEmbeddings
+
+local_embeddings_module = importlib.import_module("src.agents.rag.local_embeddings")
+document_store_module = importlib.import_module("src.agents.rag.document_store")
+
+
+class FakeSentenceTransformer:
+    """Records encode calls instead of running a model."""
+
+    def __init__(self, dimensions: int = 4):
+        self.dimensions = dimensions
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimensions
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy):
+        self.calls.append((list(texts), batch_size, normalize_embeddings, threading.current_thread().name))
+        return np.ones((len(texts), self.dimensions), dtype=np.float32) / np.sqrt(self.dimensions)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeSentenceTransformer()
+    monkeypatch.setattr(local_embeddings_module, "load_model", lambda model_name: fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_batches_run_normalised_on_worker_thread(model):
+    embeddings = LocalEmbeddings(batch_size=16)
+    try:
+        vectors = await embeddings.aembed_documents(["notice period", "salary"])
+        query = await embeddings.aembed_query("bonus")
+    finally:
+        embeddings.close()
+
+    assert len(vectors) == 2 and len(query) == 4
+    texts, batch_size, normalize, thread = model.calls[0]
+    assert texts == ["notice period", "salary"] and batch_size == 16 and normalize
+    assert thread.startswith("local-embeddings")
+    assert embeddings.embed_documents([]) == []
+
+
+def test_dimension_mismatch_fails_fast(model):
+    embeddings = LocalEmbeddings()
+    check_dimension(embeddings, 4)
+    with pytest.raises(ValueError, match="EMBEDDING_DIMENSION"):
+        check_dimension(embeddings, 384)
+    embeddings.close()
+
+
+@pytest.mark.asyncio
+async def test_float16_vectors_are_stored_and_searched(tmp_path):
+    schema = DocumentChunk.to_arrow_schema()
+    index = schema.get_field_index("vector")
+    schema = schema.set(index, pa.field("vector", pa.list_(pa.float16(), 1536)))
+
+    store = DocumentStore()
+    store.embeddings_model = FakeEmbeddings()
+    store.embedding_service = EmbeddingService(store.embeddings_model)
+    store.db = await lancedb.connect_async(str(tmp_path / "lancedb"))
+    store.table = await store.db.create_table("legal_documents", schema=schema)
+    await store.open_catalog()
+    await store.ensure_fts_index()
+    try:
+        await store.add_document("The notice period is four weeks.", "contract.docx")
+        results = await store.search("notice period", limit=1)
+        stored = (await store.table.schema()).field("vector").type
+    finally:
+        await store.close()
+
+    assert stored.value_type == pa.float16()
+    assert results[0]["text"] == "The notice period is four weeks."
+
+
+@pytest.mark.asyncio
+async def test_initialize_rejects_table_of_another_dimension(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_store_module, "LANCEDB_URI", str(tmp_path / "lancedb"))
+    monkeypatch.setattr(document_store_module, "get_embeddings_model", FakeEmbeddings)
+    monkeypatch.setattr(document_store_module, "create_embedding_cache", lambda model_name: None)
+
+    store = DocumentStore()
+    await store.initialize()
+    assert await store.table.count_rows() == 0
+    await store.close()
+
+    monkeypatch.setattr(document_store_module, "EMBEDDING_DIMENSION", 384)
+    with pytest.raises(ValueError, match="LANCEDB_TABLE"):
+        await DocumentStore().initialize()
+
+
+def test_unknown_storage_type_fails_at_import():
+    result = subprocess.run(
+        [sys.executable, "-c", "import src.agents.rag.document_store"],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        env={**os.environ, "EMBEDDING_STORAGE_TYPE": "flaot16"},
+        capture_output=True, text=True,
+    )
+
+    assert result.returncode != 0
+    assert "ValueError: Unknown EMBEDDING_STORAGE_TYPE 'flaot16'; expected float32 or float16" in result.stderr
@@ -1,5 +1,6 @@
 import os
 import sys
+import importlib
 import pytest
 from unittest.mock import AsyncMock
 
@@ -9,6 +10,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from src.agents.crews.legal_support_agents.legal_support_agents import (
     LegalSupportAgents
 )
+from src.agents.crews.legal_support_agents.router import RoutingCache
+from src.agents.crews.legal_support_agents.runtime import AgentRuntime
+
+agents_module = importlib.import_module("src.agents.crews.legal_support_agents.legal_support_agents")
+router_module = importlib.import_module("src.agents.crews.legal_support_agents.router")
 
 # ── Skip the whole module if Azure creds are absent ──────────────────────────
 REQUIRED_ENV = ("AZURE_OPENAI_KEY", "AZURE_OPENAI_ENDPOINT",
@@ -48,16 +54,22 @@ EQUITY_QUERIES = [
 def legal_support():
     """
     Returns LegalSupportAgents whose _handle_* methods are stubbed.
-    Only the routing step hits the live LLM.
+    Only the routing step hits the live LLM; the local router, the routing
+    cache and speculative retrieval are disabled so every query reaches it.
     """
-    c = LegalSupportAgents(debug_enabled=False)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(router_module, "LOCAL_ROUTER_ENABLED", False)
+        patch.setattr(agents_module, "SPECULATIVE_RETRIEVAL", False)
+        runtime = AgentRuntime()
+        runtime.routing_cache = RoutingCache(maxsize=0, similarity=0)
+        c = LegalSupportAgents(debug_enabled=False, runtime=runtime)
 
-    # Stub the specialist agents so no second LLM call happens
-    c._handle_employment_query = AsyncMock(return_value="EMPLOYMENT_HANDLER_OK")
-    c._handle_compliance_query = AsyncMock(return_value="COMPLIANCE_HANDLER_OK")
-    c._handle_equity_query = AsyncMock(return_value="EQUITY_HANDLER_OK")
+        # Stub the specialist agents so no second LLM call happens
+        c._handle_employment_query = AsyncMock(return_value="EMPLOYMENT_HANDLER_OK")
+        c._handle_compliance_query = AsyncMock(return_value="COMPLIANCE_HANDLER_OK")
+        c._handle_equity_query = AsyncMock(return_value="EQUITY_HANDLER_OK")
 
-    return c
+        yield c
 
 # ── Parametrised tests ──────────────────────────────────────────────────────
 @pytest.mark.asyncio
@@ -67,8 +79,10 @@ async def test_routes_to_compliance(legal_support, query):
     legal_support._handle_compliance_query.reset_mock()
     legal_support._handle_employment_query.reset_mock()
     legal_support._handle_equity_query.reset_mock()
+    llm_calls = legal_support.runtime.gateway.calls
     
     result = await legal_support.process_query(query)
+    assert legal_support.runtime.gateway.calls > llm_calls
 
     legal_support._handle_compliance_query.assert_awaited_once()
     legal_support._handle_employment_query.assert_not_called()
@@ -83,8 +97,10 @@ async def test_routes_to_employment(legal_support, query):
     legal_support._handle_compliance_query.reset_mock()
     legal_support._handle_employment_query.reset_mock()
     legal_support._handle_equity_query.reset_mock()
+    llm_calls = legal_support.runtime.gateway.calls
     
     result = await legal_support.process_query(query)
+    assert legal_support.runtime.gateway.calls > llm_calls
 
     legal_support._handle_employment_query.assert_awaited_once()
     legal_support._handle_compliance_query.assert_not_called()
@@ -99,8 +115,10 @@ async def test_routes_to_equity(legal_support, query):
     legal_support._handle_compliance_query.reset_mock()
     legal_support._handle_employment_query.reset_mock()
     legal_support._handle_equity_query.reset_mock()
+    llm_calls = legal_support.runtime.gateway.calls
     
     result = await legal_support.process_query(query)
+    assert legal_support.runtime.gateway.calls > llm_calls
 
     legal_support._handle_equity_query.assert_awaited_once()
     legal_support._handle_employment_query.assert_not_called()